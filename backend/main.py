@@ -1,8 +1,11 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional
-import tempfile
 import os
 import sys
 import asyncio
@@ -11,10 +14,21 @@ import json
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from modules.speechToText import transcribe_audio
+from modules import stt
 from modules.llm import gpt_stream_to_queues
 from modules.simple_tts import simple_elevenlabs_streamer_websocket
-from config import FREE_VOICES, DEFAULT_VOICE_ID
+from modules import providers, metrics, lifecycle, admission, hedging, warmup, fillers, upstream_trace
+from modules.log import log
+from modules.tts_cache import get_tts_cache
+from modules.llm_cache import get_llm_cache
+from modules.conversation import get_conversation_store
+from modules.connection import Connection, TextChunkQueue, SlowConsumerError, stats as connection_stats
+from modules.audio import pcm16_to_float, preprocess_upload, AudioDecodeError
+from modules.vad import Endpointer, SPEECH_START, SPEECH_END
+from modules.speculative import Speculation, stats as speculation_stats
+from modules.protocol import negotiate_transport, negotiate_tts_mode, TRANSPORT_JSON, TTS_MODE_BUFFERED
+from config import FREE_VOICES, DEFAULT_VOICE_ID, SAMPLE_RATE, LLM_QUEUE_MAX_TOKENS, SPECULATIVE_LLM, SPECULATIVE_SILENCE_MS, FILLER_AUDIO
+warmup.record_import(time.perf_counter() - _import_started)
 app = FastAPI(title="Voice Agent API", version="1.0.0")
 
 # Add CORS middleware
@@ -26,6 +40,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def warm_up():
+    # SIGTERM drains in-flight turns whether or not warm-up succeeds
+    lifecycle.install_drain_handler()
+    # Load models and SDKs and open upstream connections before the first
+    # request (see modules/warmup.py); /ready stays 503 until this is done
+    try:
+        await warmup.run()
+    except Exception as e:
+        print(f"❌ Warm-up failed, worker will not report ready: {e}")
+        return
+    lifecycle.mark_ready()
+
+@app.on_event("shutdown")
+async def shutdown_upstream_clients():
+    stt.shutdown()
+    await providers.shutdown()
+
 class TextRequest(BaseModel):
     text: str
     voice_id: Optional[str] = None  # Will default to DEFAULT_VOICE_ID
@@ -34,6 +66,13 @@ class TextRequest(BaseModel):
 async def root():
     return {"message": "Voice Agent API is running"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once warmed up, 503 while starting or draining"""
+    if not lifecycle.is_ready():
+        raise HTTPException(status_code=503, detail=lifecycle.stats())
+    return {"ready": True, **lifecycle.stats()}
+
 @app.get("/voices")
 async def get_voices():
     """Get available voices"""
@@ -48,103 +87,393 @@ async def get_voices():
     ]
     return {"voices": voices_array}
 
+@app.get("/stats")
+async def get_stats():
+    """Runtime statistics for caches and other shared components"""
+    tts_cache = get_tts_cache()
+    llm_cache = get_llm_cache()
+    return {
+        "tts_cache": tts_cache.stats() if tts_cache else None,
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "stt": stt.stats(),
+        "conversations": get_conversation_store().stats(),
+        "connections": connection_stats(),
+        "lifecycle": lifecycle.stats(),
+        "startup": warmup.stats(),
+        "admission": admission.stats(),
+        "hedging": hedging.stats(),
+        "speculation": speculation_stats(),
+        "fillers": fillers.stats()
+    }
+
+def _cache_gauges():
+    connections = connection_stats(top=0)
+    gauges = {
+        "voice_conversation_sessions": get_conversation_store().stats()["sessions"],
+        "voice_ws_connections_open": connections["open"],
+        "voice_ws_bytes_sent": connections["bytes_sent"],
+        "voice_ws_slow_consumers_closed": connections["slow_consumers_closed"],
+    }
+    for name, cache in (("tts", get_tts_cache()), ("llm", get_llm_cache())):
+        if cache:
+            stats = cache.stats()
+            gauges[f"voice_{name}_cache_hit_rate"] = stats["hit_rate"]
+            gauges[f"voice_{name}_cache_entries"] = stats["entries"]
+    return gauges
+
+metrics.register_collector(_cache_gauges)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics (latency histograms and cache gauges)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+async def get_traces():
+    """Recently sampled per-turn traces (plus every slow turn)"""
+    return {"traces": metrics.recent_traces()}
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Full stage timeline of one sampled turn"""
+    trace = metrics.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
 @app.post("/transcribe")
 async def transcribe_audio_endpoint(audio: UploadFile = File(...)):
     """Transcribe audio file to text"""
     if not audio.filename.endswith(('.wav', '.mp3', '.m4a', '.webm')):
         raise HTTPException(status_code=400, detail="Unsupported audio format")
     
-    # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(audio.filename)[1]) as tmp_file:
-        content = await audio.read()
-        tmp_file.write(content)
-        tmp_path = tmp_file.name
+    content = await audio.read()
+    log.info("🎤 Transcribing upload: %s (%d bytes)", audio.filename, len(content))
+    
+    # Check if file is too small
+    if len(content) < 1000:
+        log.warning("⚠️  Audio file too small, likely empty")
+        return {"text": ""}
     
     try:
-        # Transcribe audio with timeout
-        file_size = os.path.getsize(tmp_path)
-        print(f"🎤 Transcribing audio file: {tmp_path} ({file_size} bytes)")
+        # Decode, downmix, resample and trim silence in memory (off the event loop)
+        try:
+            samples = await providers.run_blocking(preprocess_upload, content)
+        except AudioDecodeError as e:
+            # Can't decode here (e.g. no ffmpeg for webm): forward the upload as is
+            log.warning("⚠️  In-memory decode failed (%s), sending original upload", e)
+            samples = None
         
-        # Check if file is too small
-        if file_size < 1000:
-            print("⚠️  Audio file too small, likely empty")
+        if samples is not None and len(samples) == 0:
+            log.info("⚠️  Upload is silence only")
             return {"text": ""}
         
-        # Run transcription in executor with timeout
-        loop = asyncio.get_event_loop()
-        text = await asyncio.wait_for(
-            loop.run_in_executor(None, transcribe_audio, tmp_path),
-            timeout=50.0  # 50 second timeout
-        )
+        # Run transcription on the configured STT backend (bounded by STT_DEADLINE)
+        if samples is not None:
+            log.info("✂️  Preprocessed to %.2fs of %d Hz mono", len(samples) / SAMPLE_RATE, SAMPLE_RATE)
+            text = await stt.transcribe(samples, SAMPLE_RATE)
+        else:
+            text = await stt.transcribe(content, filename=audio.filename)
         
-        print(f"✅ Transcription complete: {text}")
+        log.info("✅ Transcription complete: %s", text)
         return {"text": text}
     except asyncio.TimeoutError:
-        print("⏱️ Transcription timeout")
+        log.warning("⏱️ Transcription timeout")
         raise HTTPException(status_code=504, detail="Transcription timeout - try again")
+    except admission.UpstreamSaturated as e:
+        log.warning("🚦 Transcription rejected: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
-        print(f"❌ Transcription error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Transcription error: %s", e)
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+
+async def run_turn(websocket: WebSocket, user_text: str, voice_id: str, transport: str, tts_mode: str,
+                   turn_id: int = 0, conversation=None, speculation=None, use_filler: bool = False):
+    """Stream one LLM answer to the client as text chunks and TTS audio"""
+    recording = upstream_trace.current()
+    if recording:
+        recording.set_input(user_text, voice_id)
+    # Separate queues for TTS and WebSocket. A full TTS queue pauses the LLM
+    # stream; text for a slow client is merged into fewer chunks instead
+    tts_queue = asyncio.Queue(maxsize=LLM_QUEUE_MAX_TOKENS)
+    websocket_queue = TextChunkQueue()
+    
+    # Start streaming tasks
+    if speculation is not None:
+        # Answer already being generated from the interim transcript
+        gpt_task = asyncio.create_task(speculation.replay([tts_queue, websocket_queue]))
+    else:
+        gpt_task = asyncio.create_task(
+            gpt_stream_to_queues(user_text, [tts_queue, websocket_queue], conversation)
+        )
+    
+    # Start TTS task
+    tts_task = asyncio.create_task(
+        simple_elevenlabs_streamer_websocket(tts_queue, websocket, voice_id,
+                                             transport=transport, tts_mode=tts_mode,
+                                             filler=fillers.pick(voice_id or DEFAULT_VOICE_ID) if use_filler else None)
+    )
+    
+    # Stream text chunks to WebSocket
+    async def stream_to_websocket():
+        # First token goes out at once; the rest is batched per TEXT_COALESCE_MS
+        chunk = await websocket_queue.get()
+        while chunk is not None:
+            await websocket.send_text(json.dumps({
+                "type": "text_chunk",
+                "content": chunk
+            }))
+            chunk = await websocket_queue.get_batch()
+    
+    websocket_task = asyncio.create_task(stream_to_websocket())
+    
+    # Wait for all tasks to complete. If one fails (or the turn is cancelled)
+    # the others must stop too, or they keep sending for a dead turn
+    tasks = (gpt_task, tts_task, websocket_task)
+    try:
+        await asyncio.gather(*tasks)
     finally:
-        # Clean up temporary file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Send completion signal to client
+    await websocket.send_text(json.dumps({"type": "stream_complete", "turn_id": turn_id}))
 
 @app.websocket("/stream")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for streaming voice conversation"""
     await websocket.accept()
+    if lifecycle.is_draining():
+        await websocket.close(code=1012)  # Service restart: reconnect to another worker
+        return
+    # Accounted, time-bounded sends; slow consumers get disconnected
+    websocket = Connection(websocket)
+    # Old clients never say hello and keep whole-segment base64 JSON audio
+    transport = TRANSPORT_JSON
+    tts_mode = TTS_MODE_BUFFERED
+    # Conversation memory under a server-issued session id. The hello reply
+    # hands it to the client, which can pass it back in a later hello to
+    # resume; unknown ids are ignored. Sessions never handed out end with
+    # the socket
+    session_id, conversation = get_conversation_store().create()
+    session_shared = False
+    # Streamed microphone input (audio_start ... binary PCM16 frames ... endpoint)
+    endpointer = None
+    speech_voice_id = DEFAULT_VOICE_ID
+    speculative = SPECULATIVE_LLM
+    speculation = None
+    use_filler = FILLER_AUDIO
+    # The turn in progress runs as its own task so this loop keeps reading
+    # messages and can cut it off (barge-in / cancel)
+    current_turn = None
+    current_turn_id = 0
+    
+    async def cancel_turn(notify: bool = True):
+        """Stop the in-flight turn: upstream LLM stream, pending TTS and queued sends"""
+        nonlocal current_turn
+        if current_turn is None or current_turn.done():
+            current_turn = None
+            return
+        current_turn.cancel()
+        try:
+            await current_turn
+        except asyncio.CancelledError:
+            pass
+        current_turn = None
+        log.info("✂️  Turn %d cancelled", current_turn_id)
+        if notify:
+            await websocket.send_text(json.dumps({"type": "turn_cancelled", "turn_id": current_turn_id}))
+    
+    async def start_turn(turn_coro_factory, turn_id=None):
+        """Cancel whatever is running, then run the new turn in the background"""
+        nonlocal current_turn, current_turn_id
+        await cancel_turn()
+        current_turn_id = turn_id if turn_id is not None else current_turn_id + 1
+        this_turn_id = current_turn_id
+        if lifecycle.is_draining():
+            # Shutting down: finish what's running, but don't start anything new
+            await websocket.send_text(json.dumps({
+                "type": "error", "message": "Server is restarting, please reconnect", "turn_id": this_turn_id
+            }))
+            return
+        await websocket.send_text(json.dumps({"type": "turn_start", "turn_id": this_turn_id}))
+        
+        async def guarded():
+            timeline = metrics.begin_turn(this_turn_id)
+            recording = upstream_trace.begin_turn(this_turn_id)
+            status = "completed"
+            lifecycle.turn_started()
+            try:
+                await turn_coro_factory(this_turn_id)
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            except SlowConsumerError as e:
+                status = "dropped"
+                log.warning("🐢 Turn %d dropped: %s", this_turn_id, e)
+            except admission.UpstreamSaturated as e:
+                status = "rejected"
+                log.warning("🚦 Turn %d rejected: %s", this_turn_id, e)
+                await websocket.send_text(json.dumps({
+                    "type": "error", "code": "busy", "message": str(e), "turn_id": this_turn_id
+                }))
+            except Exception as e:
+                status = "error"
+                log.error("❌ Turn %d failed: %s", this_turn_id, e)
+                await websocket.send_text(json.dumps({"type": "error", "message": str(e), "turn_id": this_turn_id}))
+            finally:
+                lifecycle.turn_finished()
+                timeline.finish(status)
+                await upstream_trace.finish_turn(recording, status)
+        
+        current_turn = asyncio.create_task(guarded())
+    
+    def take_utterance(end_of_audio: bool = False):
+        """Detach the buffered utterance; the endpointer keeps listening unless the microphone stopped"""
+        nonlocal endpointer
+        had_speech = endpointer.had_speech
+        sample_rate = endpointer.sample_rate
+        samples = endpointer.utterance()
+        if end_of_audio:
+            endpointer = None
+        return samples, sample_rate, had_speech
+    
+    def drop_speculation():
+        """Discard a speculative answer that won't be used"""
+        nonlocal speculation
+        if speculation is not None:
+            speculation.cancel()
+            speculation = None
+    
+    async def speech_turn(samples, sample_rate, had_speech, voice_id, turn_id, pending_speculation=None):
+        """Transcribe a finished utterance and answer it on this connection"""
+        text = ""
+        try:
+            if had_speech:
+                try:
+                    text = await stt.transcribe(samples, sample_rate)
+                except admission.UpstreamSaturated:
+                    raise  # Reported to the client as busy, not as silence
+                except Exception as e:
+                    log.error("❌ Streamed transcription failed: %s", e)
+            log.info("✅ Streamed transcription: %s", text)
+            await websocket.send_text(json.dumps({"type": "transcript", "text": text, "turn_id": turn_id}))
+            
+            if pending_speculation is not None and text and await pending_speculation.matches(text):
+                log.info("🔮 Speculation hit")
+                speculation_to_use, pending_speculation = pending_speculation, None
+                await run_turn(websocket, text, voice_id, transport, tts_mode, turn_id, conversation,
+                               speculation=speculation_to_use, use_filler=use_filler)
+            elif text:
+                if pending_speculation is not None:
+                    pending_speculation.cancel("missed")
+                await run_turn(websocket, text, voice_id, transport, tts_mode, turn_id, conversation,
+                               use_filler=use_filler)
+            else:
+                await websocket.send_text(json.dumps({"type": "stream_complete", "turn_id": turn_id}))
+        finally:
+            if pending_speculation is not None:
+                pending_speculation.cancel()
+    
+    async def finish_speech(end_of_audio: bool = False):
+        nonlocal speculation
+        samples, sample_rate, had_speech = take_utterance(end_of_audio)
+        voice_id = speech_voice_id
+        pending_speculation, speculation = speculation, None
+        await websocket.send_text(json.dumps({"type": "speech_end"}))
+        await start_turn(lambda turn_id: speech_turn(samples, sample_rate, had_speech, voice_id, turn_id,
+                                                     pending_speculation))
     
     try:
         while True:
-            # Wait for text input from client
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # Wait for the next control message or audio frame from the client
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            
+            if frame.get("bytes") is not None:
+                if endpointer is None:
+                    continue  # Audio outside audio_start/endpoint is ignored
+                samples = pcm16_to_float(frame["bytes"])
+                while True:
+                    event = endpointer.feed(samples)
+                    if event == SPEECH_START:
+                        # The user talking over the answer is a barge-in
+                        await cancel_turn()
+                        await websocket.send_text(json.dumps({"type": "speech_start"}))
+                    elif event == SPEECH_END:
+                        await finish_speech()
+                        samples = samples[:0]  # Then whatever followed the endpoint in this frame
+                        continue
+                    elif speculative and endpointer.in_speech:
+                        silence_ms = endpointer.trailing_silence_ms
+                        if speculation is None and silence_ms >= SPECULATIVE_SILENCE_MS:
+                            # Likely the end of the sentence: start answering the interim transcript
+                            speculation = Speculation(endpointer.snapshot(), endpointer.sample_rate, conversation)
+                        elif speculation is not None and silence_ms == 0:
+                            drop_speculation()  # They kept talking
+                    break
+                continue
             
-            if message["type"] == "text_input":
+            message = json.loads(frame["text"])
+            
+            if message["type"] == "hello":
+                transport = negotiate_transport(message)
+                tts_mode = negotiate_tts_mode(message)
+                speculative = bool(message.get("speculative", speculative))
+                use_filler = bool(message.get("filler", use_filler))
+                requested = str(message.get("session_id") or "")
+                if requested and requested != session_id and requested in get_conversation_store():
+                    if not session_shared:
+                        get_conversation_store().drop(session_id)
+                    session_id = requested
+                    conversation = get_conversation_store().get(session_id)
+                session_shared = True
+                await websocket.send_text(json.dumps({
+                    "type": "hello",
+                    "audio_transport": transport,
+                    "tts_mode": tts_mode,
+                    "session_id": session_id
+                }))
+            
+            elif message["type"] == "text_input":
                 user_text = message["text"]
                 voice_id = message.get("voice_id", DEFAULT_VOICE_ID)  # Use selected voice or default
-                
-                # Create separate queues for TTS and WebSocket
-                tts_queue = asyncio.Queue()
-                websocket_queue = asyncio.Queue()
-                
-                # Start streaming tasks
-                gpt_task = asyncio.create_task(
-                    gpt_stream_to_queues(user_text, [tts_queue, websocket_queue])
-                )
-                
-                # Start TTS task
-                tts_task = asyncio.create_task(
-                    simple_elevenlabs_streamer_websocket(tts_queue, websocket, voice_id)
+                await start_turn(
+                    lambda turn_id: run_turn(websocket, user_text, voice_id, transport, tts_mode, turn_id,
+                                             conversation, use_filler=use_filler),
+                    message.get("turn_id")
                 )
-                
-                # Stream text chunks to WebSocket
-                async def stream_to_websocket():
-                    while True:
-                        chunk = await websocket_queue.get()
-                        if chunk is None:
-                            break
-                        await websocket.send_text(json.dumps({
-                            "type": "text_chunk",
-                            "content": chunk
-                        }))
-                
-                websocket_task = asyncio.create_task(stream_to_websocket())
-                
-                # Wait for all tasks to complete
-                await asyncio.gather(gpt_task, tts_task, websocket_task)
-                
-                # Send completion signal to client
-                await websocket.send_text(json.dumps({"type": "stream_complete"}))
+            
+            elif message["type"] == "cancel":
+                await cancel_turn()
+            
+            elif message["type"] == "audio_start":
+                drop_speculation()
+                endpointer = Endpointer(sample_rate=int(message.get("sample_rate", SAMPLE_RATE)))
+                speech_voice_id = message.get("voice_id", DEFAULT_VOICE_ID)
+            
+            elif message["type"] == "audio_end":
+                # Client stopped the microphone before the endpointer fired
+                if endpointer is not None:
+                    await finish_speech(end_of_audio=True)
                 
     except WebSocketDisconnect:
-        print("Client disconnected")
+        log.info("Client disconnected")
+    except SlowConsumerError as e:
+        log.warning("🐢 %s", e)
     except Exception as e:
-        print(f"WebSocket error: {e}")
+        log.error("WebSocket error: %s", e)
         await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+    finally:
+        # Nobody is listening any more; stop burning upstream capacity
+        if current_turn is not None and not current_turn.done():
+            current_turn.cancel()
+        drop_speculation()
+        if not session_shared:
+            get_conversation_store().drop(session_id)
+        websocket.mark_closed()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Backend load test
+
+Starts the mock upstream servers (benchmarks/mock_upstream.py) and the real
+FastAPI backend pointed at them, then drives N concurrent ``/stream``
+conversations and M concurrent ``/transcribe`` clients. Reports throughput,
+p50/p95/p99 time-to-first-text and time-to-first-audio, and the backend's
+CPU and RSS, as JSON so runs can be compared across commits.
+
+Usage:
+    python benchmarks/load_test.py [--clients 20] [--turns 3] [--transcribe-clients 5]
+                                   [--ttft 0.35] [--error-rate 0.02] ... [--output run.json]
+
+Pass ``--backend-url`` to load an already running backend instead (it must
+already be pointed at the mocks or real APIs, and CPU/RSS is then skipped
+unless ``--backend-pid`` is given).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mock_upstream import add_arguments, settings_from_args
+from modules.audio import to_wav_bytes
+
+try:
+    import psutil
+except ImportError:  # /proc is enough on Linux
+    psutil = None
+
+QUESTIONS = [
+    "What is going on with interest rates?",
+    "Can you explain inflation simply?",
+    "How do central banks decide on rates?",
+    "Give me a short summary of the economy.",
+]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": round(rank(0.50), 4),
+        "p95": round(rank(0.95), 4),
+        "p99": round(rank(0.99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+class ProcessSampler:
+    """Samples CPU% and RSS of one process while the load runs."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._task = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _cpu_seconds(self):
+        if psutil:
+            times = psutil.Process(self.pid).cpu_times()
+            return times.user + times.system
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._ticks  # utime + stime
+
+    def _rss_mb(self):
+        if psutil:
+            return psutil.Process(self.pid).memory_info().rss / 1e6
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1e3
+        return 0.0
+
+    async def _run(self):
+        last_cpu, last_time = self._cpu_seconds(), time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            cpu, now = self._cpu_seconds(), time.perf_counter()
+            self.cpu.append(100 * (cpu - last_cpu) / (now - last_time))
+            self.rss.append(self._rss_mb())
+            last_cpu, last_time = cpu, now
+
+    def start(self):
+        try:
+            self._cpu_seconds()
+        except Exception as e:
+            print(f"⚠️  Cannot sample backend process: {e}", file=sys.stderr)
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        if self._task is None:
+            return {}
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, OSError):
+            pass
+        if not self.cpu:
+            return {}
+        return {
+            "cpu_percent_avg": round(sum(self.cpu) / len(self.cpu), 1),
+            "cpu_percent_max": round(max(self.cpu), 1),
+            "rss_mb_max": round(max(self.rss), 1),
+            "rss_mb_end": round(self.rss[-1], 1),
+        }
+
+async def open_stream(ws_url: str, args, session_id=None):
+    """Connect to /stream and say hello, resuming ``session_id`` if given. Returns (ws, session_id)."""
+    ws = await websockets.connect(ws_url, max_size=None)
+    hello = {"type": "hello", "audio_transport": args.transport, "tts_mode": args.tts_mode}
+    if session_id:
+        hello["session_id"] = session_id
+    await ws.send(json.dumps(hello))
+    while True:
+        reply = json.loads(await ws.recv())
+        if reply.get("type") == "hello":
+            # Session ids are issued by the server; keep ours to resume after a reconnect
+            return ws, reply.get("session_id")
+
+async def stream_turn(ws, question: str, args, results: dict):
+    """Send one question and time first text, first audio and completion."""
+    start = time.perf_counter()
+    first_text = first_audio = None
+    audio_bytes = 0
+    await ws.send(json.dumps({"type": "text_input", "text": question}))
+    while True:
+        message = await asyncio.wait_for(ws.recv(), args.turn_timeout)
+        now = time.perf_counter() - start
+        if isinstance(message, bytes):
+            first_audio = first_audio if first_audio is not None else now
+            audio_bytes += len(message)
+            continue
+        data = json.loads(message)
+        if data["type"] == "text_chunk" and first_text is None:
+            first_text = now
+        elif data["type"] == "audio_chunk":
+            first_audio = first_audio if first_audio is not None else now
+            audio_bytes += len(data.get("audio_data", ""))
+        elif data["type"] == "stream_complete":
+            results["turns"].append(now)
+            break
+        elif data["type"] == "segment_error":
+            results["segment_errors"] += 1
+        elif data["type"] == "error":
+            results["errors"] += 1
+            break
+    if first_text is not None:
+        results["ttft_text"].append(first_text)
+    if first_audio is not None:
+        results["ttft_audio"].append(first_audio)
+    else:
+        results["turns_without_audio"] += 1
+    results["audio_bytes"] += audio_bytes
+
+async def stream_client(ws_url: str, client_id: int, turns: int, args, results: dict):
+    """One /stream conversation; reconnects (resuming the session) if the server closes the socket."""
+    ws, session_id = await open_stream(ws_url, args)
+    try:
+        for turn in range(turns):
+            question = QUESTIONS[(client_id + turn) % len(QUESTIONS)]
+            try:
+                await stream_turn(ws, question, args, results)
+            except websockets.exceptions.ConnectionClosed:
+                # Draining worker (1012) or dropped as a slow consumer (1013)
+                results["reconnects"] += 1
+                ws, session_id = await open_stream(ws_url, args, session_id)
+    finally:
+        await ws.close()
+
+async def run_stream_load(base_url: str, args) -> dict:
+    ws_url = base_url.replace("http", "ws", 1) + "/stream"
+    results = {"turns": [], "ttft_text": [], "ttft_audio": [], "errors": 0,
+               "turns_without_audio": 0, "segment_errors": 0, "audio_bytes": 0, "client_failures": 0,
+               "reconnects": 0}
+
+    async def guarded(client_id):
+        await asyncio.sleep(client_id * args.ramp / max(1, args.clients))
+        try:
+            await stream_client(ws_url, client_id, args.turns, args, results)
+        except Exception as e:
+            results["client_failures"] += 1
+            print(f"❌ Stream client {client_id} failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(guarded(i) for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": args.clients,
+        "turns_completed": len(results["turns"]),
+        "turn_errors": results["errors"],
+        "turns_without_audio": results["turns_without_audio"],
+        "segment_errors": results["segment_errors"],
+        "client_failures": results["client_failures"],
+        "reconnects": results["reconnects"],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(len(results["turns"]) / elapsed, 3) if elapsed else 0,
+        "audio_bytes": results["audio_bytes"],
+        "time_to_first_text_s": percentiles(results["ttft_text"]),
+        "time_to_first_audio_s": percentiles(results["ttft_audio"]),
+        "turn_duration_s": percentiles(results["turns"]),
+    }
+
+async def run_transcribe_load(base_url: str, args) -> dict:
+    sample_rate = 16000
+    t = np.arange(int(sample_rate * args.audio_seconds)) / sample_rate
+    wav = to_wav_bytes((0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), sample_rate)
+    latencies, failures = [], 0
+
+    async def client(client_id, http):
+        nonlocal failures
+        for _ in range(args.transcribe_requests):
+            start = time.perf_counter()
+            try:
+                response = await http.post(f"{base_url}/transcribe",
+                                           files={"audio": ("load.wav", wav, "audio/wav")})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                failures += 1
+                print(f"❌ Transcribe client {client_id} failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=args.turn_timeout) as http:
+        await asyncio.gather(*(client(i, http) for i in range(args.transcribe_clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": args.transcribe_clients,
+        "requests_completed": len(latencies),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_req_per_s": round(len(latencies) / elapsed, 3) if elapsed else 0,
+        "latency_s": percentiles(latencies),
+    }
+
+async def wait_until_up(url: str, process=None, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2) as http:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await http.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def start_servers(args):
+    """Start the mock upstream and the backend; returns (mock_url, backend_url, backend, processes)."""
+    mock_port, backend_port = free_port(), free_port()
+    settings = settings_from_args(args)
+    output = None if args.verbose else subprocess.DEVNULL
+
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "mock_upstream.py"), "--from-env",
+         "--port", str(mock_port)],
+        cwd=ROOT, env={**os.environ, **settings.to_env()}, stdout=output, stderr=output,
+    )
+    backend_env = {
+        **os.environ,
+        "OPENAI_API_KEY": "mock",
+        "ELEVENLABS_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "ELEVENLABS_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "STT_BACKEND": "api",
+        "STT_FALLBACK": "",
+    }
+    if not args.with_caches:
+        backend_env.update({"TTS_CACHE_ENABLED": "false", "LLM_CACHE_ENABLED": "false"})
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+         "--port", str(backend_port), "--log-level", "warning"],
+        cwd=ROOT, env=backend_env, stdout=output, stderr=output,
+    )
+    return f"http://127.0.0.1:{mock_port}", f"http://127.0.0.1:{backend_port}", backend, [mock, backend]
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args) -> dict:
+    processes = []
+    mock_url = None
+    backend_pid = args.backend_pid
+    try:
+        if args.backend_url:
+            backend_url = args.backend_url.rstrip("/")
+        else:
+            mock_url, backend_url, backend, processes = start_servers(args)
+            backend_pid = backend.pid
+            await wait_until_up(f"{mock_url}/stats", processes[0])
+            await wait_until_up(f"{backend_url}/", backend)
+
+        sampler = ProcessSampler(backend_pid) if backend_pid else None
+        if sampler:
+            sampler.start()
+
+        stream_results, transcribe_results = await asyncio.gather(
+            run_stream_load(backend_url, args) if args.clients else asyncio.sleep(0, {}),
+            run_transcribe_load(backend_url, args) if args.transcribe_clients else asyncio.sleep(0, {}),
+        )
+        server = await sampler.stop() if sampler else {}
+
+        upstream = {}
+        async with httpx.AsyncClient() as http:
+            backend_stats = (await http.get(f"{backend_url}/stats")).json()
+            # Hedges, retries and deadline misses the backend needed to get there
+            hedging = backend_stats.get("hedging", {})
+            startup = backend_stats.get("startup", {})
+            if mock_url:
+                upstream = (await http.get(f"{mock_url}/stats")).json()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {
+            "clients": args.clients,
+            "turns": args.turns,
+            "transport": args.transport,
+            "tts_mode": args.tts_mode,
+            "transcribe_clients": args.transcribe_clients,
+            "transcribe_requests": args.transcribe_requests,
+            "with_caches": args.with_caches,
+            "mock": vars(settings_from_args(args)),
+        },
+        "stream": stream_results,
+        "transcribe": transcribe_results,
+        "server": server,
+        "upstream_requests": upstream,
+        "hedging": hedging,
+        "startup": startup,
+    }
+
+def print_summary(report: dict):
+    stream, transcribe, server = report["stream"], report["transcribe"], report["server"]
+    print("\n📊 Load test results")
+    if stream:
+        print(f"  /stream: {stream['turns_completed']} turns in {stream['elapsed_s']}s "
+              f"({stream['throughput_turns_per_s']}/s), {stream['turn_errors']} errors, "
+              f"{stream['segment_errors']} failed segments, {stream['client_failures']} failed clients, "
+              f"{stream['reconnects']} reconnects")
+        for label, key in (("first text", "time_to_first_text_s"), ("first audio", "time_to_first_audio_s"),
+                           ("turn", "turn_duration_s")):
+            p = stream[key]
+            if p.get("count"):
+                print(f"    {label:<12} p50 {p['p50']:.3f}s  p95 {p['p95']:.3f}s  p99 {p['p99']:.3f}s")
+    if transcribe:
+        p = transcribe["latency_s"]
+        print(f"  /transcribe: {transcribe['requests_completed']} requests "
+              f"({transcribe['throughput_req_per_s']}/s), {transcribe['failures']} failures")
+        if p.get("count"):
+            print(f"    latency      p50 {p['p50']:.3f}s  p95 {p['p95']:.3f}s  p99 {p['p99']:.3f}s")
+    for stage, counters in report.get("hedging", {}).items():
+        print(f"  {stage}: {counters['requests']} requests, {counters['hedges']} hedged "
+              f"({counters['hedge_wins']} won), {counters['retries']} retried, "
+              f"{counters['deadline_exceeded']} past deadline")
+    startup = report.get("startup") or {}
+    if startup.get("total_s") is not None:
+        print(f"  startup: import {startup['import_s']}s, warm-up {startup['total_s']}s")
+    if server:
+        print(f"  backend: CPU avg {server['cpu_percent_avg']}% / max {server['cpu_percent_max']}%, "
+              f"RSS max {server['rss_mb_max']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent /stream conversations")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per conversation")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Seconds over which clients connect")
+    parser.add_argument("--transport", choices=["json", "binary"], default="binary")
+    parser.add_argument("--tts-mode", choices=["buffered", "incremental"], default="buffered")
+    parser.add_argument("--transcribe-clients", type=int, default=2, help="Concurrent /transcribe clients")
+    parser.add_argument("--transcribe-requests", type=int, default=5, help="Requests per /transcribe client")
+    parser.add_argument("--audio-seconds", type=float, default=2.0, help="Length of the uploaded audio")
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--with-caches", action="store_true", help="Leave the TTS/LLM caches enabled")
+    parser.add_argument("--backend-url", help="Load an already running backend instead")
+    parser.add_argument("--backend-pid", type=int, help="PID to sample CPU/RSS from with --backend-url")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report to stdout")
+    parser.add_argument("--verbose", action="store_true", help="Show mock and backend logs")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_summary(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the paid upstream APIs
+
+Serves just enough of the OpenAI chat-completions stream, the Whisper
+transcription endpoint and ElevenLabs text-to-speech for the backend to run
+end to end without network access or API keys. Latencies and failures are
+configurable so capacity can be measured against realistic (or pessimistic)
+upstream behaviour.
+
+Point the backend at it with:
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 ELEVENLABS_BASE_URL=http://127.0.0.1:9100
+
+Usage:
+    python benchmarks/mock_upstream.py [--port 9100] [--ttft 0.35] [--tokens-per-sec 40]
+                                       [--tts-latency 0.25] [--error-rate 0.0] ...
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import uvicorn
+
+REPLY = (
+    "Sure, here is a quick overview. Interest rates shape how expensive it is to borrow money, "
+    "so when they rise, spending and investment tend to slow down. Inflation usually follows with "
+    "a delay of several months. Central banks watch employment, wages and prices before deciding "
+    "on the next move. In short, it is a balancing act between growth and stable prices."
+)
+
+class MockSettings:
+    def __init__(self, ttft=0.35, tokens_per_sec=40.0, reply_tokens=60, stt_latency=0.4,
+                 tts_latency=0.25, tts_latency_per_char=0.002, tts_bytes_per_char=400,
+                 tts_chunk_bytes=4096, error_rate=0.0, error_status=500):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.stt_latency = stt_latency
+        self.tts_latency = tts_latency
+        self.tts_latency_per_char = tts_latency_per_char
+        self.tts_bytes_per_char = tts_bytes_per_char
+        self.tts_chunk_bytes = tts_chunk_bytes
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    @classmethod
+    def from_env(cls):
+        """Settings passed down from a parent process as MOCK_* variables."""
+        defaults = cls()
+        kwargs = {}
+        for name, value in vars(defaults).items():
+            raw = os.getenv(f"MOCK_{name.upper()}")
+            if raw is not None:
+                kwargs[name] = type(value)(raw)
+        return cls(**kwargs)
+
+    def to_env(self) -> dict:
+        return {f"MOCK_{name.upper()}": str(value) for name, value in vars(self).items()}
+
+def reply_tokens(count: int):
+    """The canned reply split into word tokens, repeated to reach ``count``."""
+    words = REPLY.split(" ")
+    return [(" " if i else "") + words[i % len(words)] for i in range(count)]
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="Mock upstream APIs")
+    counters = {"chat": 0, "transcriptions": 0, "tts": 0, "models": 0, "errors": 0}
+
+    def inject_error():
+        if settings.error_rate and random.random() < settings.error_rate:
+            counters["errors"] += 1
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=settings.error_status)
+        return None
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.get("/v1/models")
+    async def models(request: Request):
+        # Startup warm-up request from both SDKs; ElevenLabs sends xi-api-key
+        counters["models"] += 1
+        if "xi-api-key" in request.headers:
+            return []
+        return {"object": "list", "data": []}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        counters["chat"] += 1
+        body = await request.json()
+        error = inject_error()
+        if error:
+            return error
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "gpt-4o-mini")
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            await asyncio.sleep(settings.ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            interval = 1.0 / settings.tokens_per_sec if settings.tokens_per_sec > 0 else 0
+            for i, token in enumerate(reply_tokens(settings.reply_tokens)):
+                if i:
+                    await asyncio.sleep(interval)
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        counters["transcriptions"] += 1
+        form = await request.form()
+        error = inject_error()
+        if error:
+            return error
+        await asyncio.sleep(settings.stt_latency)
+        text = "What is going on with interest rates?"
+        if form.get("response_format") == "text":
+            return PlainTextResponse(text + "\n")
+        return {"text": text}
+
+    def synthesis_time(text: str) -> float:
+        return settings.tts_latency + settings.tts_latency_per_char * len(text)
+
+    def fake_audio(text: str) -> bytes:
+        # Not a decodable MP3; sized like one so transport costs are realistic
+        return b"\xff\xf3" + os.urandom(max(64, settings.tts_bytes_per_char * len(text)) - 2)
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        counters["tts"] += 1
+        body = await request.json()
+        error = inject_error()
+        if error:
+            return error
+        text = body.get("text", "")
+        await asyncio.sleep(synthesis_time(text))
+        return Response(fake_audio(text), media_type="audio/mpeg")
+
+    @app.post("/v1/text-to-speech/{voice_id}/stream")
+    async def text_to_speech_stream(voice_id: str, request: Request):
+        counters["tts"] += 1
+        body = await request.json()
+        error = inject_error()
+        if error:
+            return error
+        text = body.get("text", "")
+        audio = fake_audio(text)
+        total = synthesis_time(text)
+        # First bytes after the base latency; the rest spread over the per-char time
+        chunks = [audio[i:i + settings.tts_chunk_bytes] for i in range(0, len(audio), settings.tts_chunk_bytes)]
+        gap = (total - settings.tts_latency) / max(1, len(chunks) - 1)
+
+        async def body_chunks():
+            await asyncio.sleep(settings.tts_latency)
+            for i, part in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(gap)
+                yield part
+
+        return StreamingResponse(body_chunks(), media_type="audio/mpeg")
+
+    return app
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Mock knobs, shared with the load generator so it can start the mock itself."""
+    defaults = MockSettings()
+    parser.add_argument("--ttft", type=float, default=defaults.ttft, help="LLM time to first token (s)")
+    parser.add_argument("--tokens-per-sec", type=float, default=defaults.tokens_per_sec, help="LLM token rate")
+    parser.add_argument("--reply-tokens", type=int, default=defaults.reply_tokens, help="Tokens per LLM reply")
+    parser.add_argument("--stt-latency", type=float, default=defaults.stt_latency, help="Whisper latency (s)")
+    parser.add_argument("--tts-latency", type=float, default=defaults.tts_latency, help="TTS time to first byte (s)")
+    parser.add_argument("--tts-latency-per-char", type=float, default=defaults.tts_latency_per_char,
+                        help="Extra TTS time per character (s)")
+    parser.add_argument("--tts-bytes-per-char", type=int, default=defaults.tts_bytes_per_char,
+                        help="Audio bytes returned per character")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate,
+                        help="Fraction of upstream requests that fail")
+    parser.add_argument("--error-status", type=int, default=defaults.error_status, help="HTTP status for failures")
+
+def settings_from_args(args) -> MockSettings:
+    return MockSettings(
+        ttft=args.ttft,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        stt_latency=args.stt_latency,
+        tts_latency=args.tts_latency,
+        tts_latency_per_char=args.tts_latency_per_char,
+        tts_bytes_per_char=args.tts_bytes_per_char,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--from-env", action="store_true", help="Read settings from MOCK_* variables")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    settings = MockSettings.from_env() if args.from_env else settings_from_args(args)
+    print(f"🧪 Mock upstream on http://{args.host}:{args.port} ({vars(settings)})")
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Trace replay benchmark
+
+Replays turns recorded with TRACE_CAPTURE_FILE (see modules/upstream_trace.py)
+through the real /stream pipeline: stt.transcribe -> transcribe_upload for
+speech turns, then backend.main.run_turn with gpt_stream_to_queues and
+simple_elevenlabs_streamer_websocket. The provider clients are replaced by
+in-process stand-ins that reproduce the recorded token timing, TTS sizes,
+latencies and errors, and STT results. There is no network and no
+randomness, so two runs on the same trace differ only by the pipeline code
+under test.
+
+A TTS segment whose text isn't in the recording (e.g. after a segmenter
+change) gets a latency and size estimated per character from the trace's
+other segments; how many did is reported as ``tts_unmatched``.
+
+Usage:
+    python benchmarks/replay_trace.py trace.jsonl [--concurrency 4] [--speed 1.0]
+                                      [--output run.json] [--compare baseline.json]
+
+Hedging is off by default during replay (recorded latencies already include
+whatever hedging happened); set HEDGE_ENABLED=true to replay with it.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import sys
+import time
+from collections import defaultdict, deque
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Replays must not depend on caches, real keys or earlier runs, nor record themselves
+for name, value in {"OPENAI_API_KEY": "replay", "ELEVENLABS_API_KEY": "replay", "STT_BACKEND": "api",
+                    "STT_FALLBACK": "", "TTS_CACHE_ENABLED": "false", "LLM_CACHE_ENABLED": "false",
+                    "HEDGE_ENABLED": "false", "FILLER_AUDIO": "false", "LOG_LEVEL": "WARNING"}.items():
+    os.environ.setdefault(name, value)
+os.environ["TRACE_CAPTURE_FILE"] = ""
+
+import numpy as np
+
+from load_test import percentiles, git_commit
+from config import SAMPLE_RATE, DEFAULT_VOICE_ID
+from modules import providers, stt, upstream_trace
+from modules.protocol import TRANSPORT_JSON, TRANSPORT_BINARY, TTS_MODE_BUFFERED, TTS_MODE_INCREMENTAL
+from backend.main import run_turn
+
+_replay: contextvars.ContextVar = contextvars.ContextVar("replay", default=None)
+
+class TurnReplay:
+    """Recorded provider behaviour for one turn, handed out in call order."""
+
+    def __init__(self, turn: dict, speed: float, per_char: dict):
+        self.turn = turn
+        self.speed = speed
+        self.per_char = per_char
+        self.stt = deque(turn["stt"])
+        self.tts = defaultdict(deque)
+        for entry in turn["tts"]:
+            self.tts[entry["text"]].append(entry)
+        self.unmatched = 0
+
+    def wait(self, seconds: float) -> float:
+        return seconds / self.speed
+
+    def next_stt(self) -> dict:
+        # The last result repeats if the pipeline asks more often than recorded
+        return self.stt.popleft() if len(self.stt) > 1 else self.stt[0]
+
+    def next_tts(self, text: str) -> dict:
+        entries = self.tts.get(text)
+        if entries:
+            return entries.popleft() if len(entries) > 1 else entries[0]
+        self.unmatched += 1
+        return {"text": text, "latency": self.per_char["latency"] * len(text),
+                "bytes": int(self.per_char["bytes"] * len(text))}
+
+def per_char_estimates(turns) -> dict:
+    """Average buffered-synthesis latency and audio bytes per character across the trace."""
+    chars = latency = size = 0
+    for turn in turns:
+        for entry in turn["tts"]:
+            if "bytes" in entry and "error" not in entry:
+                chars += len(entry["text"])
+                latency += entry["latency"]
+                size += entry["bytes"]
+            elif "chunks" in entry:
+                chars += len(entry["text"])
+                latency += sum(dt for dt, _ in entry["chunks"])
+                size += sum(n for _, n in entry["chunks"])
+    chars = max(chars, 1)
+    return {"latency": latency / chars, "bytes": size / chars}
+
+# Stand-ins for the SDK clients, shaped like the calls the pipeline makes
+
+class _TokenStream:
+    def __init__(self, replay: TurnReplay):
+        self.replay = replay
+
+    async def __aiter__(self):
+        for dt, token in self.replay.turn["llm"]:
+            await asyncio.sleep(self.replay.wait(dt))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    async def close(self):
+        pass
+
+class _ChatCompletions:
+    async def create(self, model, messages, stream=False, **kwargs):
+        return _TokenStream(_replay.get())
+
+class _Transcriptions:
+    async def create(self, model, file, response_format="text", **kwargs):
+        replay = _replay.get()
+        entry = replay.next_stt()
+        await asyncio.sleep(replay.wait(entry["latency"]))
+        return entry["text"]
+
+class _TextToSpeech:
+    async def convert(self, voice_id, text, model_id=None, output_format=None):
+        replay = _replay.get()
+        entry = replay.next_tts(text)
+        if "chunks" in entry:
+            await asyncio.sleep(replay.wait(sum(dt for dt, _ in entry["chunks"])))
+            yield bytes(sum(n for _, n in entry["chunks"]))
+            return
+        await asyncio.sleep(replay.wait(entry["latency"]))
+        if "error" in entry:
+            raise RuntimeError(entry["error"])
+        yield bytes(entry["bytes"])
+
+    async def stream(self, voice_id, text, model_id=None, output_format=None):
+        replay = _replay.get()
+        entry = replay.next_tts(text)
+        if "chunks" not in entry:
+            async for chunk in self.convert(voice_id, text, model_id, output_format):
+                yield chunk
+            return
+        for dt, size in entry["chunks"]:
+            await asyncio.sleep(replay.wait(dt))
+            yield bytes(size)
+
+def install_replay_clients():
+    openai = SimpleNamespace(chat=SimpleNamespace(completions=_ChatCompletions()),
+                             audio=SimpleNamespace(transcriptions=_Transcriptions()))
+    elevenlabs = SimpleNamespace(text_to_speech=_TextToSpeech())
+    providers.set_clients(async_openai=openai, async_elevenlabs=elevenlabs)
+
+class RecordingSocket:
+    """Collects what run_turn sends, with arrival times."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_text = self.first_audio = None
+        self.audio_bytes = 0
+        self.messages = 0
+        self.segment_errors = 0
+
+    def _now(self):
+        return time.perf_counter() - self.start
+
+    async def send_text(self, data: str):
+        self.messages += 1
+        message = json.loads(data)
+        if message["type"] == "text_chunk" and self.first_text is None:
+            self.first_text = self._now()
+        elif message["type"] == "audio_chunk":
+            self.first_audio = self.first_audio if self.first_audio is not None else self._now()
+            self.audio_bytes += len(message["audio_data"])
+        elif message["type"] == "segment_error":
+            self.segment_errors += 1
+
+    async def send_bytes(self, data: bytes):
+        self.messages += 1
+        self.first_audio = self.first_audio if self.first_audio is not None else self._now()
+        self.audio_bytes += len(data)
+
+async def replay_turn(turn: dict, args, per_char: dict) -> dict:
+    replay = TurnReplay(turn, args.speed, per_char)
+    _replay.set(replay)
+    socket = RecordingSocket()
+    text = turn["input"]
+    if turn["stt"]:
+        silence = np.zeros(int(turn["stt"][0]["audio_s"] * SAMPLE_RATE), dtype=np.float32)
+        text = await stt.transcribe(silence, SAMPLE_RATE)
+    await run_turn(socket, text, turn.get("voice_id") or DEFAULT_VOICE_ID, args.transport, args.tts_mode)
+    return {
+        "turn_id": turn.get("turn_id"),
+        "first_text_s": socket.first_text,
+        "first_audio_s": socket.first_audio,
+        "duration_s": socket._now(),
+        "messages": socket.messages,
+        "audio_bytes": socket.audio_bytes,
+        "segment_errors": socket.segment_errors,
+        "tts_unmatched": replay.unmatched,
+    }
+
+async def run(args) -> dict:
+    turns = [turn for turn in upstream_trace.load(args.trace) if turn.get("input") and turn["llm"]]
+    if args.limit:
+        turns = turns[:args.limit]
+    per_char = per_char_estimates(turns)
+    install_replay_clients()
+
+    pending = deque(turns)
+    results = []
+
+    async def worker():
+        while pending:
+            results.append(await replay_turn(pending.popleft(), args, per_char))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    def values(key):
+        return [r[key] for r in results if r[key] is not None]
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {"trace": os.path.basename(args.trace), "turns": len(turns), "concurrency": args.concurrency,
+                   "speed": args.speed, "transport": args.transport, "tts_mode": args.tts_mode},
+        "elapsed_s": round(elapsed, 3),
+        "time_to_first_text_s": percentiles(values("first_text_s")),
+        "time_to_first_audio_s": percentiles(values("first_audio_s")),
+        "turn_duration_s": percentiles(values("duration_s")),
+        "messages": sum(r["messages"] for r in results),
+        "segment_errors": sum(r["segment_errors"] for r in results),
+        "tts_unmatched": sum(r["tts_unmatched"] for r in results),
+        "turns": results,
+    }
+
+METRICS = (("first text", "time_to_first_text_s"), ("first audio", "time_to_first_audio_s"),
+           ("turn", "turn_duration_s"))
+
+def print_summary(report: dict, baseline: dict = None):
+    print(f"\n📼 Replayed {report['config']['turns']} turns in {report['elapsed_s']}s "
+          f"({report['messages']} messages, {report['segment_errors']} failed segments, "
+          f"{report['tts_unmatched']} unmatched TTS texts)")
+    for label, key in METRICS:
+        p = report[key]
+        if not p.get("count"):
+            continue
+        line = f"    {label:<12} p50 {p['p50']:.3f}s  p95 {p['p95']:.3f}s  p99 {p['p99']:.3f}s"
+        base = (baseline or {}).get(key, {})
+        if base.get("count"):
+            line += (f"   vs {baseline.get('commit') or 'baseline'}: "
+                     f"p50 {p['p50'] - base['p50']:+.3f}s  p95 {p['p95'] - base['p95']:+.3f}s")
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="JSONL file written with TRACE_CAPTURE_FILE")
+    parser.add_argument("--concurrency", type=int, default=1, help="Turns replayed at the same time")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay faster (>1) or slower than recorded")
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N turns")
+    parser.add_argument("--transport", choices=[TRANSPORT_JSON, TRANSPORT_BINARY], default=TRANSPORT_BINARY)
+    parser.add_argument("--tts-mode", choices=[TTS_MODE_BUFFERED, TTS_MODE_INCREMENTAL], default=TTS_MODE_BUFFERED)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Earlier report to print deltas against")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of a summary")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        baseline = None
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        print_summary(report, baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Segmenter benchmark
+
+Replays recorded LLM token streams through each segmenter on a virtual clock
+and reports how many TTS requests it would make and when the first segment
+becomes available.
+
+Token streams are JSONL files with one ``{"dt": seconds, "token": "..."}``
+object per line, where ``dt`` is the time since the previous token.
+
+Usage:
+    python benchmarks/segmenter_bench.py [stream.jsonl ...] [--json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.segmenter import SEGMENTERS
+
+DEFAULT_STREAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "token_streams", "*.jsonl")
+
+def load_stream(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def simulate(segmenter, stream):
+    """Feed a token stream through a segmenter, honouring its stall timeout."""
+    now = 0.0
+    emitted = []  # (time, text)
+
+    for item in stream:
+        arrival = now + item["dt"]
+        # Fire stall flushes that would have happened while waiting for this token
+        while True:
+            timeout = segmenter.timeout()
+            if timeout is None or now + timeout >= arrival:
+                break
+            now += timeout
+            stalled = segmenter.on_stall()
+            emitted += [(now, text) for text in stalled]
+            if not stalled:
+                break
+
+        now = arrival
+        emitted += [(now, text) for text in segmenter.feed(item["token"])]
+
+    emitted += [(now, text) for text in segmenter.flush()]
+    return emitted, now
+
+def run(paths):
+    results = []
+    for path in paths:
+        stream = load_stream(path)
+        for name, factory in SEGMENTERS.items():
+            emitted, duration = simulate(factory(), stream)
+            lengths = [len(text) for _, text in emitted]
+            results.append({
+                "stream": os.path.basename(path),
+                "segmenter": name,
+                "requests": len(emitted),
+                "first_segment_latency_ms": round(emitted[0][0] * 1000, 1) if emitted else None,
+                "first_segment_chars": lengths[0] if lengths else 0,
+                "mean_segment_chars": round(sum(lengths) / len(lengths), 1) if lengths else 0,
+                "stream_duration_ms": round(duration * 1000, 1),
+                "segments": [text for _, text in emitted],
+            })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TTS text segmenters on recorded token streams")
+    parser.add_argument("streams", nargs="*", help="token stream JSONL files (default: benchmarks/token_streams)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--show-segments", action="store_true", help="print the produced segments")
+    args = parser.parse_args()
+
+    paths = args.streams or sorted(glob.glob(DEFAULT_STREAMS))
+    if not paths:
+        print("❌ No token streams found")
+        sys.exit(1)
+
+    results = run(paths)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'stream':<24} {'segmenter':<10} {'requests':>8} {'first (ms)':>11} {'first chars':>12} {'mean chars':>11}")
+    print("-" * 80)
+    for r in results:
+        print(f"{r['stream']:<24} {r['segmenter']:<10} {r['requests']:>8} "
+              f"{r['first_segment_latency_ms']:>11} {r['first_segment_chars']:>12} {r['mean_segment_chars']:>11}")
+        if args.show_segments:
+            for text in r["segments"]:
+                print(f"    | {text}")
+
+if __name__ == "__main__":
+    main()
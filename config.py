@@ -5,6 +5,9 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+# Point the upstream clients somewhere else (e.g. the benchmark mock servers)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL") or None
 
 # Free plan voices available: "Rachel", "Domi", "Bella"
 FREE_VOICES = {
@@ -27,4 +30,165 @@ FREE_VOICES = {
 
 DEFAULT_VOICE = "Rachel"  # Default fallback voice name
 DEFAULT_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"  # Rachel's voice ID
-SAMPLE_RATE = 16000
\ No newline at end of file
+SAMPLE_RATE = 16000
+
+# TTS pipelining: how many segments may be synthesized at the same time.
+# Audio is still delivered to the client in text order.
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "3"))
+
+TTS_MODEL_ID = os.getenv("TTS_MODEL_ID", "eleven_multilingual_v2")
+
+# Shared upstream connection pool (reused across turns and sessions)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # seconds an idle connection stays pooled
+UPSTREAM_EXECUTOR_WORKERS = int(os.getenv("UPSTREAM_EXECUTOR_WORKERS", "8"))
+
+# Provider output format; MP3 can be played back from the first bytes
+TTS_OUTPUT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "mp3_44100_128")
+# Per-segment hand-off queue (in provider chunks) between incremental TTS
+# synthesis and the sender; provider audio beyond it is buffered, not throttled
+TTS_STREAM_BUFFER_CHUNKS = int(os.getenv("TTS_STREAM_BUFFER_CHUNKS", "32"))
+
+# Text segmentation for TTS ("adaptive" or the original "fixed" heuristic)
+TTS_SEGMENTER = os.getenv("TTS_SEGMENTER", "adaptive")
+SEGMENT_FIRST_MIN_CHARS = int(os.getenv("SEGMENT_FIRST_MIN_CHARS", "20"))
+SEGMENT_MIN_CHARS = int(os.getenv("SEGMENT_MIN_CHARS", "60"))
+SEGMENT_GROWTH = float(os.getenv("SEGMENT_GROWTH", "1.5"))
+SEGMENT_MAX_CHARS = int(os.getenv("SEGMENT_MAX_CHARS", "300"))
+SEGMENT_STALL_TIMEOUT = float(os.getenv("SEGMENT_STALL_TIMEOUT", "0.4"))
+
+# TTS audio cache: in-memory LRU in front of an on-disk store (empty dir = memory only)
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_MEMORY_MB = int(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "tts"))
+TTS_CACHE_DISK_MB = int(os.getenv("TTS_CACHE_DISK_MB", "1024"))
+TTS_CACHE_MAX_ENTRY_KB = int(os.getenv("TTS_CACHE_MAX_ENTRY_KB", "2048"))
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+# Optional LLM response cache (for FAQs / demo scripts); replay speed 0 = immediate
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+LLM_CACHE_REPLAY_TOKENS_PER_SEC = float(os.getenv("LLM_CACHE_REPLAY_TOKENS_PER_SEC", "0"))
+
+# Server-side voice activity detection / endpointing for streamed microphone audio
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "20"))
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))
+VAD_NOISE_MARGIN_DB = float(os.getenv("VAD_NOISE_MARGIN_DB", "10"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "200"))
+VAD_END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", "700"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "300"))
+VAD_MAX_UTTERANCE_S = float(os.getenv("VAD_MAX_UTTERANCE_S", "30"))
+# Local microphone capture (modules/record.py): callback block size, ring
+# buffer length, and input device (name or index; empty = system default)
+CAPTURE_BLOCK_MS = int(os.getenv("CAPTURE_BLOCK_MS", "20"))
+CAPTURE_BUFFER_S = float(os.getenv("CAPTURE_BUFFER_S", "30"))
+CAPTURE_DEVICE = os.getenv("CAPTURE_DEVICE") or None
+# Speculative answers: after SPECULATIVE_SILENCE_MS of trailing silence (less
+# than VAD_END_SILENCE_MS) start generating on an interim transcript. Opt-in;
+# clients can also turn it on per connection with {"speculative": true} in hello
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "false").lower() == "true"
+SPECULATIVE_SILENCE_MS = int(os.getenv("SPECULATIVE_SILENCE_MS", "300"))
+
+# Filler audio: short acknowledgement clips, pre-synthesized for every voice in
+# FREE_VOICES, played when an answer has no audio FILLER_DELAY_MS after the
+# turn started. Opt-in; clients can also set {"filler": true} in hello
+FILLER_AUDIO = os.getenv("FILLER_AUDIO", "false").lower() == "true"
+FILLER_DELAY_MS = int(os.getenv("FILLER_DELAY_MS", "800"))
+FILLER_PHRASES = [p.strip() for p in os.getenv("FILLER_PHRASES", "Okay.|Hmm, let me see.|Sure.|Right.").split("|") if p.strip()]
+
+# /transcribe uploads are decoded, downmixed, resampled to SAMPLE_RATE and
+# trimmed in memory (compressed formats need ffmpeg), then sent to the Whisper
+# API as STT_UPLOAD_FORMAT: "ogg" (Opus, needs ffmpeg) or "wav"
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+TRIM_SILENCE_PAD_MS = int(os.getenv("TRIM_SILENCE_PAD_MS", "200"))
+STT_UPLOAD_FORMAT = os.getenv("STT_UPLOAD_FORMAT", "ogg")
+
+# Speech-to-text backend: "api" (OpenAI Whisper API) or "local" (faster-whisper)
+STT_BACKEND = os.getenv("STT_BACKEND", "api")
+STT_FALLBACK = os.getenv("STT_FALLBACK", "api")  # retried when the primary backend errors; "" = retry the primary
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
+WHISPER_MODEL_DIR = os.getenv("WHISPER_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = let CTranslate2 decide
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", "2"))
+WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "1"))
+
+# Conversation memory. SYSTEM_PROMPT is sent first, byte-for-byte identical on
+# every request, so provider prompt caching can reuse it.
+SYSTEM_PROMPT = os.getenv(
+    "SYSTEM_PROMPT",
+    "You are a friendly voice assistant. Your replies are spoken aloud, so keep them "
+    "short and conversational, and avoid lists, markdown and symbols that don't read well."
+)
+CONVERSATION_MAX_TOKENS = int(os.getenv("CONVERSATION_MAX_TOKENS", "2000"))
+CONVERSATION_COMPACT_RATIO = float(os.getenv("CONVERSATION_COMPACT_RATIO", "0.6"))
+CONVERSATION_SUMMARY_MAX_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "300"))
+CONVERSATION_MAX_MESSAGE_CHARS = int(os.getenv("CONVERSATION_MAX_MESSAGE_CHARS", "4000"))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "5000"))
+CONVERSATION_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", "1800"))
+
+# Per-turn traces kept for /traces: a random sample plus every slow turn
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_SLOW_TURN_SECONDS = float(os.getenv("TRACE_SLOW_TURN_SECONDS", "8"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+# Append every turn's upstream behaviour (LLM token timing, TTS sizes and
+# latencies, STT results) to this JSONL file for benchmarks/replay_trace.py
+TRACE_CAPTURE_FILE = os.getenv("TRACE_CAPTURE_FILE", "")
+
+# Backpressure on /stream. The LLM -> TTS queue is bounded (a full queue pauses
+# reading the LLM stream), TTS works at most TTS_MAX_PENDING_SEGMENTS ahead of
+# what has been sent, text chunks beyond TEXT_QUEUE_MAX_CHUNKS are merged, and a
+# client that doesn't accept a send within WS_SEND_TIMEOUT seconds is dropped.
+LLM_QUEUE_MAX_TOKENS = int(os.getenv("LLM_QUEUE_MAX_TOKENS", "64"))
+TEXT_QUEUE_MAX_CHUNKS = int(os.getenv("TEXT_QUEUE_MAX_CHUNKS", "32"))
+TTS_MAX_PENDING_SEGMENTS = int(os.getenv("TTS_MAX_PENDING_SEGMENTS", "4"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# text_chunk coalescing: the first chunk of an answer is sent right away, later
+# ones are batched for up to TEXT_COALESCE_MS or TEXT_COALESCE_MAX_CHARS
+# (0 ms = one message per LLM token)
+TEXT_COALESCE_MS = float(os.getenv("TEXT_COALESCE_MS", "30"))
+TEXT_COALESCE_MAX_CHARS = int(os.getenv("TEXT_COALESCE_MAX_CHARS", "400"))
+
+# Request-path logging (modules/log.py); DEBUG adds per-segment TTS and full LLM replies
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Production serving (start.py --production)
+BACKEND_WORKERS = int(os.getenv("BACKEND_WORKERS", str(os.cpu_count() or 1)))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "30"))  # seconds to let running turns finish on SIGTERM
+# Connections opened per provider by a cheap request at startup, so the first
+# turn doesn't pay DNS and TLS (0 = don't touch the network before ready)
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+
+# Process-wide upstream admission control (see modules/admission.py).
+# Rate limits are requests per second; 0 disables them.
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+OPENAI_RATE_LIMIT_RPS = float(os.getenv("OPENAI_RATE_LIMIT_RPS", "0"))
+ELEVENLABS_MAX_CONCURRENCY = int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "10"))
+ELEVENLABS_RATE_LIMIT_RPS = float(os.getenv("ELEVENLABS_RATE_LIMIT_RPS", "0"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "5"))
+
+# Tail-latency control (see modules/hedging.py). A TTS or STT call slower than
+# the HEDGE_PERCENTILE of recent calls gets a duplicate request; hedges and
+# retries together are capped at RETRY_BUDGET_RATIO of requests. Until
+# HEDGE_MIN_SAMPLES calls have been seen the *_HEDGE_DELAY defaults apply.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "10"))
+# Per-stage deadlines in seconds (TTS_DEADLINE bounds a segment's first audio
+# when streaming). STT time grows with the audio, so STT latencies are tracked
+# and STT_HEDGE_DELAY is given per second of audio.
+TTS_HEDGE_DELAY = float(os.getenv("TTS_HEDGE_DELAY", "2"))
+TTS_DEADLINE = float(os.getenv("TTS_DEADLINE", "10"))
+STT_HEDGE_DELAY = float(os.getenv("STT_HEDGE_DELAY", "0.5"))
+STT_DEADLINE = float(os.getenv("STT_DEADLINE", "20"))
+# Backend for STT hedges ("" = same as STT_BACKEND, e.g. "local" to race the API)
+STT_HEDGE_BACKEND = os.getenv("STT_HEDGE_BACKEND", "")
@@ -0,0 +1,181 @@
+"""
+Process-wide admission control for upstream API calls.
+
+All sessions share one limiter per provider ("openai" for chat completions
+and the Whisper API, "elevenlabs" for TTS), each with a concurrency cap and
+an optional requests-per-second rate. Callers wait in a priority queue, so
+under load speech-to-text and the first TTS segment of an answer go ahead of
+LLM requests and tail segments of long answers. When the queue is full, or a
+request would wait longer than ADMISSION_MAX_WAIT, it is rejected right away
+with ``UpstreamSaturated`` instead of piling onto a slow provider.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from config import (
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_RATE_LIMIT_RPS,
+    ELEVENLABS_MAX_CONCURRENCY,
+    ELEVENLABS_RATE_LIMIT_RPS,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_WAIT,
+)
+from modules import metrics
+
+# Lower runs first
+PRIORITY_STT = 0
+PRIORITY_FIRST_SEGMENT = 0
+PRIORITY_LLM = 1
+PRIORITY_TAIL_SEGMENT = 2
+
+REJECTIONS = metrics.counter("voice_upstream_rejections_total", "Upstream calls rejected by admission control")
+
+class UpstreamSaturated(RuntimeError):
+    """The provider's limiter is saturated; retry later."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} is busy ({reason}), please try again")
+        self.provider = provider
+        self.reason = reason
+
+class UpstreamLimiter:
+    def __init__(self, name: str, max_concurrency: int, rate_per_sec: float = 0,
+                 max_queue: int = ADMISSION_MAX_QUEUE, max_wait: float = ADMISSION_MAX_WAIT):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate_per_sec = rate_per_sec
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters = []  # heap of (priority, order, future)
+        self._order = itertools.count()
+        # Token bucket for the rate limit, allowing a burst of up to one second
+        self._tokens = max(1.0, rate_per_sec)
+        self._refilled_at = time.monotonic()
+        self._timer = None
+        self.wait_time = metrics.histogram(
+            f"voice_{name}_admission_wait_seconds", f"Time {name} calls waited for admission",
+            buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0),
+        )
+        self.counters = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "max_queue_seen": 0}
+
+    def _take_token(self) -> bool:
+        if self.rate_per_sec <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.rate_per_sec), self._tokens + (now - self._refilled_at) * self.rate_per_sec)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _dispatch(self):
+        """Admit waiters, best priority first, while there is capacity."""
+        self._timer = None
+        while self._waiters and self.active < self.max_concurrency:
+            _, _, future = self._waiters[0]
+            if future.done():  # Gave up while queued
+                heapq.heappop(self._waiters)
+                continue
+            if not self._take_token():
+                delay = (1 - self._tokens) / self.rate_per_sec
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.active += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: int = PRIORITY_LLM):
+        start = time.perf_counter()
+        if not self._waiters and self.active < self.max_concurrency and self._take_token():
+            self.active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self._reject("rejected_queue_full", "queue full")
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._order), future))
+            self.counters["max_queue_seen"] = max(self.counters["max_queue_seen"], len(self._waiters))
+            if self._timer is None:
+                self._dispatch()
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            except asyncio.TimeoutError:
+                self._abandon(future)
+                self._reject("rejected_timeout", f"no capacity within {self.max_wait:.0f}s")
+            except asyncio.CancelledError:
+                self._abandon(future)
+                raise
+        self.counters["admitted"] += 1
+        self.wait_time.observe(time.perf_counter() - start)
+
+    def _abandon(self, future):
+        if future.done() and not future.cancelled():
+            self.release()  # Admitted just as we gave up; hand the slot on
+        else:
+            future.cancel()
+
+    def _reject(self, counter: str, reason: str):
+        self.counters[counter] += 1
+        REJECTIONS.inc(provider=self.name, reason=counter)
+        raise UpstreamSaturated(self.name, reason)
+
+    def release(self):
+        self.active -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_LLM):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def stats(self) -> dict:
+        p95 = self.wait_time.quantile(0.95)
+        return {
+            **self.counters,
+            "active": self.active,
+            "queued": self.queued(),
+            "max_concurrency": self.max_concurrency,
+            "rate_per_sec": self.rate_per_sec,
+            "wait_p95_s": p95,
+        }
+
+_limiters: Dict[str, UpstreamLimiter] = {}
+
+LIMITS = {
+    "openai": (OPENAI_MAX_CONCURRENCY, OPENAI_RATE_LIMIT_RPS),
+    "elevenlabs": (ELEVENLABS_MAX_CONCURRENCY, ELEVENLABS_RATE_LIMIT_RPS),
+}
+
+def get_limiter(provider: str) -> UpstreamLimiter:
+    if provider not in _limiters:
+        max_concurrency, rate = LIMITS[provider]
+        _limiters[provider] = UpstreamLimiter(provider, max_concurrency, rate)
+    return _limiters[provider]
+
+def slot(provider: str, priority: int = PRIORITY_LLM):
+    """``async with admission.slot("elevenlabs", PRIORITY_FIRST_SEGMENT): ...``"""
+    return get_limiter(provider).slot(priority)
+
+def stats() -> dict:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+def gauges() -> Dict[str, float]:
+    """Queue depth and in-flight calls per provider, for /metrics."""
+    values = {}
+    for name, limiter in _limiters.items():
+        values[f"voice_{name}_admission_queued"] = limiter.queued()
+        values[f"voice_{name}_admission_active"] = limiter.active
+    return values
+
+metrics.register_collector(gauges)
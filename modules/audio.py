@@ -0,0 +1,123 @@
+"""
+In-memory audio helpers shared by the STT, VAD and capture code.
+
+Samples are mono float32 NumPy arrays in [-1, 1]; wire/device audio is
+16-bit little-endian PCM. WAV is handled with the standard library; other
+containers (webm/opus, mp3, m4a) are piped through ffmpeg when it is
+installed, so nothing touches disk.
+"""
+import functools
+import io
+import shutil
+import subprocess
+import wave
+from typing import Tuple
+import numpy as np
+from config import SAMPLE_RATE, FFMPEG_BINARY, STT_UPLOAD_FORMAT
+from modules.vad import trim_silence
+from modules.log import log
+
+class AudioDecodeError(ValueError):
+    """The upload couldn't be decoded in memory."""
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    """Decode 16-bit little-endian PCM bytes into float32 samples."""
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+def float_to_pcm16(samples: np.ndarray) -> bytes:
+    """Encode float32 samples as 16-bit little-endian PCM bytes."""
+    clipped = np.clip(samples, -1.0, 1.0)
+    return (clipped * 32767.0).astype("<i2").tobytes()
+
+def to_wav_bytes(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Wrap mono samples in a 16-bit WAV container, without touching disk."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(float_to_pcm16(samples))
+    return buffer.getvalue()
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Linear-interpolation resampling; plenty for speech going into Whisper."""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    n_out = int(round(len(samples) * dst_rate / src_rate))
+    positions = np.arange(n_out, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """Average (frames, channels) audio down to mono."""
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1, dtype=np.float32)
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """Decode PCM WAV bytes into mono float32 samples and their sample rate."""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wf:
+            channels, width, rate = wf.getnchannels(), wf.getsampwidth(), wf.getframerate()
+            raw = wf.readframes(wf.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise AudioDecodeError(f"Invalid WAV: {e}")
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        # Sign-extend 24-bit little-endian samples into int32
+        triples = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = (triples[:, 0] << 8 | triples[:, 1] << 16 | triples[:, 2] << 24) >> 8
+        samples = ints.astype(np.float32) / 8388608.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"Unsupported WAV sample width: {width}")
+    return downmix(samples.reshape(-1, channels)), rate
+
+@functools.lru_cache(maxsize=1)
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_BINARY) is not None
+
+def _ffmpeg(args, data: bytes) -> bytes:
+    if not ffmpeg_available():
+        raise AudioDecodeError(f"{FFMPEG_BINARY} not found")
+    result = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", *args],
+                            input=data, capture_output=True, timeout=30)
+    if result.returncode != 0:
+        raise AudioDecodeError(result.stderr.decode("utf-8", "replace").strip() or "ffmpeg failed")
+    return result.stdout
+
+def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode any supported upload to mono float32 samples at ``sample_rate``."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            samples, rate = decode_wav(data)
+            return resample(samples, rate, sample_rate)
+        except AudioDecodeError:
+            pass  # e.g. float or compressed WAV; ffmpeg can still read it
+    # ffmpeg downmixes and resamples while decoding
+    pcm = _ffmpeg(["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"], data)
+    return pcm16_to_float(pcm)
+
+def encode_for_upload(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Tuple[bytes, str]:
+    """
+    Compact encoding for sending speech to the Whisper API: Ogg/Opus when
+    STT_UPLOAD_FORMAT is "ogg" and ffmpeg is available, otherwise WAV.
+    Returns the bytes and a filename whose extension names the format.
+    """
+    if STT_UPLOAD_FORMAT == "ogg" and ffmpeg_available():
+        try:
+            ogg = _ffmpeg(["-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+                           "-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg", "pipe:1"],
+                          float_to_pcm16(samples))
+            return ogg, "audio.ogg"
+        except AudioDecodeError as e:
+            log.warning("⚠️  Opus encoding failed, sending WAV: %s", e)
+    return to_wav_bytes(samples, sample_rate), "audio.wav"
+
+def preprocess_upload(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode, downmix, resample and trim leading/trailing silence, all in memory."""
+    return trim_silence(decode_audio(data, sample_rate), sample_rate)
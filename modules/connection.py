@@ -0,0 +1,181 @@
+"""
+Per-connection send buffering and accounting for /stream.
+
+``Connection`` wraps a WebSocket and is passed around wherever the socket
+was. Every send is accounted and bounded in time: a client that stops
+reading makes the send block once the transport buffer is full, and after
+WS_SEND_TIMEOUT seconds the connection is closed as a slow consumer instead
+of letting the turn (and its buffered audio) pile up in server memory.
+
+``TextChunkQueue`` is the overflow policy for the text side of the LLM
+fan-out: it never blocks the producer, and once TEXT_QUEUE_MAX_CHUNKS chunks are waiting it
+merges new text into the last one so a slow reader gets fewer, larger
+text_chunk messages. Its ``get_batch`` also coalesces in time, so a fast
+reader gets one message per TEXT_COALESCE_MS instead of one per token.
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+from typing import Optional
+from config import WS_SEND_TIMEOUT, TEXT_QUEUE_MAX_CHUNKS, TEXT_COALESCE_MS, TEXT_COALESCE_MAX_CHARS
+from modules.log import log
+
+class SlowConsumerError(ConnectionError):
+    """The client stopped reading and the connection was closed."""
+
+class Connection:
+    def __init__(self, websocket, send_timeout: float = WS_SEND_TIMEOUT):
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self.opened_at = time.monotonic()
+        self.closed_reason: Optional[str] = None
+        self.counters = {
+            "bytes_sent": 0,
+            "messages_sent": 0,
+            "bytes_received": 0,
+            "messages_received": 0,
+            "send_seconds": 0.0,
+            "max_send_seconds": 0.0,
+        }
+        _connections.add(self)
+        _totals["opened"] += 1
+
+    def __getattr__(self, name):
+        # accept(), client_state, ... go straight to the socket
+        return getattr(self.websocket, name)
+
+    async def receive(self):
+        frame = await self.websocket.receive()
+        payload = frame.get("bytes") if frame.get("bytes") is not None else frame.get("text")
+        if payload is not None:
+            self.counters["messages_received"] += 1
+            self.counters["bytes_received"] += len(payload)
+        return frame
+
+    async def send_text(self, data: str):
+        await self._send(self.websocket.send_text, data, len(data.encode("utf-8")))
+
+    async def send_bytes(self, data: bytes):
+        await self._send(self.websocket.send_bytes, data, len(data))
+
+    async def _send(self, send, data, size: int):
+        if self.closed_reason == "slow_consumer":
+            raise SlowConsumerError(f"Connection closed: {self.closed_reason}")
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(send(data), self.send_timeout)
+        except asyncio.TimeoutError:
+            await self.close_slow_consumer(size)
+            raise SlowConsumerError(f"Client did not read {size} bytes within {self.send_timeout}s")
+        elapsed = time.perf_counter() - start
+        self.counters["bytes_sent"] += size
+        self.counters["messages_sent"] += 1
+        self.counters["send_seconds"] += elapsed
+        self.counters["max_send_seconds"] = max(self.counters["max_send_seconds"], elapsed)
+        _totals["bytes_sent"] += size
+
+    def mark_closed(self, reason: str = "disconnected"):
+        if self.closed_reason is None:
+            self.closed_reason = reason
+
+    async def close_slow_consumer(self, pending_bytes: int = 0):
+        if self.closed_reason == "slow_consumer":
+            return  # Another send already gave up on this client
+        self.closed_reason = "slow_consumer"
+        _totals["slow_consumers_closed"] += 1
+        log.warning("🐢 Closing slow consumer (%d bytes sent, %d stuck)", self.counters["bytes_sent"], pending_bytes)
+        try:
+            # 1013 = try again later; don't wait on a client that isn't reading
+            await asyncio.wait_for(self.websocket.close(code=1013), 1.0)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "send_seconds": round(self.counters["send_seconds"], 3),
+            "max_send_seconds": round(self.counters["max_send_seconds"], 3),
+            "age_s": round(time.monotonic() - self.opened_at, 1),
+            "closed_reason": self.closed_reason,
+        }
+
+class TextChunkQueue:
+    """asyncio.Queue-like text buffer that coalesces instead of growing or blocking."""
+
+    def __init__(self, max_chunks: int = TEXT_QUEUE_MAX_CHUNKS):
+        self.max_chunks = max_chunks
+        self._items = deque()
+        self._ready = asyncio.Event()
+        self.coalesced = 0
+
+    async def put(self, item: Optional[str]):
+        self.put_nowait(item)
+
+    def put_nowait(self, item: Optional[str]):
+        last = self._items[-1] if self._items else None
+        if item is not None and isinstance(last, str) and len(self._items) >= self.max_chunks:
+            self._items[-1] = last + item
+            self.coalesced += 1
+            _totals["text_chunks_coalesced"] += 1
+        else:
+            self._items.append(item)
+        self._ready.set()
+
+    async def get(self) -> Optional[str]:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popleft()
+
+    async def get_batch(self, window: float = TEXT_COALESCE_MS / 1000,
+                        max_chars: int = TEXT_COALESCE_MAX_CHARS) -> Optional[str]:
+        """
+        Next chunk joined with whatever follows within ``window`` seconds, up
+        to ``max_chars``. None at the end of the stream.
+        """
+        text = await self.get()
+        if text is None or window <= 0:
+            return text
+        parts = [text]
+        size = len(text)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + window
+        while size < max_chars:
+            if not self._items:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                continue
+            if self._items[0] is None:
+                break  # Leave the end marker for the next call
+            text = self._items.popleft()
+            parts.append(text)
+            size += len(text)
+        if len(parts) > 1:
+            _totals["text_chunks_coalesced"] += len(parts) - 1
+        return "".join(parts)
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def full(self) -> bool:
+        return False  # Never blocks; see put_nowait
+
+_connections = weakref.WeakSet()
+_totals = {"opened": 0, "bytes_sent": 0, "slow_consumers_closed": 0, "text_chunks_coalesced": 0}
+
+def stats(top: int = 5) -> dict:
+    """Process totals plus the heaviest open connections by bytes sent."""
+    live = [c for c in list(_connections) if c.closed_reason is None]
+    heaviest = sorted(live, key=lambda c: c.counters["bytes_sent"], reverse=True)[:top]
+    return {
+        **_totals,
+        "open": len(live),
+        "top_connections": [c.stats() for c in heaviest],
+    }
@@ -0,0 +1,169 @@
+"""
+Per-session conversation memory.
+
+Every request starts with the same byte-identical system prompt so provider
+prompt caching applies across turns and sessions. History is kept under a
+token budget: when it overflows, the oldest turns are folded into a short
+running summary in one go (down to CONVERSATION_COMPACT_RATIO of the budget)
+so the cached prefix only changes on those compactions, not every turn.
+
+Sessions are evicted when idle for CONVERSATION_IDLE_TTL seconds or when
+more than CONVERSATION_MAX_SESSIONS are open. Session ids are issued by the
+server (``create()``) and are unguessable; clients can only resume one they
+were given.
+"""
+import re
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+from config import (
+    SYSTEM_PROMPT,
+    LLM_MODEL,
+    CONVERSATION_MAX_TOKENS,
+    CONVERSATION_COMPACT_RATIO,
+    CONVERSATION_SUMMARY_MAX_TOKENS,
+    CONVERSATION_MAX_MESSAGE_CHARS,
+    CONVERSATION_MAX_SESSIONS,
+    CONVERSATION_IDLE_TTL,
+)
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character estimate
+    tiktoken = None
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Token count with the model's local tokenizer (or ~4 chars/token without tiktoken)."""
+    global _encoding
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model(LLM_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("o200k_base")
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    match = re.match(r"(.+?[.!?])(\s|$)", text.strip(), re.S)
+    sentence = match.group(1) if match else text.strip()
+    return sentence[:limit]
+
+class Conversation:
+    def __init__(self, max_tokens: int = CONVERSATION_MAX_TOKENS):
+        self.max_tokens = max_tokens
+        self.history: List[dict] = []  # {"role", "content", "tokens"}
+        self.summary = ""
+        self.history_tokens = 0
+        self.last_used = time.monotonic()
+
+    def build_messages(self, user_input: str) -> List[dict]:
+        """Messages for the next request: stable system prefix, summary, history, new input."""
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Earlier in this conversation: {self.summary}"})
+        messages += [{"role": m["role"], "content": m["content"]} for m in self.history]
+        messages.append({"role": "user", "content": user_input[:CONVERSATION_MAX_MESSAGE_CHARS]})
+        return messages
+
+    def add_turn(self, user_input: str, assistant_reply: str):
+        self.last_used = time.monotonic()
+        for role, content in (("user", user_input), ("assistant", assistant_reply)):
+            content = content[:CONVERSATION_MAX_MESSAGE_CHARS]
+            if not content.strip():
+                continue
+            tokens = count_tokens(content)
+            self.history.append({"role": role, "content": content, "tokens": tokens})
+            self.history_tokens += tokens
+
+        if self.history_tokens > self.max_tokens:
+            self._compact()
+
+    def _compact(self):
+        """Fold the oldest messages into the summary until history fits comfortably."""
+        target = int(self.max_tokens * CONVERSATION_COMPACT_RATIO)
+        notes = []
+        while self.history and self.history_tokens > target:
+            message = self.history.pop(0)
+            self.history_tokens -= message["tokens"]
+            speaker = "User" if message["role"] == "user" else "Assistant"
+            notes.append(f"{speaker}: {_first_sentence(message['content'])}")
+
+        # Keep history starting on a user message
+        while self.history and self.history[0]["role"] != "user":
+            message = self.history.pop(0)
+            self.history_tokens -= message["tokens"]
+
+        summary = " ".join(filter(None, [self.summary] + notes))
+        # Oldest notes go first once the summary itself is over budget
+        while count_tokens(summary) > CONVERSATION_SUMMARY_MAX_TOKENS and " " in summary:
+            summary = summary[len(summary) // 4:].split(" ", 1)[-1]
+        self.summary = summary
+
+    def stats(self) -> dict:
+        return {
+            "messages": len(self.history),
+            "history_tokens": self.history_tokens,
+            "summary_tokens": count_tokens(self.summary) if self.summary else 0,
+        }
+
+class ConversationStore:
+    def __init__(self, max_sessions: int = CONVERSATION_MAX_SESSIONS, idle_ttl: float = CONVERSATION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.stats_counters = {"created": 0, "idle_evictions": 0, "capacity_evictions": 0}
+
+    def get(self, session_id: str) -> Conversation:
+        """Conversation for a session, created on first use."""
+        self._sweep()
+        conversation = self._sessions.get(session_id)
+        if conversation is None:
+            conversation = Conversation()
+            self._sessions[session_id] = conversation
+            self.stats_counters["created"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats_counters["capacity_evictions"] += 1
+        self._sessions.move_to_end(session_id)
+        conversation.last_used = time.monotonic()
+        return conversation
+
+    def create(self) -> Tuple[str, Conversation]:
+        """A new session under a fresh random id."""
+        session_id = secrets.token_urlsafe(24)
+        return session_id, self.get(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < 30:
+            return
+        self._last_sweep = now
+        # Sessions are in least-recently-used order, so stop at the first live one
+        while self._sessions:
+            session_id, conversation = next(iter(self._sessions.items()))
+            if now - conversation.last_used < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.stats_counters["idle_evictions"] += 1
+
+    def stats(self) -> dict:
+        return {**self.stats_counters, "sessions": len(self._sessions)}
+
+_store = None
+
+def get_conversation_store() -> ConversationStore:
+    global _store
+    if _store is None:
+        _store = ConversationStore()
+    return _store
@@ -0,0 +1,91 @@
+"""
+Pre-synthesized filler clips to mask the wait for the first real audio.
+
+Each voice gets a small bank of short acknowledgements (FILLER_PHRASES),
+rendered once through the TTS cache and then kept in memory. When an answer
+has produced no audio FILLER_DELAY_MS after the turn started, the TTS sender
+plays one of them first (see send_audio_in_order) and the real segments
+follow it in order. Banks are rendered during warm-up when FILLER_AUDIO is
+on, otherwise on the first turn that asks for one (that turn goes without).
+Only the FREE_VOICES get banks: a turn with any other voice_id plays no
+filler, so clients can't make the server pay for (and keep) banks for
+arbitrary voices.
+"""
+import asyncio
+import itertools
+from typing import Dict, List, Optional, Tuple
+from config import FREE_VOICES, FILLER_PHRASES, TTS_MODEL_ID, TTS_OUTPUT_FORMAT
+from modules import metrics, admission, upstream_trace
+from modules.log import log
+from modules.tts_cache import get_tts_cache, make_key
+
+FILLERS_SENT = metrics.counter("voice_filler_clips_sent_total", "Filler clips played before the first answer audio")
+
+VOICE_IDS = frozenset(voice["id"] for voice in FREE_VOICES.values())
+
+_banks: Dict[str, List[Tuple[str, bytes]]] = {}
+_loading: Dict[str, asyncio.Task] = {}
+_rotation = itertools.count()
+_stats = {"sent": 0, "render_failures": 0}
+
+async def _render(voice_id: str) -> List[Tuple[str, bytes]]:
+    # simple_tts is what plays the clips, so import it here rather than at the top
+    from modules.simple_tts import synthesize_audio
+
+    upstream_trace.detach()  # May be started from a turn, but isn't part of it
+    cache = get_tts_cache()
+
+    async def render(phrase: str):
+        key = make_key(voice_id, TTS_MODEL_ID, phrase, TTS_OUTPUT_FORMAT)
+        audio = await cache.get(key) if cache else None
+        if not audio:
+            try:
+                audio = await synthesize_audio(phrase, voice_id, admission.PRIORITY_TAIL_SEGMENT)
+            except Exception as e:
+                _stats["render_failures"] += 1
+                log.warning("⚠️  Filler %r for voice %s failed: %s", phrase, voice_id, e)
+                return None
+            if cache:
+                cache.put(key, audio)
+        return phrase, audio
+
+    clips = await asyncio.gather(*(render(phrase) for phrase in FILLER_PHRASES))
+    _banks[voice_id] = [clip for clip in clips if clip]
+    return _banks[voice_id]
+
+def load(voice_id: str) -> Optional[asyncio.Task]:
+    """Start rendering (once) the bank for ``voice_id``; None for voices outside FREE_VOICES."""
+    if voice_id not in VOICE_IDS:
+        return None
+    task = _loading.get(voice_id)
+    if task is None or (task.done() and (task.cancelled() or task.exception())):
+        task = _loading[voice_id] = asyncio.create_task(_render(voice_id))
+    return task
+
+async def preload(voice_ids=None):
+    """Render the banks for every free voice (or ``voice_ids``)."""
+    voice_ids = [voice_id for voice_id in (voice_ids or VOICE_IDS) if voice_id in VOICE_IDS]
+    await asyncio.gather(*(load(voice_id) for voice_id in voice_ids))
+    print(f"🗣️  Filler clips ready: {sum(len(_banks.get(v, [])) for v in voice_ids)} for {len(voice_ids)} voices")
+
+def pick(voice_id: str) -> Optional[Tuple[str, bytes]]:
+    """A (text, audio) clip for this voice, rotating through the bank; None until rendered."""
+    if voice_id not in VOICE_IDS:
+        return None
+    bank = _banks.get(voice_id)
+    if not bank:
+        load(voice_id)
+        return None
+    return bank[next(_rotation) % len(bank)]
+
+def record_sent():
+    _stats["sent"] += 1
+    FILLERS_SENT.inc()
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "voices": len(_banks),
+        "clips": sum(len(bank) for bank in _banks.values()),
+        "memory_bytes": sum(len(audio) for bank in _banks.values() for _, audio in bank),
+    }
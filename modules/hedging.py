@@ -0,0 +1,203 @@
+"""
+Latency-aware hedging, deadlines and retry budgets for upstream calls.
+
+Each stage ("tts", "stt") keeps a rolling window of recent latencies. When a
+request runs past the HEDGE_PERCENTILE of that window, a duplicate is fired
+(optionally to an alternative backend) and whichever answers first wins; the
+other is cancelled. Failed requests are retried once. Hedges and retries both
+spend from a per-stage retry budget that earns RETRY_BUDGET_RATIO tokens per
+request, so together they add at most ~10% upstream load instead of doubling
+it when a provider slows down. Admission rejections are never retried. Every call has a deadline after which it fails
+with ``DeadlineExceeded`` rather than stalling the turn.
+"""
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+import numpy as np
+from config import (
+    HEDGE_ENABLED,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MAX_TOKENS,
+)
+from modules import metrics
+from modules.admission import UpstreamSaturated
+from modules.log import log
+
+HEDGES = metrics.counter("voice_hedged_requests_total", "Hedge and retry requests by stage and outcome")
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """An upstream stage didn't finish within its deadline."""
+
+class RetryBudget:
+    """Token bucket: every request earns ``ratio`` tokens, every hedge/retry costs one."""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, max_tokens: float = RETRY_BUDGET_MAX_TOKENS):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        # Rounded so that e.g. ten deposits of 0.1 make a whole token
+        self.tokens = min(self.max_tokens, round(self.tokens + self.ratio, 9))
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class Stage:
+    """Latency window, budget and counters for one kind of upstream call."""
+
+    def __init__(self, name: str, default_delay: float, deadline: float,
+                 window: int = HEDGE_WINDOW, percentile: float = HEDGE_PERCENTILE,
+                 min_samples: int = HEDGE_MIN_SAMPLES):
+        self.name = name
+        self.default_delay = default_delay
+        self.deadline = deadline
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)  # seconds per unit of work (e.g. per second of audio)
+        self.budget = RetryBudget()
+        self.counters = {"requests": 0, "hedges": 0, "hedge_wins": 0, "retries": 0,
+                         "budget_exhausted": 0, "deadline_exceeded": 0, "failures": 0}
+
+    def hedge_delay(self, scale: float = 1.0) -> float:
+        """How long to wait before hedging a request of size ``scale``."""
+        if len(self.latencies) < self.min_samples:
+            return self.default_delay * scale
+        return float(np.percentile(self.latencies, self.percentile)) * scale
+
+    def observe(self, elapsed: float, scale: float = 1.0):
+        self.latencies.append(elapsed / max(scale, 1e-6))
+
+    def count(self, counter: str):
+        self.counters[counter] += 1
+        HEDGES.inc(stage=self.name, outcome=counter)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "hedge_delay_s": round(self.hedge_delay(), 3),
+            "budget_tokens": round(self.budget.tokens, 2),
+            "samples": len(self.latencies),
+        }
+
+async def hedged(stage: Stage, attempt: Callable[[], Awaitable], hedge: Optional[Callable[[], Awaitable]] = None,
+                 retry: Optional[Callable[[], Awaitable]] = None, scale: float = 1.0,
+                 deadline: Optional[float] = None):
+    """
+    Run ``attempt()``; if it is slower than the stage's hedge delay fire
+    ``hedge()`` (default: another ``attempt()``) and take the first success.
+    If everything in flight fails, ``retry()`` (default: ``attempt()``) runs
+    once more if the budget allows. Raises the last error, or
+    ``DeadlineExceeded`` after ``deadline`` (default: the stage's) seconds.
+    ``scale`` is the size of the request (e.g. seconds of audio) when latency
+    grows with it. HEDGE_ENABLED=false turns off hedges but not retries.
+    """
+    stage.count("requests")
+    stage.budget.deposit()
+    hedge = hedge or attempt
+    retry = retry or attempt
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    end = start + (deadline if deadline is not None else stage.deadline)
+
+    tasks: Dict[asyncio.Task, str] = {}
+
+    def launch(factory, role):
+        task = asyncio.create_task(factory())
+        # Losers are cancelled unawaited; don't warn about their errors
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        tasks[task] = role
+
+    launch(attempt, "primary")
+    hedge_at = start + stage.hedge_delay(scale)
+    retried = False
+    last_error: Optional[BaseException] = None
+    try:
+        while True:
+            now = loop.time()
+            if now >= end:
+                stage.count("deadline_exceeded")
+                raise DeadlineExceeded(f"{stage.name} exceeded its {end - start:.1f}s deadline")
+            can_hedge = HEDGE_ENABLED and "hedge" not in tasks.values() and not retried
+            timeout = min(end, hedge_at) - now if can_hedge else end - now
+            done, _ = await asyncio.wait(tasks, timeout=max(0, timeout), return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                role = tasks.pop(task)
+                if task.exception() is None:
+                    if role == "hedge":
+                        stage.count("hedge_wins")
+                    stage.observe(loop.time() - start, scale)
+                    return task.result()
+                last_error = task.exception()
+                log.warning("⚠️  %s %s request failed: %s", stage.name, role, last_error)
+                if isinstance(last_error, UpstreamSaturated):
+                    retried = True  # Hedging or retrying a saturated provider only adds load
+
+            if not done and can_hedge and loop.time() >= hedge_at:
+                if stage.budget.withdraw():
+                    stage.count("hedges")
+                    log.info("🪃 Hedging slow %s request after %.2fs", stage.name, loop.time() - start)
+                    launch(hedge, "hedge")
+                else:
+                    stage.count("budget_exhausted")
+                hedge_at = end  # One hedge per request
+
+            if not tasks:
+                # Everything failed; one retry if the budget allows
+                if retried or not stage.budget.withdraw():
+                    stage.count("failures")
+                    raise last_error
+                retried = True
+                stage.count("retries")
+                launch(retry, "retry")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def hedged_stream(stage: Stage, open_stream: Callable[[], AsyncIterator[bytes]],
+                        deadline: Optional[float] = None) -> AsyncIterator[bytes]:
+    """
+    Hedge a streaming response on its first chunk: the stream that produces
+    data first is the one that gets read to the end.
+    """
+    streams = []
+
+    async def first_chunk():
+        stream = open_stream()
+        streams.append(stream)
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            chunk = b""
+        return stream, chunk
+
+    try:
+        winner, chunk = await hedged(stage, first_chunk, deadline=deadline)
+        if chunk:
+            yield chunk
+            async for chunk in winner:
+                yield chunk
+    finally:
+        # Close the losing stream(s) and, when the consumer stops early, the winner
+        for stream in streams:
+            try:
+                await stream.aclose()
+            except (RuntimeError, asyncio.CancelledError):
+                pass  # Still being cancelled in its hedge task
+
+_stages: Dict[str, Stage] = {}
+
+def register_stage(name: str, default_delay: float, deadline: float) -> Stage:
+    if name not in _stages:
+        _stages[name] = Stage(name, default_delay, deadline)
+    return _stages[name]
+
+def stats() -> dict:
+    return {name: stage.stats() for name, stage in _stages.items()}
@@ -0,0 +1,80 @@
+"""
+Worker readiness and graceful draining.
+
+A worker reports ready (GET /ready) only after startup warm-up has finished.
+On SIGTERM it stops reporting ready, refuses new turns, and waits up to
+DRAIN_TIMEOUT seconds for the turns already running to finish before handing
+the signal to uvicorn, which then closes the remaining connections and exits.
+Each worker process of a multi-worker deployment drains on its own.
+"""
+import asyncio
+import signal
+from config import DRAIN_TIMEOUT
+
+_state = {"ready": False, "draining": False, "active_turns": 0}
+
+def mark_ready():
+    _state["ready"] = True
+
+def is_ready() -> bool:
+    return _state["ready"] and not _state["draining"]
+
+def is_draining() -> bool:
+    return _state["draining"]
+
+def turn_started():
+    _state["active_turns"] += 1
+
+def turn_finished():
+    _state["active_turns"] -= 1
+
+def stats() -> dict:
+    return dict(_state)
+
+async def drain(timeout: float = DRAIN_TIMEOUT):
+    """Stop taking turns and wait (bounded) for the running ones to finish."""
+    _state["draining"] = True
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    if _state["active_turns"]:
+        print(f"⏳ Draining {_state['active_turns']} active turn(s) (up to {timeout:.0f}s)...")
+    while _state["active_turns"] > 0 and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+    if _state["active_turns"]:
+        print(f"⚠️  Drain timeout, {_state['active_turns']} turn(s) will be cut off")
+    else:
+        print("✅ Drained")
+
+def install_drain_handler(timeout: float = DRAIN_TIMEOUT) -> bool:
+    """
+    Put a draining step in front of the server's SIGTERM handler.
+
+    Must run on the main thread after the server installed its own handlers
+    (i.e. from a startup event). Returns False where that isn't possible,
+    e.g. under a test client running the app in a background thread.
+    """
+    if timeout <= 0:
+        return False
+    loop = asyncio.get_running_loop()
+    try:
+        server_handler = signal.getsignal(signal.SIGTERM)
+    except ValueError:
+        return False
+    if not callable(server_handler):
+        return False
+
+    async def drain_then_exit(signum, frame):
+        await drain(timeout)
+        server_handler(signum, frame)
+
+    def handle_sigterm(signum, frame):
+        if _state["draining"]:
+            server_handler(signum, frame)  # Second SIGTERM: stop waiting
+            return
+        loop.call_soon_threadsafe(lambda: loop.create_task(drain_then_exit(signum, frame)))
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:  # Not the main thread
+        return False
+    return True
@@ -1,9 +1,12 @@
-from typing import Iterable
-from openai import OpenAI
+from typing import Iterable, Optional
 import asyncio
-from config import OPENAI_API_KEY
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+import time
+from config import LLM_MODEL
+from modules.providers import get_async_openai
+from modules.llm_cache import get_llm_cache, make_key, replay_tokens
+from modules.conversation import Conversation
+from modules import metrics, admission, upstream_trace
+from modules.log import log
 
 # Future proof function
 async def gpt_stream_to_queue(user_input: str, queue: asyncio.Queue):
@@ -12,43 +15,79 @@ async def gpt_stream_to_queue(user_input: str, queue: asyncio.Queue):
     """
     await gpt_stream_to_queues(user_input, [queue])
 
-async def gpt_stream_to_queues(user_input: str, queues: Iterable[asyncio.Queue]):
+async def gpt_stream_to_queues(user_input: str, queues: Iterable[asyncio.Queue],
+                               conversation: Optional[Conversation] = None, record_turn: bool = True):
     """
     Stream GPT response and fan out text chunks to multiple asyncio queues.
     Each queue receives the same content along with the terminating None sentinel.
+    Cached responses (if LLM_CACHE_ENABLED) are replayed through the same queues.
+    With a conversation, earlier turns are sent as context and this turn is
+    recorded afterwards (including a partial answer if the turn is cut off),
+    unless ``record_turn`` is False (speculative answers are recorded by the
+    caller only once they are used).
     """
-    import concurrent.futures
-
-    def create_stream():
-        """Create the OpenAI stream"""
-        return client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": user_input}],
-            stream=True
-        )
-
-    loop = asyncio.get_event_loop()
     queues = list(queues)
+    if conversation is not None:
+        messages = conversation.build_messages(user_input)
+    else:
+        messages = [{"role": "user", "content": user_input}]
+    cache = get_llm_cache()
+    key = make_key(LLM_MODEL, messages) if cache else None
+    tokens = []
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        stream = await loop.run_in_executor(executor, create_stream)
+    completed = False
+    try:
+        cached = cache.get(key) if cache else None
+        if cached:
+            log.info("⚡ LLM cache hit")
+            metrics.mark("llm_cache_hit")
+            metrics.mark("llm_first_token")
+            tokens = cached
+            await replay_tokens(cached, queues)
+            completed = True
+            return
 
-        def get_next_chunk():
-            try:
-                return next(stream)
-            except StopIteration:
-                return None
-
-        while True:
-            chunk = await loop.run_in_executor(executor, get_next_chunk)
-            if chunk is None:
-                break
+        client = get_async_openai()
+        recording = upstream_trace.current()
+        # Raises UpstreamSaturated right away if OpenAI is at capacity
+        async with admission.slot("openai", admission.PRIORITY_LLM):
+            metrics.mark("llm_request", messages=len(messages))
+            request_time = time.perf_counter()
+            if recording:
+                recording.llm_request()
+            stream = await client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                stream=True
+            )
 
-            if chunk.choices[0].delta.content is not None:
-                content = chunk.choices[0].delta.content
-                print(content, end="", flush=True)
-                for queue in queues:
-                    await queue.put(content)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        content = chunk.choices[0].delta.content
+                        if not tokens:
+                            metrics.mark("llm_first_token")
+                            metrics.LLM_TTFT.observe(time.perf_counter() - request_time)
+                        tokens.append(content)
+                        if recording:
+                            recording.llm_token(content)
+                        for queue in queues:
+                            await queue.put(content)
+            finally:
+                # Closes the HTTP response right away if the turn was cancelled
+                await stream.close()
 
-    for queue in queues:
-        await queue.put(None)
+        completed = True
+        log.debug("🤖 %s", "".join(tokens))
+        if cache:
+            cache.put(key, tokens)
+    finally:
+        if conversation is not None and record_turn:
+            conversation.add_turn(user_input, "".join(tokens))
+        for queue in queues:
+            if completed:
+                # Bounded queues: waits for the consumer like every token did
+                await queue.put(None)
+            elif not queue.full():
+                # Cancelled or failed; consumers may be gone, so never block here
+                queue.put_nowait(None)
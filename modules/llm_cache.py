@@ -0,0 +1,96 @@
+"""
+Optional cache of complete LLM responses.
+
+Keys cover the model, the (normalized) message list and the request
+parameters. A hit is replayed token by token into the same fan-out queues a
+live stream would use, so TTS and WebSocket consumers can't tell the two
+apart. Entries expire after a TTL and the cache is bounded by entry count
+(least recently used entries go first).
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_REPLAY_TOKENS_PER_SEC,
+)
+
+def normalize_content(content: str) -> str:
+    """Case and whitespace differences don't change what we'd answer."""
+    return re.sub(r"\s+", " ", content).strip().casefold()
+
+def make_key(model: str, messages: List[dict], params: Optional[dict] = None) -> str:
+    normalized = [
+        {"role": m["role"], "content": normalize_content(m.get("content") or "")}
+        for m in messages
+    ]
+    raw = json.dumps({"model": model, "messages": normalized, "params": params or {}}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, tokens)
+        self.stats_counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "stores": 0}
+
+    def get(self, key: str) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, tokens = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats_counters["hits"] += 1
+                return tokens
+            del self._entries[key]
+            self.stats_counters["expired"] += 1
+        self.stats_counters["misses"] += 1
+        return None
+
+    def put(self, key: str, tokens: List[str]):
+        if not tokens:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, list(tokens))
+        self._entries.move_to_end(key)
+        self.stats_counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats_counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "hit_rate": round(self.stats_counters["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+async def replay_tokens(tokens: List[str], queues: Iterable[asyncio.Queue],
+                        tokens_per_sec: float = LLM_CACHE_REPLAY_TOKENS_PER_SEC):
+    """
+    Push cached tokens into the fan-out queues like a live stream would.
+    ``tokens_per_sec <= 0`` replays immediately; otherwise tokens are paced.
+    The caller is responsible for the terminating None sentinel.
+    """
+    queues = list(queues)
+    delay = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0
+    for token in tokens:
+        for queue in queues:
+            await queue.put(token)
+        if delay:
+            await asyncio.sleep(delay)
+
+_cache = None
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide LLM response cache, or None when caching is disabled."""
+    global _cache
+    if _cache is None and LLM_CACHE_ENABLED:
+        _cache = LLMResponseCache(ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+    return _cache
@@ -0,0 +1,30 @@
+"""
+Non-blocking logging for the request path.
+
+Per-turn and per-segment messages go through ``log`` instead of print(): a
+call below LOG_LEVEL costs a level check, and an enabled one only formats
+the record and puts it on a queue. A background QueueListener thread does
+the actual (blocking) writes to stdout, so a busy event loop never waits on
+the terminal. Startup and shutdown messages still use print().
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from config import LOG_LEVEL
+
+log = logging.getLogger("voice_agent")
+
+def _install():
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(records, handler)
+    log.addHandler(logging.handlers.QueueHandler(records))
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+    listener.start()
+    atexit.register(listener.stop)  # Flushes what is still queued
+
+_install()
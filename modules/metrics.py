@@ -0,0 +1,191 @@
+"""
+Per-turn latency instrumentation and Prometheus text exposition.
+
+A ``TurnTimeline`` is bound to the running turn through a context variable,
+so code anywhere in the pipeline can call ``mark("llm_first_token")`` without
+threading the timeline through every signature (child tasks inherit it).
+Finished turns feed latency histograms; a sample of them is kept as full
+traces for debugging slow turns.
+"""
+import bisect
+import contextvars
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+from config import TRACE_SAMPLE_RATE, TRACE_SLOW_TURN_SECONDS, TRACE_BUFFER_SIZE
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Bucket upper bound containing the q-quantile (coarse, but cheap)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.counts):
+            running += bucket_count
+            if running >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        running = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            running += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {running}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values: Dict[str, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{{{key}}} {value}" if key else f"{self.name} {value}")
+        return lines
+
+_metrics: "OrderedDict[str, object]" = OrderedDict()
+_collectors: List[Callable[[], Dict[str, float]]] = []
+
+def histogram(name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+    if name not in _metrics:
+        _metrics[name] = Histogram(name, help_text, buckets)
+    return _metrics[name]
+
+def counter(name: str, help_text: str) -> Counter:
+    if name not in _metrics:
+        _metrics[name] = Counter(name, help_text)
+    return _metrics[name]
+
+def register_collector(collect: Callable[[], Dict[str, float]]):
+    """Add a callback whose {metric_name: value} results are exported as gauges."""
+    _collectors.append(collect)
+
+def render() -> str:
+    lines = []
+    for metric in _metrics.values():
+        lines += metric.render()
+    for collect in _collectors:
+        for name, value in collect().items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+TURN_DURATION = histogram("voice_turn_duration_seconds", "Turn start to completion")
+TIME_TO_FIRST_TEXT = histogram("voice_turn_time_to_first_text_seconds", "Turn start to first LLM token")
+TIME_TO_FIRST_AUDIO = histogram("voice_turn_time_to_first_audio_seconds", "Turn start to first audio sent")
+LLM_TTFT = histogram("voice_llm_time_to_first_token_seconds", "LLM request to first token")
+STT_DURATION = histogram("voice_stt_seconds", "Speech-to-text duration")
+TTS_SEGMENT = histogram("voice_tts_segment_seconds", "Synthesis time per TTS segment")
+TURNS = counter("voice_turns_total", "Finished turns by status")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("turn_timeline", default=None)
+_traces: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+
+class TurnTimeline:
+    def __init__(self, turn_id=None):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.turn_id = turn_id
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.events = []  # (stage, ms since start, attrs)
+        self._first = {}
+
+    def mark(self, stage: str, at: Optional[float] = None, **attrs):
+        """Record ``stage`` now, or at ``at`` (a perf_counter() timestamp taken elsewhere)."""
+        elapsed = (time.perf_counter() if at is None else at) - self._t0
+        self.events.append((stage, round(elapsed * 1000, 2), attrs))
+        if at is None:
+            self._first.setdefault(stage, elapsed)
+        else:
+            # May be earlier than events already recorded: keep them in time order
+            self.events.sort(key=lambda event: event[1])
+            self._first[stage] = min(elapsed, self._first.get(stage, elapsed))
+
+    def since(self, stage: str) -> Optional[float]:
+        """Seconds from turn start to the first time ``stage`` was marked."""
+        return self._first.get(stage)
+
+    def finish(self, status: str = "completed"):
+        self.mark("turn_complete", status=status)
+        total = self.since("turn_complete")
+        TURNS.inc(status=status)
+        if status == "completed":
+            TURN_DURATION.observe(total)
+            if self.since("llm_first_token") is not None:
+                # A committed speculation may have its first token before the turn started
+                TIME_TO_FIRST_TEXT.observe(max(0.0, self.since("llm_first_token")))
+            if self.since("first_audio_sent") is not None:
+                TIME_TO_FIRST_AUDIO.observe(self.since("first_audio_sent"))
+
+        if total >= TRACE_SLOW_TURN_SECONDS or random.random() < TRACE_SAMPLE_RATE:
+            _traces.append(self.to_dict(status))
+
+    def to_dict(self, status: Optional[str] = None) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "turn_id": self.turn_id,
+            "started_at": self.started_at,
+            "status": status,
+            "events": [{"stage": stage, "ms": ms, **attrs} for stage, ms, attrs in self.events],
+        }
+
+def begin_turn(turn_id=None) -> TurnTimeline:
+    """Start a timeline and bind it to the current task (and tasks it creates)."""
+    timeline = TurnTimeline(turn_id)
+    _current.set(timeline)
+    timeline.mark("turn_start")
+    return timeline
+
+def current() -> Optional[TurnTimeline]:
+    return _current.get()
+
+def bind(timeline):
+    """Make ``timeline`` (anything with a ``mark()`` method) the current task's timeline."""
+    _current.set(timeline)
+
+def mark(stage: str, **attrs):
+    """Record a stage on the current turn's timeline, if there is one."""
+    timeline = _current.get()
+    if timeline is not None:
+        timeline.mark(stage, **attrs)
+
+def recent_traces() -> List[dict]:
+    return [
+        {"trace_id": t["trace_id"], "turn_id": t["turn_id"], "status": t["status"],
+         "total_ms": t["events"][-1]["ms"] if t["events"] else None}
+        for t in reversed(_traces)
+    ]
+
+def get_trace(trace_id: str) -> Optional[dict]:
+    for trace in _traces:
+        if trace["trace_id"] == trace_id:
+            return trace
+    return None
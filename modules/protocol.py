@@ -0,0 +1,97 @@
+"""
+Wire format for audio sent over the /stream WebSocket.
+
+Clients that send ``{"type": "hello", "audio_transport": "binary"}`` get audio
+as raw binary frames; everyone else keeps receiving base64 ``audio_chunk``
+JSON messages. Control messages are always JSON text frames.
+
+Adding ``"tts_mode": "incremental"`` to the hello makes the server forward
+provider audio as it arrives: a segment is then sent as several non-final
+frames followed by an empty frame with FLAG_FINAL set.
+
+A segment whose synthesis failed is reported with a ``segment_error`` JSON
+message (seq, text, error) so the client can show the text instead.
+
+Filler clips played before the first answer audio (see modules/fillers.py)
+are sent like a segment with FLAG_FILLER set (``"filler": true`` in JSON);
+their text is not part of the answer.
+
+Binary frame layout (network byte order)::
+
+    version  u8    AUDIO_FRAME_VERSION
+    flags    u8    FLAG_* bits
+    seq      u32   segment sequence number (text order)
+    text_len u16   length of the UTF-8 text that follows
+    text     bytes segment text
+    audio    bytes rest of the frame
+"""
+import base64
+import json
+import struct
+
+AUDIO_FRAME_VERSION = 1
+FLAG_FINAL = 0x01  # last frame of the segment
+FLAG_FILLER = 0x02  # latency-masking clip, not part of the answer
+
+TRANSPORT_JSON = "json"
+TRANSPORT_BINARY = "binary"
+
+TTS_MODE_BUFFERED = "buffered"
+TTS_MODE_INCREMENTAL = "incremental"
+
+_HEADER = struct.Struct("!BBIH")
+_MAX_TEXT_BYTES = 0xFFFF
+
+def encode_audio_frame(seq: int, text: str, audio: bytes, final: bool = True, filler: bool = False) -> bytes:
+    """Pack one audio frame: header, segment text, raw audio."""
+    text_bytes = text.encode("utf-8")[:_MAX_TEXT_BYTES]
+    flags = (FLAG_FINAL if final else 0) | (FLAG_FILLER if filler else 0)
+    return _HEADER.pack(AUDIO_FRAME_VERSION, flags, seq, len(text_bytes)) + text_bytes + audio
+
+def decode_audio_frame(frame: bytes):
+    """Unpack a frame built by encode_audio_frame into (seq, flags, text, audio)."""
+    version, flags, seq, text_len = _HEADER.unpack_from(frame)
+    if version != AUDIO_FRAME_VERSION:
+        raise ValueError(f"Unsupported audio frame version: {version}")
+    start = _HEADER.size
+    text = frame[start:start + text_len].decode("utf-8", errors="replace")
+    return seq, flags, text, frame[start + text_len:]
+
+def negotiate_transport(message: dict) -> str:
+    """Pick the audio transport requested in a client hello message."""
+    if message.get("audio_transport") == TRANSPORT_BINARY:
+        return TRANSPORT_BINARY
+    return TRANSPORT_JSON
+
+def negotiate_tts_mode(message: dict) -> str:
+    """Pick the TTS delivery mode requested in a client hello message."""
+    if message.get("tts_mode") == TTS_MODE_INCREMENTAL:
+        return TTS_MODE_INCREMENTAL
+    return TTS_MODE_BUFFERED
+
+async def send_audio_chunk(websocket, audio_data: bytes, text: str, seq: int,
+                           transport: str = TRANSPORT_JSON, final: bool = True, filler: bool = False):
+    """Send one piece of segment audio using the connection's negotiated transport."""
+    if transport == TRANSPORT_BINARY:
+        await websocket.send_bytes(encode_audio_frame(seq, text, audio_data, final, filler))
+        return
+
+    message = {
+        "type": "audio_chunk",
+        "audio_data": base64.b64encode(audio_data).decode('utf-8'),
+        "text": text,
+        "seq": seq,
+        "final": final
+    }
+    if filler:
+        message["filler"] = True
+    await websocket.send_text(json.dumps(message))
+
+async def send_segment_error(websocket, seq: int, text: str, error: str):
+    """Tell the client a segment's audio failed, so it can show the text instead."""
+    await websocket.send_text(json.dumps({
+        "type": "segment_error",
+        "seq": seq,
+        "text": text,
+        "error": error
+    }))
@@ -0,0 +1,93 @@
+"""
+Process-wide upstream clients.
+
+Every OpenAI / ElevenLabs call goes through the clients created here so that
+keep-alive HTTP connections are reused across turns and sessions instead of
+paying a TLS handshake per sentence. Clients are created lazily on first use
+and closed by ``shutdown()`` when the backend stops.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import httpx
+from config import (
+    OPENAI_API_KEY,
+    ELEVENLABS_API_KEY,
+    OPENAI_BASE_URL,
+    ELEVENLABS_BASE_URL,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    UPSTREAM_EXECUTOR_WORKERS,
+)
+
+_async_http = None
+_async_openai = None
+_async_elevenlabs = None
+_executor = None
+
+def _limits():
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Shared async HTTP connection pool."""
+    global _async_http
+    if _async_http is None:
+        _async_http = httpx.AsyncClient(limits=_limits(), timeout=HTTP_TIMEOUT)
+    return _async_http
+
+def get_async_openai():
+    """Async OpenAI client backed by the shared connection pool."""
+    global _async_openai
+    if _async_openai is None:
+        from openai import AsyncOpenAI
+        _async_openai = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL,
+                                    http_client=get_async_http_client())
+    return _async_openai
+
+def get_async_elevenlabs():
+    """Async ElevenLabs client backed by the shared connection pool."""
+    global _async_elevenlabs
+    if _async_elevenlabs is None:
+        from elevenlabs.client import AsyncElevenLabs
+        _async_elevenlabs = AsyncElevenLabs(api_key=ELEVENLABS_API_KEY, base_url=ELEVENLABS_BASE_URL,
+                                            httpx_client=get_async_http_client())
+    return _async_elevenlabs
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """One long-lived pool for the remaining blocking upstream work."""
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=UPSTREAM_EXECUTOR_WORKERS,
+            thread_name_prefix="upstream",
+        )
+    return _executor
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the shared upstream executor (with the caller's context, like asyncio.to_thread)."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await loop.run_in_executor(get_executor(), call)
+
+def set_clients(async_openai=None, async_elevenlabs=None):
+    """Use these objects instead of building the SDK clients (trace replay, tests)."""
+    global _async_openai, _async_elevenlabs
+    _async_openai = async_openai or _async_openai
+    _async_elevenlabs = async_elevenlabs or _async_elevenlabs
+
+async def shutdown():
+    """Close pooled connections and the executor."""
+    global _async_http, _async_openai, _async_elevenlabs, _executor
+    if _async_http is not None:
+        await _async_http.aclose()
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _async_http = _async_openai = _async_elevenlabs = _executor = None
+    print("🔌 Upstream clients closed")
@@ -1,9 +1,163 @@
-import sounddevice as sd
-import wave
+"""
+Microphone capture for local (terminal / kiosk) voice clients.
+
+``CaptureEngine`` runs a callback-driven input stream: the audio thread only
+copies each block into a preallocated NumPy ring buffer and wakes the event
+loop. ``utterances()`` drains the ring through the energy endpointer
+(modules/vad.py) and yields each finished utterance as float32 samples as
+soon as the speaker stops, so a turn lasts as long as the speech instead of
+a fixed recording window. Audio that arrives while the caller is busy with
+the previous utterance waits in the ring (up to CAPTURE_BUFFER_S seconds).
+``transcripts()`` hands utterances to the STT backend in memory.
+
+Without a sound device, ``inject()`` feeds PCM as if it came from the
+microphone, so the whole path can be driven by synthetic audio.
+
+    python -m modules.record [--reply]
+
+``record_audio`` / ``save_temp_wav`` are the older fixed-length helpers.
+"""
+import argparse
+import asyncio
 import tempfile
-from config import SAMPLE_RATE
+import threading
+import wave
+from typing import AsyncIterator, Optional
+import numpy as np
+from config import SAMPLE_RATE, CAPTURE_BLOCK_MS, CAPTURE_BUFFER_S, CAPTURE_DEVICE
+from modules.audio import pcm16_to_float
+from modules.vad import Endpointer, SPEECH_END
+
+class RingBuffer:
+    """Fixed-size float32 sample ring with one writer (the audio thread) and one reader."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._written = 0  # Total samples written / read since creation
+        self._read = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def write(self, samples: np.ndarray):
+        """Append samples; if the reader is a whole buffer behind, the oldest are dropped."""
+        if len(samples) > self.capacity:
+            self.dropped += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        n = len(samples)
+        with self._lock:
+            start = self._written % self.capacity
+            first = min(n, self.capacity - start)
+            self._data[start:start + first] = samples[:first]
+            self._data[:n - first] = samples[first:]
+            self._written += n
+            overrun = self._written - self._read - self.capacity
+            if overrun > 0:
+                self._read += overrun
+                self.dropped += overrun
+
+    def read(self) -> np.ndarray:
+        """Everything written since the last read (a copy)."""
+        with self._lock:
+            n = self._written - self._read
+            start = self._read % self.capacity
+            first = min(n, self.capacity - start)
+            samples = np.concatenate((self._data[start:start + first], self._data[:n - first]))
+            self._read += n
+        return samples
+
+    def __len__(self) -> int:
+        return self._written - self._read
+
+class CaptureEngine:
+    def __init__(self, sample_rate: int = SAMPLE_RATE, block_ms: int = CAPTURE_BLOCK_MS,
+                 buffer_s: float = CAPTURE_BUFFER_S, device=CAPTURE_DEVICE,
+                 endpointer: Optional[Endpointer] = None):
+        self.sample_rate = sample_rate
+        self.block_size = max(1, int(sample_rate * block_ms / 1000))
+        self.device = int(device) if isinstance(device, str) and device.isdigit() else device
+        self.ring = RingBuffer(int(sample_rate * buffer_s))
+        self.endpointer = endpointer or Endpointer(sample_rate=sample_rate)
+        self.counters = {"blocks": 0, "input_overflows": 0, "utterances": 0}
+        self._stream = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+    def _wake(self):
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        else:
+            self._wakeup.set()
+
+    def _callback(self, indata, frames, time_info, status):
+        # Runs on the PortAudio thread: copy and wake the loop, nothing else
+        if status.input_overflow:
+            self.counters["input_overflows"] += 1
+        self.counters["blocks"] += 1
+        self.ring.write(indata[:, 0])
+        self._wake()
+
+    async def start(self):
+        """Open the input device and start capturing."""
+        import sounddevice as sd  # Needs PortAudio; only when a real device is used
+        self._loop = asyncio.get_running_loop()
+        self._stream = sd.InputStream(samplerate=self.sample_rate, channels=1, dtype="float32",
+                                      blocksize=self.block_size, device=self.device, callback=self._callback)
+        self._stream.start()
+
+    def inject(self, samples):
+        """Feed audio as if it came from the device: float32 samples, int16 samples or PCM16 bytes."""
+        if isinstance(samples, (bytes, bytearray)):
+            samples = pcm16_to_float(bytes(samples))
+        elif samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        self.ring.write(np.asarray(samples, dtype=np.float32).reshape(-1))
+        self._wake()
+
+    def close(self):
+        """Stop capturing; ``utterances()`` yields what is left and ends."""
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        self._closed = True
+        self._wake()
+
+    async def utterances(self) -> AsyncIterator[np.ndarray]:
+        """Yield each utterance (pre-roll included) as soon as the endpointer closes it."""
+        self._loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            samples = self.ring.read()
+            # Block by block, so audio after an endpoint starts the next utterance
+            for start in range(0, len(samples), self.block_size):
+                block = samples[start:start + self.block_size]
+                while self.endpointer.feed(block) == SPEECH_END:
+                    self.counters["utterances"] += 1
+                    yield self.endpointer.utterance()
+                    block = block[:0]  # Then whatever followed the endpoint in this block
+            if self._closed and not len(self.ring):
+                if self.endpointer.had_speech:
+                    self.counters["utterances"] += 1
+                    yield self.endpointer.utterance()
+                return
+            if not len(self.ring):
+                await self._wakeup.wait()
+
+    async def transcripts(self) -> AsyncIterator[str]:
+        """Transcribe each utterance in memory with the configured STT backend."""
+        from modules import stt
+        async for samples in self.utterances():
+            text = await stt.transcribe(samples, self.sample_rate)
+            if text.strip():
+                yield text
+
+    def stats(self) -> dict:
+        return {**self.counters, "dropped_samples": self.ring.dropped, "buffered_samples": len(self.ring)}
 
 def record_audio(duration=5):
+    import sounddevice as sd
     print("Listening...")
     data = sd.rec(int(duration * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=1, dtype='int16')
     sd.wait()
@@ -17,4 +171,33 @@ def save_temp_wav(data):
         wf.setsampwidth(2)
         wf.setframerate(SAMPLE_RATE)
         wf.writeframes(data.tobytes())
-    return tmp.name
\ No newline at end of file
+    return tmp.name
+
+async def _print_reply(text: str):
+    from modules.llm import gpt_stream_to_queue
+    queue = asyncio.Queue()
+    task = asyncio.create_task(gpt_stream_to_queue(text, queue))
+    while (token := await queue.get()) is not None:
+        print(token, end="", flush=True)
+    print()
+    await task
+
+async def _main(reply: bool):
+    engine = CaptureEngine()
+    await engine.start()
+    print("🎙️  Listening (Ctrl+C to stop)...")
+    try:
+        async for text in engine.transcripts():
+            print(f"🗣️  {text}")
+            if reply:
+                await _print_reply(text)
+    finally:
+        engine.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe the microphone utterance by utterance")
+    parser.add_argument("--reply", action="store_true", help="Also stream an LLM answer to each utterance")
+    try:
+        asyncio.run(_main(parser.parse_args().reply))
+    except KeyboardInterrupt:
+        pass
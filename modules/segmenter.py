@@ -0,0 +1,170 @@
+"""
+Text segmenters that decide where LLM output is cut into TTS requests.
+
+A segmenter is fed LLM tokens one at a time and returns the segments that are
+ready to synthesize. ``timeout()`` tells the caller how long it may wait for
+the next token before calling ``on_stall()``, so a stalled stream still gets
+its buffered text spoken.
+"""
+import re
+from typing import List, Optional
+from config import (
+    TTS_SEGMENTER,
+    SEGMENT_FIRST_MIN_CHARS,
+    SEGMENT_MIN_CHARS,
+    SEGMENT_GROWTH,
+    SEGMENT_MAX_CHARS,
+    SEGMENT_STALL_TIMEOUT,
+)
+
+class Segmenter:
+    """Interface shared by all segmenters."""
+
+    def feed(self, token: str) -> List[str]:
+        raise NotImplementedError
+
+    def flush(self) -> List[str]:
+        """End of stream: return whatever is still buffered."""
+        raise NotImplementedError
+
+    def timeout(self) -> Optional[float]:
+        """Seconds to wait for the next token before on_stall(), or None to wait forever."""
+        return None
+
+    def on_stall(self) -> List[str]:
+        return []
+
+class FixedSegmenter(Segmenter):
+    """The original heuristic: cut at 55 chars or when a token ends with . ! ?"""
+
+    def __init__(self, chunk_size: int = 55):
+        self.chunk_size = chunk_size
+        self.buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        self.buffer += token
+        if (len(self.buffer) >= self.chunk_size or
+            token.endswith('.') or
+            token.endswith('!') or
+            token.endswith('?')):
+            return self.flush()
+        return []
+
+    def flush(self) -> List[str]:
+        text, self.buffer = self.buffer, ""
+        return [text] if text.strip() else []
+
+# Sentence end: terminal punctuation, optional closing quotes/brackets, then whitespace
+_SENTENCE_END = re.compile(r'[.!?…]+["\'”’)\]]*(?=\s)')
+_CLAUSE_END = re.compile(r'[,;:—–]["\'”’)\]]*(?=\s)')
+_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e",
+    "approx", "no", "inc", "ltd", "co", "mt", "fig", "jan", "feb", "mar", "apr",
+    "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+_INITIALS = re.compile(r'^(?:[A-Za-z]\.)*[A-Za-z]$')
+
+class AdaptiveSegmenter(Segmenter):
+    """
+    Latency-aware segmenter.
+
+    The first segment is cut at the first sentence end, or at a clause
+    boundary once it has ``first_min_chars``, to minimise time-to-first-audio.
+    Later segments must reach a target length that grows by ``growth`` each
+    time (up to ``max_chars``), so long answers need fewer TTS requests. Cuts happen on
+    sentence boundaries first, clause boundaries second, and on whitespace
+    only when a segment hits ``max_chars``.
+    """
+
+    def __init__(self, first_min_chars: int = SEGMENT_FIRST_MIN_CHARS, min_chars: int = SEGMENT_MIN_CHARS,
+                 growth: float = SEGMENT_GROWTH, max_chars: int = SEGMENT_MAX_CHARS,
+                 stall_timeout: float = SEGMENT_STALL_TIMEOUT):
+        self.first_min_chars = first_min_chars
+        self.min_chars = min_chars
+        self.growth = growth
+        self.max_chars = max_chars
+        self.stall_timeout = stall_timeout
+        self.buffer = ""
+        self.emitted = 0
+
+    def _target(self) -> int:
+        if self.emitted == 0:
+            return self.first_min_chars
+        return int(min(self.max_chars, self.min_chars * self.growth ** (self.emitted - 1)))
+
+    def _is_sentence_end(self, match) -> bool:
+        if match.group(0)[0] != '.':
+            return True
+        # "Dr. Smith", "e.g. this", "U.S. economy" are not sentence ends
+        words = self.buffer[:match.start()].split()
+        word = words[-1].lower() if words else ""
+        if word in _ABBREVIATIONS or _INITIALS.match(word):
+            return False
+        rest = self.buffer[match.end():].lstrip()
+        return not (rest and rest[0].islower())
+
+    def _find_cut(self) -> Optional[int]:
+        target = self._target()
+        sentence_floor = 0 if self.emitted == 0 else target
+        for match in _SENTENCE_END.finditer(self.buffer):
+            if match.end() >= sentence_floor and self._is_sentence_end(match):
+                return match.end()
+
+        if len(self.buffer) < target:
+            return None
+
+        # Clauses are good enough for the first segment; later ones only
+        # fall back to them once the buffer is getting long
+        clause_floor = target if self.emitted == 0 else max(target, self.max_chars // 2)
+        for match in _CLAUSE_END.finditer(self.buffer):
+            if match.end() >= clause_floor:
+                return match.end()
+
+        if len(self.buffer) >= self.max_chars:
+            space = self.buffer.rfind(" ", 0, self.max_chars)
+            return space if space > 0 else self.max_chars
+        return None
+
+    def _emit(self, cut: int) -> List[str]:
+        text = self.buffer[:cut]
+        self.buffer = self.buffer[cut:].lstrip()
+        if not text.strip():
+            return []
+        self.emitted += 1
+        return [text.strip()]
+
+    def feed(self, token: str) -> List[str]:
+        self.buffer += token
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                return segments
+            segments += self._emit(cut)
+
+    def flush(self) -> List[str]:
+        return self._emit(len(self.buffer))
+
+    def timeout(self) -> Optional[float]:
+        if self.buffer.strip():
+            return self.stall_timeout
+        return None
+
+    def on_stall(self) -> List[str]:
+        # The last token may be half a word; only flush up to the last space
+        space = self.buffer.rfind(" ")
+        if space <= 0:
+            return []
+        return self._emit(space)
+
+SEGMENTERS = {
+    "adaptive": AdaptiveSegmenter,
+    "fixed": FixedSegmenter,
+}
+
+def make_segmenter(name: Optional[str] = None) -> Segmenter:
+    """Build a fresh segmenter by name (defaults to config.TTS_SEGMENTER)."""
+    name = name or TTS_SEGMENTER
+    if name not in SEGMENTERS:
+        raise ValueError(f"Unknown segmenter: {name}")
+    return SEGMENTERS[name]()
@@ -1,68 +1,295 @@
 import asyncio
-import concurrent.futures
-import base64
-import json
-from elevenlabs import ElevenLabs
-from config import ELEVENLABS_API_KEY, DEFAULT_VOICE_ID
+import time
+from config import (
+    DEFAULT_VOICE_ID,
+    TTS_MAX_CONCURRENCY,
+    TTS_MODEL_ID,
+    TTS_OUTPUT_FORMAT,
+    TTS_STREAM_BUFFER_CHUNKS,
+    TTS_MAX_PENDING_SEGMENTS,
+    TTS_HEDGE_DELAY,
+    TTS_DEADLINE,
+    FILLER_DELAY_MS,
+)
+from modules.providers import get_async_elevenlabs
+from modules.segmenter import make_segmenter
+from modules.tts_cache import get_tts_cache, make_key
+from modules import metrics, admission, hedging, fillers, upstream_trace
+from modules.log import log
+from modules.protocol import send_audio_chunk, send_segment_error, TRANSPORT_JSON, TTS_MODE_BUFFERED, TTS_MODE_INCREMENTAL
 
-async def simple_elevenlabs_streamer_websocket(queue: asyncio.Queue, websocket, voice_id=None):
+# Whole-segment synthesis (latency per 100 characters) and time to first audio when streaming
+TTS_STAGE = hedging.register_stage("tts", TTS_HEDGE_DELAY, TTS_DEADLINE)
+TTS_STREAM_STAGE = hedging.register_stage("tts_stream", TTS_HEDGE_DELAY, TTS_DEADLINE)
+
+async def simple_elevenlabs_streamer_websocket(queue: asyncio.Queue, websocket, voice_id=None, max_concurrency=None,
+                                               transport=TRANSPORT_JSON, tts_mode=TTS_MODE_BUFFERED, segmenter=None,
+                                               filler=None):
     """
     ElevenLabs TTS streaming that sends audio data via WebSocket.
+
+    Segments are synthesized concurrently (up to ``max_concurrency`` at once)
+    while a single sender task delivers the resulting audio_chunk messages
+    strictly in text order. ``max_concurrency=1`` gives the old one-at-a-time
+    behaviour. ``transport`` is the audio wire format negotiated for the
+    connection (see modules/protocol.py).
+
+    With ``tts_mode="incremental"`` provider audio is forwarded as it arrives
+    instead of after the whole segment is synthesized; each segment then ends
+    with an empty final frame.
+
+    Where text is cut into segments is up to ``segmenter`` (see
+    modules/segmenter.py); by default a fresh one from config.TTS_SEGMENTER.
+
+    At most TTS_MAX_PENDING_SEGMENTS segments are synthesized ahead of the one
+    being sent. When the client falls behind, submitting the next segment
+    waits, this stops reading ``queue``, and a bounded ``queue`` in turn
+    pauses the LLM stream feeding it.
+
+    Slow segments are hedged and failed ones retried (modules/hedging.py); a
+    segment that still fails is reported with a segment_error message.
+
+    ``filler`` is an optional (text, audio) clip from modules/fillers.py,
+    played first if no segment audio is ready within FILLER_DELAY_MS.
     """
     voice_id = voice_id or DEFAULT_VOICE_ID
-    print(f"🔊 Starting ElevenLabs TTS with voice: {voice_id}")
-    
-    collected_text = ""
-    chunk_size = 55
-    
+    segmenter = segmenter or make_segmenter()
+    max_concurrency = max_concurrency or TTS_MAX_CONCURRENCY
+    log.debug("🔊 Starting ElevenLabs TTS with voice: %s (concurrency: %d, mode: %s)", voice_id, max_concurrency, tts_mode)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pending = asyncio.Queue(maxsize=TTS_MAX_PENDING_SEGMENTS)
+    sender_task = asyncio.create_task(send_audio_in_order(pending, websocket, transport, tts_mode, filler))
+    synth_tasks = []
+
+    async def submit(text: str):
+        # Per-segment hand-off to the sender. Provider audio is read ahead
+        # into a separate buffer (see synthesize_into_queue), so a full queue
+        # here only holds up forwarding, never an upstream slot
+        chunks = asyncio.Queue(maxsize=TTS_STREAM_BUFFER_CHUNKS)
+        # Wait for room first so synthesis never runs further ahead than that
+        await pending.put((text, chunks))
+        task = asyncio.create_task(synthesize_into_queue(text, voice_id, semaphore, chunks, tts_mode,
+                                                         index=len(synth_tasks)))
+        synth_tasks.append(task)
+
+    try:
+        while True:
+            timeout = segmenter.timeout()
+            try:
+                if timeout is None:
+                    text_chunk = await queue.get()
+                else:
+                    text_chunk = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                # Tokens stalled; speak what we have instead of waiting
+                for segment in segmenter.on_stall():
+                    await submit(segment)
+                continue
+
+            if text_chunk is None:
+                for segment in segmenter.flush():
+                    await submit(segment)
+                break
+
+            for segment in segmenter.feed(text_chunk):
+                await submit(segment)
+
+        await pending.put(None)
+        await sender_task
+    finally:
+        # Don't leave synthesis running if we were cancelled or the sender failed
+        for task in synth_tasks + [sender_task]:
+            if not task.done():
+                task.cancel()
+
+async def synthesize_into_queue(text: str, voice_id: str, semaphore: asyncio.Semaphore,
+                                chunks: asyncio.Queue, tts_mode=TTS_MODE_BUFFERED, index: int = 0):
+    """
+    Synthesize one segment once a concurrency slot is free, ending with a None
+    sentinel. If synthesis fails the exception is queued before the sentinel.
+    """
+    cache = get_tts_cache()
+    key = make_key(voice_id, TTS_MODEL_ID, text, TTS_OUTPUT_FORMAT)
+    try:
+        cached = await cache.get(key) if cache else None
+        if cached:
+            log.debug("⚡ TTS cache hit: %.50s", text)
+            metrics.mark("tts_cache_hit", segment=index)
+            await chunks.put(cached)
+        else:
+            # The first segment of an answer decides when the user hears anything
+            priority = admission.PRIORITY_FIRST_SEGMENT if index == 0 else admission.PRIORITY_TAIL_SEGMENT
+            if tts_mode == TTS_MODE_INCREMENTAL:
+                # The provider stream is read into an unbounded buffer by its
+                # own task, so the concurrency and ElevenLabs slots are given
+                # back when synthesis ends rather than when a slow client has
+                # taken the audio; only forwarding waits on ``chunks``
+                buffered = asyncio.Queue()
+                reader = asyncio.create_task(read_stream_into(buffered, text, voice_id, semaphore, priority, index))
+                try:
+                    parts = []
+                    chunk = await buffered.get()
+                    while chunk is not None:
+                        if cache:
+                            parts.append(chunk)
+                        await chunks.put(chunk)
+                        chunk = await buffered.get()
+                    await reader  # Raises if the stream failed
+                finally:
+                    reader.cancel()
+                # Only reached when the stream completed, so the segment is whole
+                if cache:
+                    cache.put(key, b"".join(parts))
+            else:
+                async with semaphore:
+                    metrics.mark("tts_segment_start", segment=index, chars=len(text))
+                    start_time = time.perf_counter()
+                    audio_data = await synthesize_audio(text, voice_id, priority)
+                    metrics.mark("tts_segment_end", segment=index)
+                    metrics.TTS_SEGMENT.observe(time.perf_counter() - start_time)
+                if cache:
+                    cache.put(key, audio_data)
+                await chunks.put(audio_data)
+    except Exception as e:
+        log.error("❌ TTS error: %s", e)
+        metrics.mark("tts_segment_error", segment=index)
+        await chunks.put(e)
+
+    # Not in a finally: on cancellation nobody drains this queue any more
+    await chunks.put(None)
+
+async def read_stream_into(buffered: asyncio.Queue, text: str, voice_id: str, semaphore: asyncio.Semaphore,
+                           priority: int = admission.PRIORITY_TAIL_SEGMENT, index: int = 0):
+    """Read one segment's hedged provider stream into ``buffered`` (unbounded), ending with None."""
+    try:
+        async with semaphore:
+            metrics.mark("tts_segment_start", segment=index, chars=len(text))
+            start_time = time.perf_counter()
+            stream = hedging.hedged_stream(TTS_STREAM_STAGE, lambda: synthesize_stream(text, voice_id, priority))
+            async for chunk in stream:
+                buffered.put_nowait(chunk)
+            metrics.mark("tts_segment_end", segment=index)
+            metrics.TTS_SEGMENT.observe(time.perf_counter() - start_time)
+    finally:
+        buffered.put_nowait(None)
+
+async def send_audio_in_order(pending: asyncio.Queue, websocket, transport=TRANSPORT_JSON, tts_mode=TTS_MODE_BUFFERED,
+                             filler=None, filler_delay: float = FILLER_DELAY_MS / 1000):
+    """
+    Drain segment buffers in submission order and send their audio. If
+    nothing is ready ``filler_delay`` seconds in, the ``filler`` clip goes
+    out first as its own segment and the real ones follow it.
+    """
+    seq = 0
+    first_audio = True
+    loop = asyncio.get_running_loop()
+    filler_at = loop.time() + filler_delay if filler else None
+
+    async def next_item(queue: asyncio.Queue):
+        nonlocal seq, filler_at
+        if filler_at is None:
+            return await queue.get()
+        try:
+            return await asyncio.wait_for(queue.get(), max(0, filler_at - loop.time()))
+        except asyncio.TimeoutError:
+            filler_text, filler_audio = filler
+            filler_at = None
+            await send_audio_chunk(websocket, filler_audio, filler_text, seq, transport, filler=True)
+            metrics.mark("filler_sent")
+            fillers.record_sent()
+            seq += 1
+            return await queue.get()
+
     while True:
-        text_chunk = await queue.get()
-        if text_chunk is None:
-            if collected_text.strip():
-                await generate_and_send_audio(collected_text, websocket, voice_id)
+        item = await next_item(pending)
+        if item is None:
             break
-            
-        collected_text += text_chunk
-        
-        if (len(collected_text) >= chunk_size or 
-            text_chunk.endswith('.') or 
-            text_chunk.endswith('!') or 
-            text_chunk.endswith('?')):
-            
-            if collected_text.strip():
-                await generate_and_send_audio(collected_text, websocket, voice_id)
-                collected_text = ""
-
-async def generate_and_send_audio(text: str, websocket, voice_id: str):
-    """Generate audio with ElevenLabs and send via WebSocket."""
-    try:
-        print(f"🎵 Generating audio: {text[:50]}...")
-        
-        loop = asyncio.get_event_loop()
-        
-        def generate_audio():
-            client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+        text, chunks = item
+
+        sent_any = False
+        while True:
+            chunk = await next_item(chunks)
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                await send_segment_error(websocket, seq, text, str(chunk) or type(chunk).__name__)
+                continue
+            await send_audio_chunk(websocket, chunk, text, seq, transport,
+                                   final=(tts_mode != TTS_MODE_INCREMENTAL))
+            if first_audio:
+                metrics.mark("first_audio_sent")
+                first_audio = False
+                filler_at = None  # Real audio is flowing; no filler any more
+            sent_any = True
+
+        if sent_any:
+            if tts_mode == TTS_MODE_INCREMENTAL:
+                await send_audio_chunk(websocket, b"", text, seq, transport, final=True)
+            seq += 1
+
+async def synthesize_audio(text: str, voice_id: str, priority: int = admission.PRIORITY_TAIL_SEGMENT) -> bytes:
+    """
+    Generate audio with ElevenLabs, hedged when slow and retried on errors.
+    Raises if synthesis fails or misses its deadline.
+    """
+    scale = max(len(text) / 100, 1.0)
+    return await hedging.hedged(TTS_STAGE, lambda: convert_audio(text, voice_id, priority),
+                                scale=scale, deadline=TTS_DEADLINE * scale)
+
+async def convert_audio(text: str, voice_id: str, priority: int = admission.PRIORITY_TAIL_SEGMENT) -> bytes:
+    """One ElevenLabs convert request for the whole segment."""
+    recording = upstream_trace.current()
+    async with admission.slot("elevenlabs", priority):
+        log.debug("🎵 Generating audio: %.50s...", text)
+
+        start_time = time.perf_counter()
+        try:
+            client = get_async_elevenlabs()
             audio = client.text_to_speech.convert(
                 voice_id=voice_id,
                 text=text,
-                model_id="eleven_multilingual_v2"
+                model_id=TTS_MODEL_ID,
+                output_format=TTS_OUTPUT_FORMAT
             )
-            return b"".join(audio)
-        
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            audio_data = await loop.run_in_executor(executor, generate_audio)
-        
-        audio_b64 = base64.b64encode(audio_data).decode('utf-8')
-        print(f"✅ Audio generated: {len(audio_data)} bytes")
-        
-        message = json.dumps({
-            "type": "audio_chunk",
-            "audio_data": audio_b64,
-            "text": text
-        })
-        await websocket.send_text(message)
-        
-    except Exception as e:
-        print(f"❌ TTS error: {e}")
-        import traceback
-        traceback.print_exc()
+            audio_data = b"".join([chunk async for chunk in audio])
+        except Exception as e:
+            if recording:
+                recording.tts(text, time.perf_counter() - start_time, error=str(e))
+            raise
+        if recording:
+            recording.tts(text, time.perf_counter() - start_time, size=len(audio_data))
+
+    if not audio_data:
+        raise RuntimeError("ElevenLabs returned no audio")
+    log.debug("✅ Audio generated: %d bytes", len(audio_data))
+    return audio_data
+
+async def synthesize_stream(text: str, voice_id: str, priority: int = admission.PRIORITY_TAIL_SEGMENT):
+    """Yield audio bytes from the ElevenLabs streaming endpoint as they arrive."""
+    async with admission.slot("elevenlabs", priority):
+        log.debug("🎵 Streaming audio: %.50s...", text)
+
+        client = get_async_elevenlabs()
+        audio = client.text_to_speech.stream(
+            voice_id=voice_id,
+            text=text,
+            model_id=TTS_MODEL_ID,
+            output_format=TTS_OUTPUT_FORMAT
+        )
+        recording = upstream_trace.current()
+        arrivals = []  # (seconds since the previous chunk, size) for the trace
+        last = time.perf_counter()
+        total = 0
+        async for chunk in audio:
+            if chunk:
+                total += len(chunk)
+                if recording:
+                    now = time.perf_counter()
+                    arrivals.append((now - last, len(chunk)))
+                    last = now
+                yield chunk
+        if recording:
+            recording.tts(text, 0.0, chunks=arrivals)
+
+    log.debug("✅ Audio streamed: %d bytes", total)
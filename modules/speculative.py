@@ -0,0 +1,192 @@
+"""
+Speculative LLM generation on interim transcripts.
+
+While the user is pausing (but before the endpointer declares the utterance
+over) the audio so far is transcribed and an answer is generated for it in
+the background. Nothing is spoken yet: tokens are only buffered. When the
+final transcript arrives and matches the interim one after normalisation,
+the buffered tokens are replayed into the turn's queues and the rest of the
+stream follows live; otherwise the speculation is cancelled and the turn
+starts from scratch. Hit rate, wasted tokens and the head start gained are
+tracked so SPECULATIVE_SILENCE_MS can be tuned against spend.
+
+The speculative stream starts before its turn exists, so its timeline marks
+(llm_request, llm_first_token, ...) and upstream trace tokens are held back
+and attached, with their original timestamps, to the turn that commits it.
+"""
+import asyncio
+import re
+import time
+from typing import Iterable, Optional
+from modules import stt, metrics, upstream_trace
+from modules.conversation import Conversation
+from modules.llm import gpt_stream_to_queues
+from modules.log import log
+
+SPECULATIONS = metrics.counter("voice_speculations_total", "Speculative LLM generations by outcome")
+WASTED_TOKENS = metrics.counter("voice_speculation_wasted_tokens_total", "Tokens generated for discarded speculations")
+HEAD_START = metrics.histogram("voice_speculation_head_start_seconds",
+                               "Time a committed speculation had been generating before the final transcript")
+
+_stats = {"started": 0, "committed": 0, "missed": 0, "abandoned": 0,
+          "committed_tokens": 0, "wasted_tokens": 0, "head_start_s": 0.0}
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+class _Capture:
+    """Timeline and upstream recording stand-in for the speculative LLM task."""
+
+    def __init__(self):
+        self._marks = []  # (stage, perf_counter, attrs)
+        self._requested_at = None
+        self._tokens = []  # (perf_counter, token)
+        self._timeline = None
+        self._recording = None
+
+    def mark(self, stage: str, **attrs):
+        at = time.perf_counter()
+        self._marks.append((stage, at, attrs))
+        if self._timeline is not None:
+            self._timeline.mark(stage, at=at, speculative=True, **attrs)
+
+    def llm_request(self):
+        self._requested_at = time.perf_counter()
+        if self._recording is not None:
+            self._recording.llm_request(at=self._requested_at)
+
+    def llm_token(self, token: str):
+        at = time.perf_counter()
+        self._tokens.append((at, token))
+        if self._recording is not None:
+            self._recording.llm_token(token, at=at)
+
+    def attach(self, timeline, recording):
+        """Copy what was captured so far to the committing turn, and forward the rest."""
+        if timeline is not None:
+            for stage, at, attrs in self._marks:
+                timeline.mark(stage, at=at, speculative=True, **attrs)
+        if recording is not None:
+            if self._requested_at is not None:
+                recording.llm_request(at=self._requested_at)
+            for at, token in self._tokens:
+                recording.llm_token(token, at=at)
+        self._timeline = timeline
+        self._recording = recording
+
+class Speculation:
+    def __init__(self, samples, sample_rate: int, conversation: Optional[Conversation] = None):
+        self.conversation = conversation
+        self.transcript: Optional[str] = None
+        self.tokens = []
+        self.started_at = time.perf_counter()
+        self._changed = asyncio.Event()
+        self._settled = False
+        self._capture = _Capture()
+        self._task = asyncio.create_task(self._run(samples, sample_rate))
+        # Wakes replay() once the stream has finished or failed
+        self._task.add_done_callback(lambda _: self._changed.set())
+        _stats["started"] += 1
+
+    # Sink interface for gpt_stream_to_queues: buffers instead of blocking
+    async def put(self, item):
+        self.put_nowait(item)
+
+    def put_nowait(self, item):
+        # The end-of-stream sentinel is ignored: a failed stream sends it
+        # too, so replay() waits for the task itself to finish instead
+        if item is not None:
+            self.tokens.append(item)
+            self._changed.set()
+
+    def full(self) -> bool:
+        return False
+
+    async def _run(self, samples, sample_rate):
+        try:
+            self.transcript = await stt.transcribe(samples, sample_rate)
+        except Exception as e:
+            log.warning("⚠️  Interim transcription failed: %s", e)
+            self.transcript = ""
+        self._changed.set()
+        if not normalize_transcript(self.transcript):
+            return
+        log.info("🔮 Speculating on: %s", self.transcript)
+        # This task's own context: held until a turn commits the speculation
+        metrics.bind(self._capture)
+        upstream_trace.bind(self._capture)
+        await gpt_stream_to_queues(self.transcript, [self], self.conversation, record_turn=False)
+
+    async def matches(self, final_transcript: str) -> bool:
+        """Wait for the interim transcript and compare it with the final one."""
+        while self.transcript is None and not self._task.done():
+            self._changed.clear()
+            await self._changed.wait()
+        return bool(self.transcript) and \
+            normalize_transcript(self.transcript) == normalize_transcript(final_transcript)
+
+    async def replay(self, queues: Iterable[asyncio.Queue]):
+        """
+        Commit: feed buffered tokens, then the rest of the stream, into
+        ``queues`` (drop-in for gpt_stream_to_queues in run_turn), and record
+        the turn in the conversation. The stream's timeline marks and trace
+        tokens go to the current turn's timeline and recording.
+        """
+        queues = list(queues)
+        self._settle("committed")
+        head_start = time.perf_counter() - self.started_at
+        HEAD_START.observe(head_start)
+        _stats["head_start_s"] += head_start
+        metrics.mark("speculation_commit", buffered_tokens=len(self.tokens))
+        self._capture.attach(metrics.current(), upstream_trace.current())
+        sent = 0
+        completed = False
+        try:
+            while True:
+                while sent < len(self.tokens):
+                    for queue in queues:
+                        await queue.put(self.tokens[sent])
+                    sent += 1
+                if self._task.done():
+                    self._task.result()  # Surface LLM errors to the turn
+                    break
+                self._changed.clear()
+                await self._changed.wait()
+            completed = True
+        finally:
+            _stats["committed_tokens"] += sent
+            if not self._task.done():
+                self._task.cancel()
+            if self.conversation is not None:
+                self.conversation.add_turn(self.transcript, "".join(self.tokens[:sent]))
+            for queue in queues:
+                if completed:
+                    await queue.put(None)
+                elif not queue.full():
+                    queue.put_nowait(None)
+
+    def cancel(self, outcome: str = "abandoned"):
+        """Discard the speculation ("missed": final transcript differed)."""
+        if not self._task.done():
+            self._task.cancel()
+        if self._settle(outcome):
+            _stats["wasted_tokens"] += len(self.tokens)
+            WASTED_TOKENS.inc(len(self.tokens))
+
+    def _settle(self, outcome: str) -> bool:
+        if self._settled:
+            return False
+        self._settled = True
+        _stats[outcome] += 1
+        SPECULATIONS.inc(outcome=outcome)
+        return True
+
+def stats() -> dict:
+    settled = _stats["committed"] + _stats["missed"]
+    return {
+        **_stats,
+        "head_start_s": round(_stats["head_start_s"], 3),
+        "hit_rate": round(_stats["committed"] / settled, 3) if settled else None,
+        "avg_head_start_s": round(_stats["head_start_s"] / _stats["committed"], 3) if _stats["committed"] else None,
+    }
@@ -1,33 +1,20 @@
-from config import OPENAI_API_KEY
-from openai import OpenAI
-import os
+from modules.providers import get_async_openai
+from modules.log import log
 import time
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def transcribe_audio(file_path: str) -> str:
+async def transcribe_upload(data: bytes, filename: str = "audio.wav") -> str:
     """
-    Transcribe audio file using OpenAI Whisper API.
+    Transcribe an encoded audio file held in memory with the async client.
+    Raises on failure, and cancelling it (hedging, deadlines, barge-in)
+    aborts the upload.
     """
-    try:
-        start_time = time.time()
-        file_size = os.path.getsize(file_path)
-        print(f"🎤 Starting transcription: {file_path} ({file_size} bytes)")
-        
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
-        
-        elapsed = time.time() - start_time
-        print(f"✅ Transcription completed in {elapsed:.2f}s")
-        
-        return transcript if isinstance(transcript, str) else transcript.text
-    except Exception as e:
-        print(f"❌ Whisper API transcription failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return "Transcription failed"
\ No newline at end of file
+    log.info("🎤 Starting transcription: %s (%d bytes)", filename, len(data))
+    start_time = time.time()
+    client = get_async_openai()
+    transcript = await client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(filename, data),
+        response_format="text"
+    )
+    log.info("✅ Transcription completed in %.2fs", time.time() - start_time)
+    return transcript if isinstance(transcript, str) else transcript.text
@@ -0,0 +1,138 @@
+"""
+Pluggable speech-to-text backends.
+
+``transcribe()`` sends audio to the configured backend (STT_BACKEND) and, if
+that raises, to STT_FALLBACK. A request that runs long is hedged on
+STT_HEDGE_BACKEND, and the whole call is bounded by STT_DEADLINE (see
+modules/hedging.py). Audio can be a file path, encoded file bytes, or mono
+float32 samples with their sample rate.
+"""
+from typing import Dict, Optional
+import os
+import time
+import numpy as np
+from config import (
+    SAMPLE_RATE,
+    STT_BACKEND,
+    STT_FALLBACK,
+    STT_HEDGE_BACKEND,
+    STT_HEDGE_DELAY,
+    STT_DEADLINE,
+)
+from modules import providers, metrics, admission, hedging, upstream_trace
+from modules.audio import resample, encode_for_upload
+from modules.log import log
+from modules.speechToText import transcribe_upload
+
+class STTBackend:
+    name = "base"
+
+    async def load(self):
+        """Prepare the backend (load models, open connections)."""
+
+    async def transcribe(self, audio, sample_rate: int = SAMPLE_RATE, filename: str = "audio.wav") -> str:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+class WhisperAPIBackend(STTBackend):
+    """OpenAI Whisper API through the async client, so cancelling a request stops it."""
+    name = "api"
+
+    async def transcribe(self, audio, sample_rate: int = SAMPLE_RATE, filename: str = "audio.wav") -> str:
+        if isinstance(audio, np.ndarray):
+            log.info("🎤 Audio to transcribe: %.2fs", len(audio) / sample_rate)
+            data, filename = await providers.run_blocking(encode_for_upload, audio, sample_rate)
+        elif isinstance(audio, (bytes, bytearray)):
+            data = bytes(audio)
+        else:
+            data, filename = await providers.run_blocking(_read_file, audio), os.path.basename(audio)
+        async with admission.slot("openai", admission.PRIORITY_STT):
+            return await transcribe_upload(data, filename)
+
+class LocalWhisperBackend(STTBackend):
+    """On-box faster-whisper engine with a preloaded model."""
+    name = "local"
+
+    def __init__(self):
+        from modules.stt_local import LocalWhisperEngine
+        self.engine = LocalWhisperEngine()
+
+    async def load(self):
+        await self.engine.load_async()
+
+    async def transcribe(self, audio, sample_rate: int = SAMPLE_RATE, filename: str = "audio.wav") -> str:
+        if isinstance(audio, np.ndarray):
+            audio = resample(audio, sample_rate, 16000)  # Whisper models expect 16 kHz
+        return await self.engine.transcribe(audio)
+
+    def stats(self) -> dict:
+        return self.engine.stats()
+
+BACKENDS = {
+    "api": WhisperAPIBackend,
+    "local": LocalWhisperBackend,
+}
+
+_backends: Dict[str, STTBackend] = {}
+
+STAGE = hedging.register_stage("stt", STT_HEDGE_DELAY, STT_DEADLINE)
+
+def get_stt_backend(name: Optional[str] = None) -> STTBackend:
+    """Process-wide backend instance by name (defaults to config.STT_BACKEND)."""
+    name = name or STT_BACKEND
+    if name not in _backends:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown STT backend: {name}")
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+async def preload():
+    """Load the configured backends up front so the first request doesn't pay for it."""
+    await get_stt_backend().load()
+    if STT_HEDGE_BACKEND:
+        await get_stt_backend(STT_HEDGE_BACKEND).load()
+
+def audio_seconds(audio, sample_rate: int = SAMPLE_RATE) -> float:
+    """Length of the audio in seconds; a rough 128 kbit/s estimate for encoded files."""
+    if isinstance(audio, np.ndarray):
+        return len(audio) / sample_rate
+    size = len(audio) if isinstance(audio, (bytes, bytearray)) else os.path.getsize(audio)
+    return size / 16000
+
+async def transcribe(audio, sample_rate: int = SAMPLE_RATE, filename: str = "audio.wav") -> str:
+    """
+    Transcribe with the configured backend: hedged on STT_HEDGE_BACKEND when
+    slow, retried on STT_FALLBACK on errors, bounded by STT_DEADLINE.
+    """
+    backend = get_stt_backend()
+    hedge_backend = get_stt_backend(STT_HEDGE_BACKEND or None)
+    fallback = get_stt_backend(STT_FALLBACK or None)
+    metrics.mark("stt_start", backend=backend.name)
+    start_time = time.perf_counter()
+    text = await hedging.hedged(
+        STAGE,
+        lambda: backend.transcribe(audio, sample_rate, filename),
+        hedge=lambda: hedge_backend.transcribe(audio, sample_rate, filename),
+        retry=lambda: fallback.transcribe(audio, sample_rate, filename),
+        scale=max(audio_seconds(audio, sample_rate), 1.0),
+    )
+    metrics.mark("stt_end")
+    metrics.STT_DURATION.observe(time.perf_counter() - start_time)
+    recording = upstream_trace.current()
+    if recording:
+        recording.stt(text, time.perf_counter() - start_time, audio_seconds(audio, sample_rate))
+    return text
+
+def stats() -> dict:
+    return {name: backend.stats() for name, backend in _backends.items()}
+
+def shutdown():
+    for backend in _backends.values():
+        if isinstance(backend, LocalWhisperBackend):
+            backend.engine.shutdown()
@@ -0,0 +1,96 @@
+"""
+Local faster-whisper transcription engine.
+
+The model is loaded once per process and shared by a dedicated worker pool
+(one thread per CTranslate2 model worker), so up to WHISPER_NUM_WORKERS
+requests are transcribed in parallel and the rest wait for a free worker.
+"""
+import asyncio
+import concurrent.futures
+import io
+import time
+from config import (
+    WHISPER_MODEL_SIZE,
+    WHISPER_MODEL_DIR,
+    WHISPER_DEVICE,
+    WHISPER_COMPUTE_TYPE,
+    WHISPER_CPU_THREADS,
+    WHISPER_NUM_WORKERS,
+    WHISPER_BEAM_SIZE,
+)
+
+class LocalWhisperEngine:
+    def __init__(self, model_size: str = WHISPER_MODEL_SIZE, device: str = WHISPER_DEVICE,
+                 compute_type: str = WHISPER_COMPUTE_TYPE, cpu_threads: int = WHISPER_CPU_THREADS,
+                 num_workers: int = WHISPER_NUM_WORKERS):
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self.model = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="whisper"
+        )
+        self._load_task = None
+        self.in_flight = 0
+        self.stats_counters = {"requests": 0, "errors": 0, "max_in_flight_seen": 0}
+
+    def load(self):
+        """Load the model (blocking). Safe to call more than once."""
+        if self.model is not None:
+            return
+        from faster_whisper import WhisperModel
+        start_time = time.time()
+        print(f"🧠 Loading faster-whisper '{self.model_size}' ({self.device}, {self.compute_type})...")
+        self.model = WhisperModel(
+            self.model_size,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+            num_workers=self.num_workers,
+            download_root=WHISPER_MODEL_DIR,
+        )
+        print(f"✅ faster-whisper loaded in {time.time() - start_time:.2f}s")
+
+    async def load_async(self):
+        # Concurrent first requests share one load
+        if self._load_task is None or (self._load_task.done() and self._load_task.exception()):
+            self._load_task = asyncio.ensure_future(
+                asyncio.get_running_loop().run_in_executor(self._executor, self.load))
+        await asyncio.shield(self._load_task)
+
+    def _transcribe_blocking(self, audio) -> str:
+        if isinstance(audio, (bytes, bytearray)):
+            audio = io.BytesIO(audio)
+        segments, _ = self.model.transcribe(audio, beam_size=WHISPER_BEAM_SIZE, vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    async def transcribe(self, audio) -> str:
+        """Transcribe audio (path, encoded bytes or 16 kHz float32 samples) on a model worker."""
+        if self.model is None:
+            await self.load_async()
+        self.stats_counters["requests"] += 1
+        self.in_flight += 1
+        self.stats_counters["max_in_flight_seen"] = max(self.stats_counters["max_in_flight_seen"], self.in_flight)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._transcribe_blocking, audio)
+        except Exception:
+            self.stats_counters["errors"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "loaded": self.model is not None,
+            "in_flight": self.in_flight,
+            "model": self.model_size,
+            "compute_type": self.compute_type,
+            "workers": self.num_workers,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
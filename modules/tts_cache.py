@@ -0,0 +1,177 @@
+"""
+Content-addressed cache for synthesized TTS audio.
+
+Entries are keyed by (voice_id, model_id, normalized text, output format).
+A size-bounded in-memory LRU sits in front of an optional on-disk store so
+common phrases ("Sure!", greetings, repeated answers) survive restarts.
+Memory lookups are plain dict operations; disk reads and writes run on the
+shared executor so the synthesis hot path never blocks on file I/O.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+from config import (
+    TTS_CACHE_ENABLED,
+    TTS_CACHE_MEMORY_MB,
+    TTS_CACHE_DIR,
+    TTS_CACHE_DISK_MB,
+    TTS_CACHE_MAX_ENTRY_KB,
+)
+from modules.log import log
+from modules.providers import run_blocking
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and unicode variants that don't change the spoken audio."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def make_key(voice_id: str, model_id: str, text: str, output_format: str) -> str:
+    raw = "\x1f".join([voice_id, model_id, normalize_text(text), output_format])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class TTSCache:
+    def __init__(self, max_memory_bytes: int, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 0, max_entry_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_writes = 0
+        self._background = set()
+        self.stats_counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+            "stores": 0,
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".audio")
+
+    def _remember(self, key: str, audio: bytes):
+        if key in self._entries:
+            self._memory_bytes -= len(self._entries.pop(key))
+        self._entries[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats_counters["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self._entries.get(key)
+        if audio is not None:
+            self._entries.move_to_end(key)
+            self.stats_counters["memory_hits"] += 1
+            return audio
+
+        if self.disk_dir:
+            audio = await run_blocking(self._read_disk, key)
+            if audio is not None:
+                self.stats_counters["disk_hits"] += 1
+                self._remember(key, audio)
+                return audio
+
+        self.stats_counters["misses"] += 1
+        return None
+
+    def put(self, key: str, audio: bytes):
+        """Store audio; the disk write happens in the background."""
+        if not audio or (self.max_entry_bytes and len(audio) > self.max_entry_bytes):
+            return
+        self.stats_counters["stores"] += 1
+        self._remember(key, audio)
+        if self.disk_dir:
+            task = asyncio.ensure_future(run_blocking(self._write_disk, key, audio))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        """Read a stored clip; an empty or unreadable file is dropped and treated as a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log.warning("⚠️  Unreadable TTS cache file %s: %s", path, e)
+            audio = b""
+        if audio:
+            return audio
+
+        self.stats_counters["disk_errors"] += 1
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        return None
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+        self._disk_writes += 1
+        if self.max_disk_bytes and self._disk_writes % 50 == 0:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """Drop the least recently written files until the store fits its budget."""
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith(".audio"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                self.stats_counters["disk_evictions"] += 1
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        hits = self.stats_counters["memory_hits"] + self.stats_counters["disk_hits"]
+        lookups = hits + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "disk_dir": self.disk_dir,
+        }
+
+_cache = None
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """Process-wide TTS cache, or None when caching is disabled."""
+    global _cache
+    if _cache is None and TTS_CACHE_ENABLED:
+        _cache = TTSCache(
+            max_memory_bytes=TTS_CACHE_MEMORY_MB * 1024 * 1024,
+            disk_dir=TTS_CACHE_DIR or None,
+            max_disk_bytes=TTS_CACHE_DISK_MB * 1024 * 1024,
+            max_entry_bytes=TTS_CACHE_MAX_ENTRY_KB * 1024,
+        )
+    return _cache
@@ -0,0 +1,101 @@
+"""
+Per-turn upstream recordings for deterministic replay.
+
+With TRACE_CAPTURE_FILE set, every /stream turn appends one JSON line that
+records what the providers did during it:
+
+    {"turn_id": 3, "status": "completed", "input": "...", "voice_id": "...",
+     "stt": [{"text": "...", "latency": 0.41, "audio_s": 2.3}],
+     "llm": [[0.42, "Sure"], [0.019, "!"], ...],
+     "tts": [{"text": "...", "bytes": 31200, "latency": 0.62},
+             {"text": "...", "chunks": [[0.3, 4096], [0.05, 4096]]},
+             {"text": "...", "error": "...", "latency": 10.0}]}
+
+``llm`` holds the streamed tokens, each with the seconds since the previous
+one (the first since the request was sent). ``benchmarks/replay_trace.py``
+feeds recordings back through the real pipeline with the same timing, so
+pipeline changes can be compared on an identical workload. Cache hits,
+discarded speculative generations and /transcribe uploads are not recorded;
+a committed speculation is recorded with its original token timing.
+"""
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from typing import List, Optional
+from config import TRACE_CAPTURE_FILE
+from modules import providers
+
+_current: contextvars.ContextVar = contextvars.ContextVar("upstream_trace", default=None)
+_write_lock = threading.Lock()
+
+class TurnRecording:
+    def __init__(self, turn_id=None):
+        self.data = {"turn_id": turn_id, "status": None, "input": None, "voice_id": None,
+                     "stt": [], "llm": [], "tts": []}
+        self._last_token_at = None
+
+    def set_input(self, text: str, voice_id: Optional[str] = None):
+        self.data["input"] = text
+        self.data["voice_id"] = voice_id
+
+    def llm_request(self, at: Optional[float] = None):
+        self._last_token_at = time.perf_counter() if at is None else at
+
+    def llm_token(self, token: str, at: Optional[float] = None):
+        now = time.perf_counter() if at is None else at
+        self.data["llm"].append([round(now - (self._last_token_at or now), 4), token])
+        self._last_token_at = now
+
+    def tts(self, text: str, latency: float, size: Optional[int] = None, chunks=None, error: Optional[str] = None):
+        entry = {"text": text}
+        if chunks is not None:
+            entry["chunks"] = [[round(dt, 4), n] for dt, n in chunks]
+        else:
+            entry["bytes"] = size
+            entry["latency"] = round(latency, 4)
+        if error is not None:
+            entry["error"] = error
+            entry["latency"] = round(latency, 4)
+        self.data["tts"].append(entry)
+
+    def stt(self, text: str, latency: float, audio_s: float):
+        self.data["stt"].append({"text": text, "latency": round(latency, 4), "audio_s": round(audio_s, 3)})
+
+def begin_turn(turn_id=None) -> Optional[TurnRecording]:
+    """Start recording the current task's turn (no-op unless TRACE_CAPTURE_FILE is set)."""
+    if not TRACE_CAPTURE_FILE:
+        return None
+    recording = TurnRecording(turn_id)
+    _current.set(recording)
+    return recording
+
+def current() -> Optional[TurnRecording]:
+    return _current.get()
+
+def bind(recording):
+    """Make ``recording`` (anything with the ``llm_*``/``tts``/``stt`` methods) the current task's."""
+    _current.set(recording)
+
+def detach():
+    """Stop recording in this task (background work started from within a turn)."""
+    _current.set(None)
+
+def _append(line: str):
+    with _write_lock, open(TRACE_CAPTURE_FILE, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+async def finish_turn(recording: Optional[TurnRecording], status: str):
+    """Append the turn to TRACE_CAPTURE_FILE (off the event loop)."""
+    if recording is None:
+        return
+    recording.data["status"] = status
+    line = json.dumps(recording.data, ensure_ascii=False, separators=(",", ":"))
+    # The next turn cancels this task as soon as it starts; the write still has to land
+    await asyncio.shield(providers.run_blocking(_append, line))
+
+def load(path: str) -> List[dict]:
+    """All turns recorded in a trace file."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
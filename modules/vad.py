@@ -0,0 +1,174 @@
+"""
+Energy-based voice activity detection and end-of-speech endpointing.
+
+Frame energies are computed for a whole incoming block at once with NumPy;
+only the small per-frame state machine runs in Python.
+"""
+from typing import List, Optional
+import numpy as np
+from config import (
+    SAMPLE_RATE,
+    VAD_FRAME_MS,
+    VAD_THRESHOLD_DB,
+    VAD_NOISE_MARGIN_DB,
+    VAD_MIN_SPEECH_MS,
+    VAD_END_SILENCE_MS,
+    VAD_PREROLL_MS,
+    VAD_MAX_UTTERANCE_S,
+    TRIM_SILENCE_PAD_MS,
+)
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+def frame_energies_db(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS energy in dBFS of each complete frame in ``samples``."""
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1) + 1e-12)
+    return 20.0 * np.log10(rms)
+
+def trim_silence(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, threshold_db: float = VAD_THRESHOLD_DB,
+                 pad_ms: int = TRIM_SILENCE_PAD_MS, frame_ms: int = VAD_FRAME_MS) -> np.ndarray:
+    """
+    Cut leading and trailing frames quieter than ``threshold_db``, keeping
+    ``pad_ms`` either side of the speech. Returns an empty array if no frame
+    is loud enough.
+    """
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    loud = np.flatnonzero(frame_energies_db(samples, frame_len) > threshold_db)
+    if len(loud) == 0:
+        return samples[:0]
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(0, loud[0] * frame_len - pad)
+    end = min(len(samples), (loud[-1] + 1) * frame_len + pad)
+    return samples[start:end]
+
+class Endpointer:
+    """
+    Buffers a stream of mono float32 samples and reports when an utterance
+    starts and ends.
+
+    A frame counts as speech when its energy is above both ``threshold_db``
+    and the running noise floor plus ``noise_margin_db``. Speech starts after
+    ``min_speech_ms`` of speech frames and ends after ``end_silence_ms`` of
+    silence (or at ``max_utterance_s``). ``preroll_ms`` of audio before the
+    start is kept so the first syllable isn't clipped. Audio in the same
+    block after an end of speech is held back and processed, as the start
+    of the next utterance, by the next ``feed()`` (an empty block will do).
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS,
+                 threshold_db: float = VAD_THRESHOLD_DB, noise_margin_db: float = VAD_NOISE_MARGIN_DB,
+                 min_speech_ms: int = VAD_MIN_SPEECH_MS, end_silence_ms: int = VAD_END_SILENCE_MS,
+                 preroll_ms: int = VAD_PREROLL_MS, max_utterance_s: float = VAD_MAX_UTTERANCE_S):
+        self.sample_rate = sample_rate
+        self.frame_len = max(1, int(sample_rate * frame_ms / 1000))
+        self.frame_ms = frame_ms
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.end_silence_frames = max(1, end_silence_ms // frame_ms)
+        self.preroll_samples = int(sample_rate * preroll_ms / 1000)
+        self.max_samples = int(sample_rate * max_utterance_s)
+        self.noise_floor_db = threshold_db - noise_margin_db
+        self._carry = np.empty(0, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self._carry = np.empty(0, dtype=np.float32)
+        self._chunks: List[np.ndarray] = []
+        self._buffered = 0
+        self._remainder = np.empty(0, dtype=np.float32)
+        self.in_speech = False
+        self.had_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+
+    @property
+    def trailing_silence_ms(self) -> int:
+        """How long the speaker has been quiet since the last speech frame."""
+        return self._silence_run * self.frame_ms if self.had_speech else 0
+
+    @property
+    def duration_s(self) -> float:
+        return self._buffered / self.sample_rate
+
+    def _append(self, samples: np.ndarray):
+        self._chunks.append(samples)
+        self._buffered += len(samples)
+        if not self.had_speech:
+            # Before speech only keep the pre-roll window
+            while self._chunks and self._buffered - len(self._chunks[0]) >= self.preroll_samples:
+                self._buffered -= len(self._chunks.pop(0))
+
+    def _unappend(self, n: int):
+        """Drop the last ``n`` buffered samples (all from the latest block)."""
+        last = self._chunks.pop()
+        self._buffered -= n
+        if len(last) > n:
+            self._chunks.append(last[:len(last) - n])
+
+    def feed(self, samples: np.ndarray) -> Optional[str]:
+        """Add samples; returns SPEECH_START / SPEECH_END when the state changes."""
+        if len(self._carry):
+            samples = np.concatenate([self._carry, samples])
+            self._carry = self._carry[:0]
+        if len(samples) == 0:
+            return None
+        self._append(samples)
+
+        samples = np.concatenate([self._remainder, samples]) if len(self._remainder) else samples
+        energies = frame_energies_db(samples, self.frame_len)
+        self._remainder = samples[len(energies) * self.frame_len:]
+        if len(energies) == 0:
+            return None
+
+        threshold = max(self.threshold_db, self.noise_floor_db + self.noise_margin_db)
+        is_speech = energies > threshold
+
+        # Track the noise floor on non-speech frames while nobody is talking
+        if not self.in_speech and not is_speech.all():
+            quiet = float(np.median(energies[~is_speech]))
+            self.noise_floor_db = 0.9 * self.noise_floor_db + 0.1 * quiet
+
+        event = None
+        for index, speech in enumerate(is_speech):
+            if speech:
+                self._speech_run += 1
+                self._silence_run = 0
+                if not self.in_speech and self._speech_run >= self.min_speech_frames:
+                    self.in_speech = True
+                    self.had_speech = True
+                    event = SPEECH_START
+            else:
+                self._silence_run += 1
+                self._speech_run = 0
+                if self.in_speech and self._silence_run >= self.end_silence_frames:
+                    self.in_speech = False
+                    # The rest of the block belongs to whatever comes next
+                    rest = samples[(index + 1) * self.frame_len:]
+                    self._remainder = self._remainder[:0]
+                    if len(rest):
+                        self._carry = rest
+                        self._unappend(len(rest))
+                    return SPEECH_END
+
+        if self.had_speech and self._buffered >= self.max_samples:
+            self.in_speech = False
+            return SPEECH_END
+        return event
+
+    def snapshot(self) -> np.ndarray:
+        """Everything buffered so far, without starting over."""
+        return np.concatenate(self._chunks) if self._chunks else np.empty(0, dtype=np.float32)
+
+    def utterance(self) -> np.ndarray:
+        """Everything buffered so far (pre-roll included), then start over."""
+        audio = self.snapshot()
+        carry = self._carry
+        self.reset()
+        self._carry = carry  # Audio after the end of speech starts the next utterance
+        return audio
@@ -0,0 +1,82 @@
+"""
+Startup warm-up, timed step by step.
+
+Runs from the backend's startup event before the worker reports ready: loads
+the STT model, imports the provider SDKs and builds their clients, loads the
+tokenizer and caches, and opens WARMUP_CONNECTIONS pooled connections per
+provider with a cheap authenticated request (listing models), so the first
+turn doesn't pay for DNS, TLS or SDK initialisation. With FILLER_AUDIO on it
+also renders the filler clips. Durations are kept for
+/stats ("startup"). Network steps are best effort; only a failure of a local
+step keeps the worker from reporting ready.
+"""
+import asyncio
+import time
+from config import WARMUP_CONNECTIONS, FILLER_AUDIO
+from modules import providers, stt, metrics, fillers
+from modules.conversation import count_tokens
+from modules.tts_cache import get_tts_cache
+from modules.llm_cache import get_llm_cache
+
+_results = {"import_s": None, "steps": {}, "errors": {}, "total_s": None}
+
+def record_import(seconds: float):
+    """How long importing the app took (measured by backend/main.py)."""
+    _results["import_s"] = round(seconds, 3)
+
+async def _step(name: str, run, required: bool = True):
+    start = time.perf_counter()
+    try:
+        result = run()
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception as e:
+        _results["errors"][name] = str(e)
+        if required:
+            raise
+        print(f"⚠️  Warm-up step {name} failed: {e}")
+    finally:
+        _results["steps"][name] = round(time.perf_counter() - start, 3)
+
+async def _open_connections(request, count: int):
+    await asyncio.gather(*(request() for _ in range(count)))
+
+async def run(connections: int = WARMUP_CONNECTIONS):
+    """Warm everything the first turn would otherwise initialise on demand."""
+    start = time.perf_counter()
+    await _step("stt_model", stt.preload)
+    await _step("openai_client", providers.get_async_openai)
+    await _step("elevenlabs_client", providers.get_async_elevenlabs)
+    await _step("tokenizer", lambda: count_tokens("warm up"))
+    await _step("caches", lambda: (get_tts_cache(), get_llm_cache()))
+
+    if connections > 0:
+        openai, elevenlabs = providers.get_async_openai(), providers.get_async_elevenlabs()
+        steps = [
+            _step("openai_connections", lambda: _open_connections(openai.models.list, connections),
+                  required=False),
+            _step("elevenlabs_connections", lambda: _open_connections(elevenlabs.models.list, connections),
+                  required=False),
+        ]
+        await asyncio.gather(*steps)
+
+    if FILLER_AUDIO:
+        await _step("filler_clips", fillers.preload, required=False)
+
+    _results["total_s"] = round(time.perf_counter() - start, 3)
+    print(f"🔥 Warm-up done in {_results['total_s']:.2f}s: "
+          + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in _results["steps"].items()))
+
+def stats() -> dict:
+    return {**_results, "steps": dict(_results["steps"]), "errors": dict(_results["errors"])}
+
+def gauges() -> dict:
+    """Import and warm-up durations, for /metrics."""
+    values = {}
+    if _results["import_s"] is not None:
+        values["voice_startup_import_seconds"] = _results["import_s"]
+    if _results["total_s"] is not None:
+        values["voice_startup_warmup_seconds"] = _results["total_s"]
+    return values
+
+metrics.register_collector(gauges)
@@ -6,6 +6,54 @@ import { Mic, Square, Volume2, Loader2 } from 'lucide-react';
 const API_URL = 'http://localhost:8000';
 const WS_URL = 'ws://localhost:8000/stream';
 
+// Binary audio frame header: version u8, flags u8, seq u32, text_len u16 (big-endian)
+const AUDIO_FRAME_HEADER_SIZE = 8;
+
+const decodeAudioFrame = (buffer: ArrayBuffer) => {
+  const view = new DataView(buffer);
+  const seq = view.getUint32(2);
+  const textLength = view.getUint16(6);
+  const text = new TextDecoder().decode(
+    new Uint8Array(buffer, AUDIO_FRAME_HEADER_SIZE, textLength)
+  );
+  const audio = new Uint8Array(buffer, AUDIO_FRAME_HEADER_SIZE + textLength);
+  return { seq, text, audio };
+};
+
+// Incremental TTS needs MSE to start playback from the first MP3 bytes
+const supportsStreamingPlayback = () =>
+  typeof window !== 'undefined' &&
+  'MediaSource' in window &&
+  MediaSource.isTypeSupported('audio/mpeg');
+
+interface StreamingPlayer {
+  mediaSource: MediaSource;
+  sourceBuffer: SourceBuffer | null;
+  pending: Uint8Array[];
+  ended: boolean;
+  url: string;
+}
+
+// Stream raw microphone PCM over /stream and let the server detect end of speech
+const supportsStreamingInput = () =>
+  typeof window !== 'undefined' && 'AudioContext' in window;
+
+const floatTo16BitPCM = (samples: Float32Array) => {
+  const pcm = new Int16Array(samples.length);
+  for (let i = 0; i < samples.length; i++) {
+    const s = Math.max(-1, Math.min(1, samples[i]));
+    pcm[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+  }
+  return pcm.buffer;
+};
+
+interface MicStream {
+  context: AudioContext;
+  stream: MediaStream;
+  source: MediaStreamAudioSourceNode;
+  processor: ScriptProcessorNode;
+}
+
 interface Voice {
   voice_id: string;
   name: string;
@@ -26,6 +74,11 @@ export default function VoiceAgent() {
   const isPlayingAudioRef = useRef(false);
   const wsRef = useRef<WebSocket | null>(null);
   const currentAudioRef = useRef<HTMLAudioElement | null>(null);
+  const streamingPlayerRef = useRef<StreamingPlayer | null>(null);
+  const micRef = useRef<MicStream | null>(null);
+  // Session id issued by the server in its hello reply; passing it back lets
+  // it keep conversation memory across our per-turn sockets
+  const sessionIdRef = useRef<string | null>(null);
 
   useEffect(() => {
     // Fetch available voices
@@ -52,7 +105,22 @@ export default function VoiceAgent() {
     };
   }, []);
 
+  const stopMicStream = () => {
+    const mic = micRef.current;
+    if (!mic) {
+      return;
+    }
+    mic.processor.onaudioprocess = null;
+    mic.processor.disconnect();
+    mic.source.disconnect();
+    mic.stream.getTracks().forEach(track => track.stop());
+    mic.context.close();
+    micRef.current = null;
+  };
+
   const stopAllAudio = () => {
+    stopMicStream();
+    
     // Stop current audio playback
     if (currentAudioRef.current) {
       currentAudioRef.current.pause();
@@ -63,14 +131,72 @@ export default function VoiceAgent() {
     audioQueueRef.current = [];
     isPlayingAudioRef.current = false;
     
-    // Close WebSocket
+    // Drop the streaming (MSE) player, if any
+    if (streamingPlayerRef.current) {
+      URL.revokeObjectURL(streamingPlayerRef.current.url);
+      streamingPlayerRef.current = null;
+    }
+    
+    // Close WebSocket, telling the server to stop the in-flight turn first
     if (wsRef.current) {
+      if (wsRef.current.readyState === WebSocket.OPEN) {
+        wsRef.current.send(JSON.stringify({ type: 'cancel' }));
+      }
       wsRef.current.close();
       wsRef.current = null;
     }
   };
 
+  const startStreamingRecording = async () => {
+    try {
+      // Stop any ongoing AI response immediately
+      stopAllAudio();
+      
+      const stream = await navigator.mediaDevices.getUserMedia({ 
+        audio: {
+          channelCount: 1,
+          sampleRate: 16000,
+          echoCancellation: true,
+          noiseSuppression: true
+        } 
+      });
+      
+      const context = new AudioContext({ sampleRate: 16000 });
+      const source = context.createMediaStreamSource(stream);
+      const processor = context.createScriptProcessor(4096, 1, 1);
+      micRef.current = { context, stream, source, processor };
+      
+      openStream((ws) => {
+        ws.send(JSON.stringify({
+          type: 'audio_start',
+          sample_rate: context.sampleRate,
+          voice_id: selectedVoice
+        }));
+        
+        // Send PCM while the user is still speaking
+        processor.onaudioprocess = (event) => {
+          if (ws.readyState === WebSocket.OPEN) {
+            ws.send(floatTo16BitPCM(event.inputBuffer.getChannelData(0)));
+          }
+        };
+        source.connect(processor);
+        processor.connect(context.destination);
+      });
+      
+      setIsRecording(true);
+      setStatus('🎤 Listening... stop talking or click to send');
+    } catch (error) {
+      console.error('Error starting recording:', error);
+      stopMicStream();
+      setStatus('❌ Microphone access denied');
+    }
+  };
+
   const startRecording = async () => {
+    if (supportsStreamingInput()) {
+      return startStreamingRecording();
+    }
+
     try {
       // Stop any ongoing AI response immediately
       stopAllAudio();
@@ -117,7 +243,14 @@ export default function VoiceAgent() {
   };
 
   const stopRecording = () => {
-    if (mediaRecorderRef.current && isRecording) {
+    if (micRef.current && isRecording) {
+      // Don't wait for the server's endpointer
+      stopMicStream();
+      wsRef.current?.send(JSON.stringify({ type: 'audio_end' }));
+      setIsRecording(false);
+      setStatus('Processing audio...');
+      setIsLoading(true);
+    } else if (mediaRecorderRef.current && isRecording) {
       mediaRecorderRef.current.stop();
       setIsRecording(false);
       setStatus('Processing audio...');
@@ -181,6 +314,63 @@ export default function VoiceAgent() {
     }
   };
 
+  const flushStreamingAudio = () => {
+    const player = streamingPlayerRef.current;
+    if (!player || !player.sourceBuffer || player.sourceBuffer.updating) {
+      return;
+    }
+
+    const next = player.pending.shift();
+    if (next) {
+      player.sourceBuffer.appendBuffer(next);
+    } else if (player.ended && player.mediaSource.readyState === 'open') {
+      player.mediaSource.endOfStream();
+    }
+  };
+
+  const appendStreamingAudio = (bytes: Uint8Array) => {
+    let player = streamingPlayerRef.current;
+
+    if (!player) {
+      // One continuous MSE stream per turn; segments arrive in order
+      const mediaSource = new MediaSource();
+      const url = URL.createObjectURL(mediaSource);
+      const newPlayer: StreamingPlayer = { mediaSource, sourceBuffer: null, pending: [], ended: false, url };
+      streamingPlayerRef.current = newPlayer;
+      player = newPlayer;
+
+      mediaSource.addEventListener('sourceopen', () => {
+        const sourceBuffer = mediaSource.addSourceBuffer('audio/mpeg');
+        sourceBuffer.mode = 'sequence';
+        sourceBuffer.addEventListener('updateend', flushStreamingAudio);
+        newPlayer.sourceBuffer = sourceBuffer;
+        flushStreamingAudio();
+      });
+
+      const audio = new Audio(url);
+      currentAudioRef.current = audio;
+      audio.play().catch((error) => {
+        console.error('❌ Failed to play streaming audio:', error);
+        if (error instanceof Error && error.name === 'NotAllowedError') {
+          setStatus('🔇 Click to enable audio');
+        }
+      });
+      console.log('🔊 Started streaming playback');
+    }
+
+    if (bytes.length > 0) {
+      player.pending.push(bytes);
+    }
+    flushStreamingAudio();
+  };
+
+  const endStreamingAudio = () => {
+    if (streamingPlayerRef.current) {
+      streamingPlayerRef.current.ended = true;
+      flushStreamingAudio();
+    }
+  };
+
   const sendMessage = (message: string) => {
     setStatus('🤖 AI is responding...');
     setIsLoading(true);
@@ -189,23 +379,84 @@ export default function VoiceAgent() {
     // Stop any existing audio/connections
     stopAllAudio();
 
+    openStream((ws) => {
+      ws.send(JSON.stringify({
+        type: 'text_input',
+        text: message,
+        voice_id: selectedVoice
+      }));
+    });
+  };
+
+  const openStream = (onReady: (ws: WebSocket) => void) => {
+    setAiResponse('');
+
     const ws = new WebSocket(WS_URL);
+    ws.binaryType = 'arraybuffer';
     wsRef.current = ws;
     let fullResponse = '';
+    const incremental = supportsStreamingPlayback();
+
+    const enqueueAudio = (bytes: Uint8Array) => {
+      if (incremental) {
+        appendStreamingAudio(bytes);
+        return;
+      }
+
+
+      const audioBlob = new Blob([bytes], { type: 'audio/mpeg' });
+      console.log(`🔊 Audio blob created: ${audioBlob.size} bytes`);
+      audioQueueRef.current.push(audioBlob);
+      
+      if (!isPlayingAudioRef.current) {
+        console.log('🔊 Starting audio playback');
+        playNextAudio();
+      }
+    };
 
     ws.onopen = () => {
+      // Ask for raw binary audio frames instead of base64 JSON, and for
+      // audio as it is synthesized when we can play it back incrementally
       ws.send(JSON.stringify({
-        type: 'text_input',
-        text: message,
-        voice_id: selectedVoice
+        type: 'hello',
+        audio_transport: 'binary',
+        tts_mode: incremental ? 'incremental' : 'buffered',
+        ...(sessionIdRef.current ? { session_id: sessionIdRef.current } : {})
       }));
+      onReady(ws);
     };
 
     ws.onmessage = async (event) => {
       try {
+        if (event.data instanceof ArrayBuffer) {
+          const frame = decodeAudioFrame(event.data);
+          if (frame.audio.length > 0) {
+            console.log(`🔊 Received audio frame #${frame.seq}: ${frame.audio.length} bytes`);
+            enqueueAudio(frame.audio);
+          }
+          return;
+        }
+
         const data = JSON.parse(event.data);
 
-        if (data.type === 'text_chunk') {
+        if (data.type === 'hello') {
+          if (data.session_id) sessionIdRef.current = data.session_id;
+        } else if (data.type === 'speech_start') {
+          setStatus('🎤 Listening...');
+        } else if (data.type === 'speech_end') {
+          // Server detected end of speech
+          stopMicStream();
+          setIsRecording(false);
+          setStatus('Processing audio...');
+          setIsLoading(true);
+        } else if (data.type === 'transcript') {
+          if (data.text) {
+            setTranscribedText(data.text);
+            setStatus('🤖 AI is responding...');
+          } else {
+            setStatus('❌ No speech detected');
+          }
+        } else if (data.type === 'text_chunk') {
           fullResponse += data.content;
           setAiResponse(fullResponse);
         } else if (data.type === 'audio_chunk') {
@@ -223,21 +474,15 @@ export default function VoiceAgent() {
                 bytes[i] = binaryString.charCodeAt(i);
               }
               
-              const audioBlob = new Blob([bytes], { type: 'audio/mpeg' });
-              console.log(`🔊 Audio blob created: ${audioBlob.size} bytes`);
-              audioQueueRef.current.push(audioBlob);
-              
-              if (!isPlayingAudioRef.current) {
-                console.log('🔊 Starting audio playback');
-                playNextAudio();
-              }
+              enqueueAudio(bytes);
             } catch (decodeError) {
               console.error('Error decoding audio:', decodeError);
             }
-          } else {
+          } else if (data.final === undefined) {
             console.warn('⚠️ Received audio_chunk without audio data');
           }
         } else if (data.type === 'stream_complete') {
+          endStreamingAudio();
           setStatus('✅ Ready to talk');
           setIsLoading(false);
           ws.close();
@@ -2,8 +2,13 @@
 """
 Voice Agent Startup Script
 Starts both FastAPI backend and Web frontend for voice conversations
+
+    python start.py                  # development: one backend process, Next.js dev server
+    python start.py --production     # N uvicorn workers (uvloop/httptools), built frontend
 """
 
+import argparse
+import importlib.util
 import subprocess
 import sys
 import time
@@ -12,15 +17,46 @@ import signal
 import threading
 from pathlib import Path
 
-def start_backend():
+def start_backend(production=False, workers=1):
     """Start FastAPI backend with streaming WebSocket support"""
-    print("🚀 Starting FastAPI backend...")
+    if not production:
+        print("🚀 Starting FastAPI backend...")
+        backend_process = subprocess.Popen([
+            sys.executable, "backend/main.py"
+        ], cwd=os.path.dirname(os.path.abspath(__file__)))
+        return backend_process
+    
+    # uvloop/httptools come with requirements.txt (no uvloop on Windows); fall back to asyncio/h11 without them
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    if loop != "uvloop" or http != "httptools":
+        print(f"⚠️  uvloop/httptools not installed, using {loop}/{http} (pip install uvloop httptools)")
+    print(f"🚀 Starting FastAPI backend ({workers} workers, {loop}, {http})...")
     backend_process = subprocess.Popen([
-        sys.executable, "backend/main.py"
+        sys.executable, "-m", "uvicorn", "backend.main:app",
+        "--host", "0.0.0.0", "--port", "8000",
+        "--workers", str(workers),
+        "--loop", loop,
+        "--http", http,
+        "--no-access-log",
     ], cwd=os.path.dirname(os.path.abspath(__file__)))
     return backend_process
 
-def start_frontend():
+def build_frontend(frontend_dir):
+    """Build the Next.js frontend for `next start`"""
+    if not os.path.exists(os.path.join(frontend_dir, "node_modules")):
+        print("❌ Frontend dependencies missing. Run: cd nextjs-frontend && npm install")
+        return False
+    print("🏗️  Building Next.js frontend...")
+    result = subprocess.run(["npm", "run", "build"], cwd=frontend_dir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(f"❌ Frontend build failed:\n{result.stderr}")
+        return False
+    print("✅ Frontend built")
+    return True
+
+def start_frontend(production=False):
     """Start Next.js frontend with voice interface"""
     print("🌐 Starting Next.js frontend...")
     frontend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nextjs-frontend")
@@ -34,6 +70,16 @@ def start_frontend():
         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
         return frontend_process
     
+    if production:
+        if not build_frontend(frontend_dir):
+            return None
+        # Serve the production build
+        frontend_process = subprocess.Popen([
+            "npm", "run", "start"
+        ], cwd=frontend_dir,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        return frontend_process
+    
     # Start Next.js dev server
     frontend_process = subprocess.Popen([
         "npm", "run", "dev"
@@ -42,19 +88,15 @@ def start_frontend():
     return frontend_process
 
 def check_dependencies():
-    """Check if required dependencies are installed"""
-    try:
-        import fastapi
-        import uvicorn
-        import websockets
-        import openai
-        import elevenlabs
-        print("✅ All dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
+    """Check if required dependencies are installed (without importing them here)"""
+    missing = [name for name in ("fastapi", "uvicorn", "websockets", "openai", "elevenlabs")
+               if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing dependency: {', '.join(missing)}")
         print("💡 Run: pip install -r requirements.txt")
         return False
+    print("✅ All dependencies are installed")
+    return True
 
 def check_environment():
     """Check if required environment variables are set"""
@@ -118,7 +160,7 @@ def cleanup_ports():
     else:
         print("✅ Ports are available")
 
-def wait_for_backend(backend_process, max_attempts=30):
+def wait_for_backend(backend_process, max_attempts=30, path="/"):
     """Wait for backend to be ready"""
     import requests
     
@@ -136,7 +178,7 @@ def wait_for_backend(backend_process, max_attempts=30):
             return False
         
         try:
-            response = requests.get("http://localhost:8000/", timeout=2)
+            response = requests.get(f"http://localhost:8000{path}", timeout=2)
             if response.status_code == 200:
                 print("✅ Backend is ready!")
                 return True
@@ -157,7 +199,16 @@ def wait_for_backend(backend_process, max_attempts=30):
 
 def main():
     """Main startup function"""
-    print("🎤 Streaming Voice Agent Startup")
+    from config import BACKEND_WORKERS, DRAIN_TIMEOUT
+    
+    parser = argparse.ArgumentParser(description="Start the voice agent backend and frontend")
+    parser.add_argument("--production", action="store_true",
+                        help="Multi-worker backend with uvloop/httptools and a built frontend")
+    parser.add_argument("--workers", type=int, default=BACKEND_WORKERS,
+                        help="Backend worker processes in production mode (default: BACKEND_WORKERS)")
+    args = parser.parse_args()
+    
+    print("🎤 Streaming Voice Agent Startup" + (" (production)" if args.production else ""))
     print("=" * 40)
     
     # Check dependencies
@@ -174,15 +225,22 @@ def main():
     
     # Start backend
     print("\n🔧 Starting services...")
-    backend = start_backend()
+    backend = start_backend(args.production, args.workers)
     
-    # Wait for backend to be ready
-    if not wait_for_backend(backend):
+    # Wait for backend to be ready (in production: warmed up, see GET /ready)
+    if args.production:
+        ready = wait_for_backend(backend, max_attempts=120, path="/ready")
+    else:
+        ready = wait_for_backend(backend)
+    if not ready:
         backend.terminate()
         sys.exit(1)
     
     # Start frontend
-    frontend = start_frontend()
+    frontend = start_frontend(args.production)
+    if frontend is None:
+        backend.terminate()
+        sys.exit(1)
     time.sleep(3)  # Give frontend time to start2
     
     print("\n🎉 Voice Agent is ready!")
@@ -197,12 +255,13 @@ def main():
     
     def signal_handler(sig, frame):
         print("\n\n🛑 Shutting down services...")
+        # SIGTERM: backend workers drain running turns first (up to DRAIN_TIMEOUT)
         backend.terminate()
         frontend.terminate()
         
         # Wait for processes to terminate
         try:
-            backend.wait(timeout=5)
+            backend.wait(timeout=DRAIN_TIMEOUT + 5 if args.production else 5)
             frontend.wait(timeout=5)
         except subprocess.TimeoutExpired:
             backend.kill()
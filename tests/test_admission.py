@@ -0,0 +1,121 @@
+"""Upstream admission control: priorities, rate limiting, rejection and abandoned waiters."""
+import asyncio
+import heapq
+import time
+import pytest
+from modules.admission import UpstreamLimiter, UpstreamSaturated
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_admits_immediately_under_capacity():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        assert limiter.active == 2
+        limiter.release()
+        assert limiter.active == 1
+        assert limiter.counters["admitted"] == 2
+    run(scenario())
+
+def test_waiters_are_admitted_best_priority_first():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=1)
+        order = []
+
+        async def call(name, priority):
+            async with limiter.slot(priority):
+                order.append(name)
+
+        await limiter.acquire()  # Hold the only slot while the others queue
+        tasks = []
+        for name, priority in (("tail", 2), ("llm", 1), ("stt", 0), ("llm2", 1)):
+            tasks.append(asyncio.create_task(call(name, priority)))
+            await settle()
+        assert limiter.queued() == 4
+        limiter.release()
+        await asyncio.gather(*tasks)
+        # Best priority first, FIFO within a priority
+        assert order == ["stt", "llm", "llm2", "tail"]
+        assert limiter.active == 0
+    run(scenario())
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=1, max_queue=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await settle()
+        with pytest.raises(UpstreamSaturated) as error:
+            await limiter.acquire()
+        assert error.value.reason == "queue full"
+        assert limiter.counters["rejected_queue_full"] == 1
+        limiter.release()
+        await waiter
+        assert limiter.active == 1
+    run(scenario())
+
+def test_rejects_after_max_wait():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=1, max_wait=0.05)
+        await limiter.acquire()
+        with pytest.raises(UpstreamSaturated):
+            await limiter.acquire()
+        assert limiter.counters["rejected_timeout"] == 1
+        assert limiter.queued() == 0
+        limiter.release()
+        assert limiter.active == 0
+    run(scenario())
+
+def test_rate_limit_spreads_admissions_with_the_dispatch_timer():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=100, rate_per_sec=20)
+        start = time.monotonic()
+        # A one-second burst (20) goes through, the next 4 wait ~50 ms each for tokens
+        await asyncio.gather(*(limiter.acquire() for _ in range(24)))
+        elapsed = time.monotonic() - start
+        assert limiter.active == 24
+        assert 0.15 <= elapsed < 1.0
+        assert limiter._timer is None
+    run(scenario())
+
+def test_slot_granted_as_waiter_gives_up_is_handed_on():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=1)
+        await limiter.acquire()
+        # A waiter whose slot is granted in the same instant it times out
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        heapq.heappush(limiter._waiters, (0, next(limiter._order), granted))
+        next_waiter = asyncio.create_task(limiter.acquire())
+        await settle()
+        limiter.release()
+        assert granted.done() and limiter.active == 1
+        assert not next_waiter.done()
+
+        limiter._abandon(granted)
+        await settle()
+        assert next_waiter.done()
+        assert limiter.active == 1  # The slot moved on instead of leaking
+    run(scenario())
+
+def test_abandoned_queued_waiter_is_skipped():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=1)
+        await limiter.acquire()
+        gave_up = asyncio.create_task(limiter.acquire(priority=0))
+        later = asyncio.create_task(limiter.acquire(priority=1))
+        await settle()
+        gave_up.cancel()
+        await settle()
+        limiter.release()
+        await later
+        assert gave_up.cancelled()
+        assert limiter.active == 1
+        assert limiter.queued() == 0
+    run(scenario())
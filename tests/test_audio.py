@@ -0,0 +1,82 @@
+"""In-memory upload preprocessing and its fallbacks when decoding isn't possible."""
+import io
+import wave
+import numpy as np
+import pytest
+from modules import audio
+from modules.audio import AudioDecodeError, decode_audio, encode_for_upload, preprocess_upload, to_wav_bytes
+
+SR = 16000
+
+@pytest.fixture
+def no_ffmpeg(monkeypatch):
+    monkeypatch.setattr(audio, "ffmpeg_available", lambda: False)
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(SR * seconds)) / SR
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+def stereo_wav(samples, rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes((np.repeat(samples, 2) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+def test_wav_is_decoded_downmixed_and_resampled_without_ffmpeg(no_ffmpeg):
+    samples = decode_audio(stereo_wav(tone(1.0), 48000), SR)
+    assert len(samples) == SR // 3  # 16000 frames at 48 kHz -> 1/3 s at 16 kHz
+    assert np.abs(samples).max() == pytest.approx(0.3, abs=0.01)
+
+def test_preprocessing_trims_surrounding_silence(no_ffmpeg):
+    padded = np.concatenate([np.zeros(SR, np.float32), tone(1.0), np.zeros(SR, np.float32)])
+    trimmed = preprocess_upload(to_wav_bytes(padded, SR), SR)
+    assert 0.9 * SR <= len(trimmed) <= 1.5 * SR
+    assert len(preprocess_upload(to_wav_bytes(np.zeros(SR, np.float32), SR), SR)) == 0
+
+def test_undecodable_upload_raises_audio_decode_error(no_ffmpeg):
+    with pytest.raises(AudioDecodeError):
+        decode_audio(b"\x1aE\xdf\xa3 webm data", SR)
+    # A WAV the wave module can't read (here: truncated) also needs ffmpeg
+    with pytest.raises(AudioDecodeError):
+        decode_audio(to_wav_bytes(tone(0.1), SR)[:30], SR)
+
+def test_upload_encoding_falls_back_to_wav(no_ffmpeg, monkeypatch):
+    monkeypatch.setattr(audio, "STT_UPLOAD_FORMAT", "ogg")
+    data, filename = encode_for_upload(tone(0.5), SR)
+    assert filename == "audio.wav" and data[:4] == b"RIFF"
+
+def test_opus_failure_falls_back_to_wav(monkeypatch):
+    monkeypatch.setattr(audio, "STT_UPLOAD_FORMAT", "ogg")
+    monkeypatch.setattr(audio, "ffmpeg_available", lambda: True)
+
+    def broken_ffmpeg(args, data):
+        raise AudioDecodeError("libopus missing")
+
+    monkeypatch.setattr(audio, "_ffmpeg", broken_ffmpeg)
+    assert encode_for_upload(tone(0.5), SR)[1] == "audio.wav"
+
+def test_transcribe_forwards_the_original_upload_when_decoding_fails(no_ffmpeg, monkeypatch):
+    from fastapi.testclient import TestClient
+    import backend.main as main
+
+    calls = []
+
+    async def transcribe(data, sample_rate=SR, filename="audio.wav"):
+        calls.append((type(data).__name__, filename))
+        return "hello"
+
+    monkeypatch.setattr(main.stt, "transcribe", transcribe)
+    client = TestClient(main.app)
+    webm = b"\x1aE\xdf\xa3" + b"\x00" * 2000
+    response = client.post("/transcribe", files={"audio": ("clip.webm", webm, "audio/webm")})
+    assert response.json() == {"text": "hello"}
+    assert calls == [("bytes", "clip.webm")]
+
+    calls.clear()
+    wav = to_wav_bytes(tone(1.0), SR)
+    response = client.post("/transcribe", files={"audio": ("clip.wav", wav, "audio/wav")})
+    assert response.json() == {"text": "hello"}
+    assert calls == [("ndarray", "audio.wav")]
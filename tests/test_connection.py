@@ -0,0 +1,123 @@
+"""/stream send buffering: text coalescing and slow-consumer handling."""
+import asyncio
+import pytest
+from modules.connection import Connection, TextChunkQueue, SlowConsumerError
+
+def run(coro):
+    return asyncio.run(coro)
+
+class FakeSocket:
+    """Accepts sends at once, or never (``stalled``), like a client that stopped reading."""
+
+    def __init__(self, stalled=False):
+        self.stalled = stalled
+        self.sent = []
+        self.close_code = None
+
+    async def send_text(self, data):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+def test_overflow_merges_into_the_last_chunk():
+    queue = TextChunkQueue(max_chunks=3)
+    for token in ("a", "b", "c", "d", "e"):
+        queue.put_nowait(token)
+    assert queue.qsize() == 3
+    assert queue.coalesced == 2
+
+    async def drain():
+        return [await queue.get() for _ in range(3)]
+
+    assert run(drain()) == ["a", "b", "cde"]
+
+def test_end_marker_is_never_merged():
+    queue = TextChunkQueue(max_chunks=1)
+    queue.put_nowait("a")
+    queue.put_nowait(None)
+    queue.put_nowait("late")  # Text after the end marker stays separate too
+
+    async def drain():
+        return [await queue.get() for _ in range(3)]
+
+    assert run(drain()) == ["a", None, "late"]
+
+def test_get_batch_joins_chunks_and_leaves_the_end_marker():
+    async def scenario():
+        queue = TextChunkQueue()
+        for token in ("Hello", ",", " world"):
+            queue.put_nowait(token)
+        queue.put_nowait(None)
+        first = await queue.get_batch(window=0.05)
+        assert queue.qsize() == 1  # The None is still waiting
+        return first, await queue.get_batch(window=0.05)
+
+    assert run(scenario()) == ("Hello, world", None)
+
+def test_get_batch_waits_for_the_window():
+    async def scenario():
+        queue = TextChunkQueue()
+
+        async def produce():
+            for token in ("a", "b", "c"):
+                queue.put_nowait(token)
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.2)
+            queue.put_nowait("d")
+
+        producer = asyncio.create_task(produce())
+        batches = [await queue.get_batch(window=0.1), await queue.get_batch(window=0.1)]
+        await producer
+        return batches
+
+    assert run(scenario()) == ["abc", "d"]
+
+def test_get_batch_stops_at_max_chars():
+    async def scenario():
+        queue = TextChunkQueue()
+        for token in ("aaaa", "bbbb", "cccc"):
+            queue.put_nowait(token)
+        return await queue.get_batch(window=1.0, max_chars=8), await queue.get_batch(window=0)
+
+    assert run(scenario()) == ("aaaabbbb", "cccc")
+
+def test_sends_are_accounted():
+    socket = FakeSocket()
+    connection = Connection(socket, send_timeout=1.0)
+
+    async def scenario():
+        await connection.send_text("héllo")
+        await connection.send_bytes(b"\x00" * 10)
+
+    run(scenario())
+    assert socket.sent == ["héllo", b"\x00" * 10]
+    assert connection.counters["messages_sent"] == 2
+    assert connection.counters["bytes_sent"] == 6 + 10
+
+def test_slow_consumer_is_closed_after_the_timeout():
+    socket = FakeSocket(stalled=True)
+    connection = Connection(socket, send_timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(SlowConsumerError):
+            await connection.send_text("stuck")
+        # Later sends fail at once instead of waiting out the timeout again
+        with pytest.raises(SlowConsumerError):
+            await asyncio.wait_for(connection.send_bytes(b"audio"), 0.01)
+
+    run(scenario())
+    assert socket.close_code == 1013
+    assert connection.closed_reason == "slow_consumer"
+    assert connection.counters["messages_sent"] == 0
+
+def test_mark_closed_keeps_the_first_reason():
+    connection = Connection(FakeSocket())
+    connection.mark_closed("slow_consumer")
+    connection.mark_closed()
+    assert connection.closed_reason == "slow_consumer"
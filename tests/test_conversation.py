@@ -0,0 +1,61 @@
+"""Conversation memory: token-budgeted history with a running summary."""
+import pytest
+from modules import conversation
+from modules.conversation import Conversation
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word keeps budgets predictable without the tokenizer
+    monkeypatch.setattr(conversation, "count_tokens", lambda text: len(text.split()))
+
+def sentence(n, words=10):
+    return f"Message {n} " + " ".join(["word"] * (words - 3)) + " end."
+
+def test_history_is_kept_under_budget():
+    chat = Conversation(max_tokens=50)
+    for n in range(4):
+        chat.add_turn(sentence(2 * n), sentence(2 * n + 1))
+        assert chat.history_tokens <= 50
+    assert chat.history_tokens == sum(m["tokens"] for m in chat.history)
+
+def test_overflow_compacts_oldest_turns_into_the_summary():
+    chat = Conversation(max_tokens=50)
+    for n in range(3):
+        chat.add_turn(sentence(2 * n), sentence(2 * n + 1))
+    # 60 tokens > 50: trimmed to the compact ratio (0.6 -> 30), on a user message
+    assert chat.history_tokens <= 30
+    assert chat.history[0]["role"] == "user"
+    assert chat.history[-1]["content"] == sentence(5)
+    assert chat.summary.startswith("User: Message 0")
+    assert "Assistant: Message 1" in chat.summary
+
+def test_messages_keep_a_stable_prefix():
+    chat = Conversation(max_tokens=50)
+    chat.add_turn("Hi", "Hello!")
+    messages = chat.build_messages("How are you?")
+    assert messages[0] == {"role": "system", "content": conversation.SYSTEM_PROMPT}
+    assert messages[1:] == [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"},
+                            {"role": "user", "content": "How are you?"}]
+
+def test_summary_is_included_once_history_was_compacted():
+    chat = Conversation(max_tokens=20)
+    chat.add_turn(sentence(0), sentence(1))
+    chat.add_turn(sentence(2), sentence(3))
+    messages = chat.build_messages("next")
+    assert messages[1]["role"] == "system"
+    assert messages[1]["content"].startswith("Earlier in this conversation: User: Message 0")
+
+def test_empty_replies_are_not_stored():
+    chat = Conversation(max_tokens=50)
+    chat.add_turn("Hello", "   ")
+    assert [m["role"] for m in chat.history] == ["user"]
+
+def test_store_issues_unguessable_session_ids():
+    store = conversation.ConversationStore(max_sessions=10, idle_ttl=60)
+    first, chat = store.create()
+    second, _ = store.create()
+    assert first != second and len(first) >= 32
+    assert first in store and "chosen-by-client" not in store
+    assert store.get(first) is chat
+    store.drop(first)
+    assert first not in store
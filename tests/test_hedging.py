@@ -0,0 +1,200 @@
+"""Hedged upstream calls: hedging, retries, retry budget, deadlines and streams."""
+import asyncio
+import pytest
+from modules import hedging
+from modules.admission import UpstreamSaturated
+from modules.hedging import Stage, DeadlineExceeded, hedged, hedged_stream
+
+@pytest.fixture(autouse=True)
+def hedging_on(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_ENABLED", True)
+
+def make_stage(delay=0.05, deadline=2.0):
+    return Stage("test", default_delay=delay, deadline=deadline, min_samples=3)
+
+class Call:
+    """Fake attempt: sleeps, then returns ``result`` or raises ``error``; records what happened."""
+
+    def __init__(self, delay=0.0, result="ok", error=None):
+        self.delay = delay
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_fast_request_is_not_hedged():
+    stage = make_stage()
+    primary, hedge = Call(), Call(result="hedge")
+    assert run(hedged(stage, primary, hedge=hedge)) == "ok"
+    assert hedge.calls == 0
+    assert stage.counters["requests"] == 1 and stage.counters["hedges"] == 0
+
+def test_slow_request_is_hedged_and_first_success_wins():
+    stage = make_stage()
+    primary, hedge = Call(delay=1.0), Call(delay=0.01, result="hedge")
+
+    async def scenario():
+        result = await hedged(stage, primary, hedge=hedge)
+        await settle()
+        return result
+
+    assert run(scenario()) == "hedge"
+    assert stage.counters["hedges"] == 1 and stage.counters["hedge_wins"] == 1
+    assert primary.cancelled == 1  # The loser is cancelled
+
+def test_primary_can_still_win_after_hedging():
+    stage = make_stage()
+    primary, hedge = Call(delay=0.08), Call(delay=1.0, result="hedge")
+
+    async def scenario():
+        result = await hedged(stage, primary, hedge=hedge)
+        await settle()
+        return result
+
+    assert run(scenario()) == "ok"
+    assert stage.counters["hedges"] == 1 and stage.counters["hedge_wins"] == 0
+    assert hedge.cancelled == 1
+
+def test_no_hedge_when_disabled(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_ENABLED", False)
+    stage = make_stage()
+    primary, hedge = Call(delay=0.1), Call(result="hedge")
+    assert run(hedged(stage, primary, hedge=hedge)) == "ok"
+    assert hedge.calls == 0
+
+def test_failure_is_retried_once():
+    stage = make_stage()
+    primary, retry = Call(error=RuntimeError("boom")), Call(result="retried")
+    assert run(hedged(stage, primary, retry=retry)) == "retried"
+    assert stage.counters["retries"] == 1
+
+def test_gives_up_after_one_retry():
+    stage = make_stage()
+    primary, retry = Call(error=RuntimeError("first")), Call(error=RuntimeError("second"))
+    with pytest.raises(RuntimeError, match="second"):
+        run(hedged(stage, primary, retry=retry))
+    assert retry.calls == 1
+    assert stage.counters["failures"] == 1
+
+def test_no_retry_or_hedge_without_budget():
+    stage = make_stage()
+    stage.budget.tokens = 0
+    with pytest.raises(RuntimeError):
+        run(hedged(stage, Call(error=RuntimeError("boom")), retry=Call()))
+    assert stage.counters["retries"] == 0
+
+    hedge = Call(result="hedge")
+    assert run(hedged(stage, Call(delay=0.1), hedge=hedge)) == "ok"
+    assert hedge.calls == 0
+    assert stage.counters["budget_exhausted"] == 1
+
+def test_budget_earns_ratio_tokens_per_request():
+    budget = hedging.RetryBudget(ratio=0.1, max_tokens=2)
+    budget.tokens = 0
+    for _ in range(10):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+def test_saturated_upstream_is_neither_retried_nor_hedged():
+    stage = make_stage(delay=0.05)
+    # Rejected before the hedge delay: no hedge, no retry
+    primary = Call(delay=0.01, error=UpstreamSaturated("test", "queue full"))
+    retry, hedge = Call(), Call()
+
+    async def scenario():
+        with pytest.raises(UpstreamSaturated):
+            await hedged(stage, primary, hedge=hedge, retry=retry)
+        await asyncio.sleep(0.1)
+
+    run(scenario())
+    assert retry.calls == 0 and hedge.calls == 0
+    assert stage.counters["retries"] == 0 and stage.counters["hedges"] == 0
+
+def test_deadline_cancels_the_request():
+    stage = make_stage(delay=10, deadline=0.05)
+    primary = Call(delay=1.0)
+
+    async def scenario():
+        with pytest.raises(DeadlineExceeded):
+            await hedged(stage, primary)
+        await settle()
+
+    run(scenario())
+    assert issubclass(DeadlineExceeded, asyncio.TimeoutError)
+    assert primary.cancelled == 1
+    assert stage.counters["deadline_exceeded"] == 1
+
+def test_hedge_delay_follows_observed_latencies():
+    stage = make_stage(delay=1.0)
+    assert stage.hedge_delay() == 1.0  # Not enough samples yet
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        stage.observe(seconds)
+    assert 0.3 < stage.hedge_delay() <= 0.4
+    stage.observe(2.0, scale=10)  # Stored per unit of work
+    assert stage.latencies[-1] == pytest.approx(0.2)
+    assert stage.hedge_delay(scale=2) == pytest.approx(2 * stage.hedge_delay())
+
+def test_stream_is_hedged_on_first_chunk_and_loser_is_closed():
+    stage = make_stage()
+    opened, closed = [], []
+
+    def open_stream():
+        index = len(opened)
+        opened.append(index)
+
+        async def stream():
+            try:
+                # The first stream is slow to start, the hedge is fast
+                await asyncio.sleep(1.0 if index == 0 else 0.01)
+                for n in range(3):
+                    yield f"{index}:{n}".encode()
+            finally:
+                closed.append(index)
+        return stream()
+
+    async def scenario():
+        chunks = [chunk async for chunk in hedged_stream(stage, open_stream)]
+        await settle()
+        return chunks
+
+    assert run(scenario()) == [b"1:0", b"1:1", b"1:2"]
+    assert opened == [0, 1]
+    assert sorted(closed) == [0, 1]
+
+def test_stream_consumer_stopping_early_closes_the_winner():
+    stage = make_stage()
+    closed = []
+
+    async def stream():
+        try:
+            for n in range(10):
+                yield bytes([n])
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        chunks = hedged_stream(stage, stream)
+        assert await chunks.__anext__() == b"\x00"
+        await chunks.aclose()
+
+    run(scenario())
+    assert closed == [True]
@@ -0,0 +1,49 @@
+"""LLM response cache: key stability, TTL expiry, LRU bound and replay."""
+import asyncio
+from modules import llm_cache
+from modules.llm_cache import LLMResponseCache, make_key, replay_tokens
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "What is  inflation?"}]
+
+def test_key_is_stable_across_case_whitespace_and_param_order():
+    key = make_key("gpt", MESSAGES, {"temperature": 0.7, "max_tokens": 100})
+    same = [{"role": "system", "content": "be brief."}, {"role": "user", "content": " what is inflation? "}]
+    assert key == make_key("gpt", same, {"max_tokens": 100, "temperature": 0.7})
+    assert key != make_key("other-model", MESSAGES, {"temperature": 0.7, "max_tokens": 100})
+    assert key != make_key("gpt", MESSAGES, {"temperature": 0.2, "max_tokens": 100})
+    assert key != make_key("gpt", MESSAGES[1:], {"temperature": 0.7, "max_tokens": 100})
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "monotonic", lambda: now[0])
+    cache = LLMResponseCache(ttl=60, max_entries=10)
+    cache.put("key", ["Hello", " there"])
+    now[0] += 59
+    assert cache.get("key") == ["Hello", " there"]
+    now[0] += 2
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["entries"] == 0
+
+def test_bounded_by_entry_count_least_recently_used_first():
+    cache = LLMResponseCache(ttl=60, max_entries=2)
+    cache.put("a", ["a"])
+    cache.put("b", ["b"])
+    cache.get("a")
+    cache.put("c", ["c"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["a"] and cache.get("c") == ["c"]
+    assert cache.stats()["evictions"] == 1
+
+def test_empty_responses_are_not_stored():
+    cache = LLMResponseCache(ttl=60, max_entries=2)
+    cache.put("key", [])
+    assert cache.get("key") is None
+
+def test_replay_feeds_every_queue_without_the_sentinel():
+    async def scenario():
+        queues = [asyncio.Queue(), asyncio.Queue()]
+        await replay_tokens(["a", "b", "c"], queues, tokens_per_sec=0)
+        return [[q.get_nowait() for _ in range(q.qsize())] for q in queues]
+
+    assert asyncio.run(scenario()) == [["a", "b", "c"], ["a", "b", "c"]]
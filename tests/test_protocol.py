@@ -0,0 +1,69 @@
+"""/stream audio wire format: binary frames and JSON audio_chunk messages."""
+import asyncio
+import base64
+import json
+import pytest
+from modules.protocol import (
+    encode_audio_frame, decode_audio_frame, negotiate_transport, negotiate_tts_mode, send_audio_chunk,
+    send_segment_error,
+    FLAG_FINAL, FLAG_FILLER, TRANSPORT_JSON, TRANSPORT_BINARY, TTS_MODE_BUFFERED, TTS_MODE_INCREMENTAL,
+)
+
+class FakeSocket:
+    def __init__(self):
+        self.text, self.bytes = [], []
+
+    async def send_text(self, data):
+        self.text.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.bytes.append(data)
+
+def test_binary_frame_round_trip():
+    frame = encode_audio_frame(7, "Héllo there.", b"\x00\x01audio")
+    assert decode_audio_frame(frame) == (7, FLAG_FINAL, "Héllo there.", b"\x00\x01audio")
+
+def test_non_final_frame_and_empty_audio():
+    seq, flags, text, audio = decode_audio_frame(encode_audio_frame(3, "", b"", final=False))
+    assert (seq, flags, text, audio) == (3, 0, "", b"")
+
+def test_filler_flag():
+    frame = encode_audio_frame(0, "Okay.", b"clip", filler=True)
+    assert decode_audio_frame(frame)[1] == FLAG_FINAL | FLAG_FILLER
+
+def test_unknown_frame_version_is_rejected():
+    frame = bytearray(encode_audio_frame(1, "x", b"a"))
+    frame[0] = 99
+    with pytest.raises(ValueError):
+        decode_audio_frame(bytes(frame))
+
+def test_transport_negotiation_defaults_to_json():
+    assert negotiate_transport({"audio_transport": "binary"}) == TRANSPORT_BINARY
+    assert negotiate_transport({"audio_transport": "carrier-pigeon"}) == TRANSPORT_JSON
+    assert negotiate_transport({}) == TRANSPORT_JSON
+
+def test_tts_mode_negotiation_defaults_to_buffered():
+    assert negotiate_tts_mode({"tts_mode": "incremental"}) == TTS_MODE_INCREMENTAL
+    assert negotiate_tts_mode({}) == TTS_MODE_BUFFERED
+
+def test_send_audio_chunk_uses_the_negotiated_transport():
+    socket = FakeSocket()
+
+    async def scenario():
+        await send_audio_chunk(socket, b"mp3 bytes", "Hi.", 2, TRANSPORT_JSON)
+        await send_audio_chunk(socket, b"mp3 bytes", "Hi.", 2, TRANSPORT_BINARY)
+        await send_audio_chunk(socket, b"part", "Hi.", 2, TRANSPORT_JSON, final=False)
+        await send_audio_chunk(socket, b"clip", "Okay.", 0, TRANSPORT_JSON, filler=True)
+
+    asyncio.run(scenario())
+    message = socket.text[0]
+    assert message["type"] == "audio_chunk" and message["seq"] == 2 and message["text"] == "Hi."
+    assert base64.b64decode(message["audio_data"]) == b"mp3 bytes"
+    assert message["final"] is True and socket.text[1]["final"] is False
+    assert "filler" not in message and socket.text[2]["filler"] is True
+    assert decode_audio_frame(socket.bytes[0]) == (2, FLAG_FINAL, "Hi.", b"mp3 bytes")
+
+def test_segment_error_message():
+    socket = FakeSocket()
+    asyncio.run(send_segment_error(socket, 4, "Hi.", "timeout"))
+    assert socket.text == [{"type": "segment_error", "seq": 4, "text": "Hi.", "error": "timeout"}]
@@ -0,0 +1,97 @@
+"""Capture engine: ring buffer and endpointing, driven by synthetic PCM."""
+import asyncio
+import numpy as np
+from modules.record import RingBuffer, CaptureEngine
+
+SR = 16000
+
+def tone(seconds, amplitude=0.3, freq=220):
+    t = np.arange(int(SR * seconds)) / SR
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+def silence(seconds):
+    return np.zeros(int(SR * seconds), dtype=np.float32)
+
+def collect(engine):
+    async def run():
+        return [u async for u in engine.utterances()]
+    return asyncio.run(run())
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(10)
+    ring.write(np.arange(6, dtype=np.float32))
+    assert ring.read().tolist() == list(range(6))
+    ring.write(np.arange(6, 14, dtype=np.float32))  # Crosses the end of the array
+    assert len(ring) == 8
+    assert ring.read().tolist() == list(range(6, 14))
+    assert ring.dropped == 0
+    assert len(ring.read()) == 0
+
+def test_ring_buffer_overrun_drops_oldest():
+    ring = RingBuffer(10)
+    ring.write(np.arange(8, dtype=np.float32))
+    ring.write(np.arange(8, 15, dtype=np.float32))  # Reader fell a whole buffer behind
+    assert ring.dropped == 5
+    assert ring.read().tolist() == list(range(5, 15))
+
+def test_ring_buffer_write_larger_than_capacity():
+    ring = RingBuffer(4)
+    ring.write(np.arange(10, dtype=np.float32))
+    assert ring.dropped == 6
+    assert ring.read().tolist() == [6, 7, 8, 9]
+
+def test_injected_speech_yields_one_utterance_per_phrase():
+    engine = CaptureEngine(sample_rate=SR, buffer_s=10)
+    engine.inject(silence(0.5))
+    engine.inject(tone(0.6))
+    engine.inject(silence(1.0))
+    engine.inject(tone(0.6))
+    engine.inject(silence(1.0))
+    engine.close()
+    utterances = collect(engine)
+    assert len(utterances) == 2
+    for utterance in utterances:
+        # The phrase plus pre-roll and the trailing silence before the endpoint
+        assert 0.6 <= len(utterance) / SR <= 2.0
+    assert engine.stats()["utterances"] == 2
+
+def test_silence_yields_nothing():
+    engine = CaptureEngine(sample_rate=SR, buffer_s=10)
+    engine.inject(silence(2.0))
+    engine.close()
+    assert collect(engine) == []
+
+def test_speech_cut_off_by_close_is_still_yielded():
+    engine = CaptureEngine(sample_rate=SR, buffer_s=10)
+    engine.inject(silence(0.3))
+    engine.inject(tone(0.6))
+    engine.close()
+    assert len(collect(engine)) == 1
+
+def test_inject_accepts_pcm16_bytes_and_int16():
+    engine = CaptureEngine(sample_rate=SR, buffer_s=10)
+    pcm = (tone(0.6) * 32767).astype(np.int16)
+    engine.inject(silence(0.3))
+    engine.inject(pcm.tobytes())
+    engine.inject(silence(1.0))
+    engine.inject(pcm)
+    engine.inject(silence(1.0))
+    engine.close()
+    assert len(collect(engine)) == 2
+
+def test_utterances_wait_for_live_audio():
+    engine = CaptureEngine(sample_rate=SR, buffer_s=10)
+
+    async def run():
+        async def feed():
+            for block in (silence(0.3), tone(0.6), silence(1.0)):
+                await asyncio.sleep(0.01)
+                engine.inject(block)
+            await asyncio.sleep(0.01)
+            engine.close()
+        feeder = asyncio.create_task(feed())
+        utterances = [u async for u in engine.utterances()]
+        await feeder
+        return utterances
+
+    assert len(asyncio.run(run())) == 1
@@ -0,0 +1,70 @@
+"""TTS text segmenters: where LLM output is cut into synthesis requests."""
+from modules.segmenter import AdaptiveSegmenter, FixedSegmenter, make_segmenter
+
+def feed_all(segmenter, tokens):
+    segments = []
+    for token in tokens:
+        segments += segmenter.feed(token)
+    return segments + segmenter.flush()
+
+def words(text):
+    # Tokens the way the LLM streams them: a word with its leading space
+    parts = text.split(" ")
+    return [parts[0]] + [" " + part for part in parts[1:]]
+
+def test_first_segment_is_cut_at_the_first_sentence_end():
+    segmenter = AdaptiveSegmenter(first_min_chars=20, min_chars=60)
+    segments = []
+    for token in words("Sure. Interest rates shape how expensive it is to borrow money"):
+        segments += segmenter.feed(token)
+    assert segments == ["Sure."]
+
+def test_first_segment_falls_back_to_a_clause_boundary():
+    segmenter = AdaptiveSegmenter(first_min_chars=20, min_chars=60)
+    segments = []
+    for token in words("When central banks raise rates, borrowing gets more expensive for everyone"):
+        segments += segmenter.feed(token)
+    assert segments == ["When central banks raise rates,"]
+
+def test_abbreviations_and_initials_are_not_sentence_ends():
+    segmenter = AdaptiveSegmenter(first_min_chars=60)
+    segments = []
+    for token in words("Dr. Smith met the U.S. team, e.g. the analysts. Then"):
+        segments += segmenter.feed(token)
+    assert segments == ["Dr. Smith met the U.S. team, e.g. the analysts."]
+
+def test_later_segments_grow_and_respect_max_chars():
+    segmenter = AdaptiveSegmenter(first_min_chars=10, min_chars=40, growth=2.0, max_chars=100)
+    text = " ".join(f"Sentence number {n} is here." for n in range(20))
+    segments = feed_all(segmenter, words(text))
+    assert " ".join(segments) == text
+    assert all(len(segment) <= 100 for segment in segments)
+    # After the short first segment, targets grow: 40, 80, then capped at 100
+    assert len(segments[1]) >= 40 and len(segments[2]) >= 80
+
+def test_long_text_without_punctuation_is_cut_on_whitespace():
+    segmenter = AdaptiveSegmenter(first_min_chars=10, min_chars=20, max_chars=30)
+    segments = feed_all(segmenter, words("word " * 30))
+    assert all(len(segment) <= 30 for segment in segments)
+    assert all(not segment.endswith("wor") for segment in segments)  # No half words
+
+def test_stall_flushes_whole_words_only():
+    segmenter = AdaptiveSegmenter(first_min_chars=50, stall_timeout=0.4)
+    assert segmenter.timeout() is None  # Nothing buffered, nothing to flush
+    for token in ("Let me", " think about", " that prob"):
+        assert segmenter.feed(token) == []
+    assert segmenter.timeout() == 0.4
+    assert segmenter.on_stall() == ["Let me think about that"]
+    assert segmenter.buffer == "prob"
+    assert segmenter.on_stall() == []  # Half a word stays buffered
+
+def test_fixed_segmenter_cuts_on_punctuation_or_size():
+    segmenter = FixedSegmenter(chunk_size=20)
+    assert segmenter.feed("Hi") == []
+    assert segmenter.feed(" there.") == ["Hi there."]
+    assert segmenter.feed("a" * 25) == ["a" * 25]
+    assert segmenter.flush() == []
+
+def test_make_segmenter_by_name():
+    assert isinstance(make_segmenter("fixed"), FixedSegmenter)
+    assert isinstance(make_segmenter("adaptive"), AdaptiveSegmenter)
@@ -0,0 +1,39 @@
+"""Incremental TTS: provider streams are read ahead of a slow client."""
+import asyncio
+from types import SimpleNamespace
+from modules import admission, simple_tts
+from modules.protocol import TTS_MODE_INCREMENTAL
+
+def test_slow_client_does_not_hold_upstream_slots(monkeypatch):
+    provider_done = asyncio.Event()
+
+    async def stream(**kwargs):
+        for n in range(10):
+            await asyncio.sleep(0)
+            yield b"audio %d" % n
+        provider_done.set()
+
+    client = SimpleNamespace(text_to_speech=SimpleNamespace(stream=stream))
+    monkeypatch.setattr(simple_tts, "get_async_elevenlabs", lambda: client)
+    monkeypatch.setattr(simple_tts, "get_tts_cache", lambda: None)
+    monkeypatch.setattr(admission, "_limiters", {})
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(1)
+        chunks = asyncio.Queue(maxsize=2)  # Nobody reads it yet: a stalled client
+        task = asyncio.create_task(simple_tts.synthesize_into_queue(
+            "Hello there.", "voice", semaphore, chunks, TTS_MODE_INCREMENTAL))
+        await asyncio.wait_for(provider_done.wait(), 1)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        held = (admission.get_limiter("elevenlabs").active, semaphore.locked(), chunks.full())
+
+        received = []
+        while (chunk := await chunks.get()) is not None:
+            received.append(chunk)
+        await task
+        return held, received
+
+    held, received = asyncio.run(scenario())
+    assert held == (0, False, True)
+    assert received == [b"audio %d" % n for n in range(10)]
@@ -0,0 +1,93 @@
+"""Speculative LLM answers: commit failures and the committing turn's timings."""
+import asyncio
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from modules import llm, metrics, stt, upstream_trace
+from modules.conversation import Conversation
+from modules.speculative import Speculation
+
+class FakeStream:
+    def __init__(self, tokens, error=None, gate=None):
+        self.tokens = tokens
+        self.error = error
+        self.gate = gate
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for n, token in enumerate(self.tokens):
+            if n and self.gate is not None:
+                await self.gate.wait()  # Everything after the first token waits
+            await asyncio.sleep(0)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        if self.error is not None:
+            raise self.error
+
+    async def close(self):
+        pass
+
+@pytest.fixture
+def fake_upstreams(monkeypatch):
+    def install(tokens, error=None, gate=None):
+        async def create(**kwargs):
+            return FakeStream(tokens, error, gate)
+
+        async def transcribe(audio, sample_rate):
+            return "What time is it?"
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(llm, "get_async_openai", lambda: client)
+        monkeypatch.setattr(stt, "transcribe", transcribe)
+    return install
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+def test_failed_speculative_stream_fails_the_turn(fake_upstreams):
+    fake_upstreams(["It's", " noon"], error=RuntimeError("connection reset"))
+
+    async def scenario():
+        speculation = Speculation(np.zeros(1600, dtype=np.float32), 16000, Conversation())
+        assert await speculation.matches("what time is it")
+        queue = asyncio.Queue()
+        with pytest.raises(RuntimeError, match="connection reset"):
+            await speculation.replay([queue])
+        return drain(queue)
+
+    # The partial answer is delivered, but the turn fails instead of ending quietly
+    assert asyncio.run(scenario()) == ["It's", " noon", None]
+
+def test_commit_attaches_llm_timings_to_the_turn(fake_upstreams, monkeypatch, tmp_path):
+    monkeypatch.setattr(upstream_trace, "TRACE_CAPTURE_FILE", str(tmp_path / "trace.jsonl"))
+    gate = asyncio.Event()
+    fake_upstreams(["It's", " noon", "."], gate=gate)
+
+    async def scenario():
+        speculation = Speculation(np.zeros(1600, dtype=np.float32), 16000)
+        while not speculation.tokens:
+            await asyncio.sleep(0)
+        # The final transcript arrives after the first token
+        timeline = metrics.begin_turn(1)
+        recording = upstream_trace.begin_turn(1)
+        queue = asyncio.Queue()
+        replay = asyncio.create_task(speculation.replay([queue]))
+        await asyncio.sleep(0)
+        gate.set()  # The rest of the stream arrives while the turn plays it
+        await replay
+        return timeline, recording, drain(queue)
+
+    timeline, recording, delivered = asyncio.run(scenario())
+    assert delivered == ["It's", " noon", ".", None]
+    events = {event["stage"]: event for event in timeline.to_dict()["events"]}
+    assert events["llm_request"]["speculative"] and events["llm_first_token"]["speculative"]
+    assert events["llm_request"]["ms"] <= events["llm_first_token"]["ms"] < 0
+    assert events["speculation_commit"]["ms"] >= 0
+    assert [stage for stage, _, _ in timeline.events].count("llm_first_token") == 1
+    assert timeline.since("llm_first_token") < 0
+    assert [token for _, token in recording.data["llm"]] == ["It's", " noon", "."]
+    assert all(delay >= 0 for delay, _ in recording.data["llm"])
@@ -0,0 +1,84 @@
+"""Content-addressed TTS audio cache: keys, in-memory LRU and the disk store."""
+import asyncio
+from modules.tts_cache import TTSCache, make_key
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_key_ignores_whitespace_but_not_voice_or_text():
+    key = make_key("voice", "model", "Hello  there.\n", "mp3")
+    assert key == make_key("voice", "model", " Hello there.", "mp3")
+    assert key != make_key("other", "model", "Hello there.", "mp3")
+    assert key != make_key("voice", "model", "Hello there!", "mp3")
+    assert key != make_key("voice", "model", "Hello there.", "pcm")
+
+def test_memory_lru_evicts_least_recently_used():
+    async def scenario():
+        cache = TTSCache(max_memory_bytes=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        assert await cache.get("a") == b"aaaa"  # "a" is now the most recent
+        cache.put("c", b"cccc")
+        return cache, [await cache.get(key) for key in ("a", "b", "c")]
+
+    cache, found = run(scenario())
+    assert found == [b"aaaa", None, b"cccc"]
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["memory_bytes"] == 8
+    assert stats["memory_hits"] == 3 and stats["misses"] == 1
+
+def test_oversized_and_empty_entries_are_not_stored():
+    async def scenario():
+        cache = TTSCache(max_memory_bytes=100, max_entry_bytes=5)
+        cache.put("big", b"x" * 6)
+        cache.put("empty", b"")
+        return await cache.get("big"), await cache.get("empty"), cache.stats()["stores"]
+
+    assert run(scenario()) == (None, None, 0)
+
+def test_disk_round_trip_survives_a_new_cache(tmp_path):
+    key = make_key("voice", "model", "Sure!", "mp3")
+
+    async def write():
+        cache = TTSCache(max_memory_bytes=100, disk_dir=str(tmp_path))
+        cache.put(key, b"audio bytes")
+        await asyncio.gather(*cache._background)
+
+    async def read():
+        cache = TTSCache(max_memory_bytes=100, disk_dir=str(tmp_path))
+        audio = await cache.get(key)
+        again = await cache.get(key)  # Now served from memory
+        return audio, again, cache.stats()
+
+    run(write())
+    assert (tmp_path / key[:2] / f"{key}.audio").read_bytes() == b"audio bytes"
+    audio, again, stats = run(read())
+    assert audio == again == b"audio bytes"
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+
+def test_disk_store_is_trimmed_to_its_budget(tmp_path):
+    cache = TTSCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=250)
+    for n in range(50):  # The 50th write triggers a trim
+        cache._write_disk(f"{n:064x}", b"x" * 10)
+    remaining = list(tmp_path.rglob("*.audio"))
+    assert len(remaining) == 25
+    assert cache.stats()["disk_evictions"] == 25
+
+def test_corrupt_disk_entries_are_misses_and_removed(tmp_path):
+    empty_key = make_key("voice", "model", "Empty", "mp3")
+    broken_key = make_key("voice", "model", "Broken", "mp3")
+    cache = TTSCache(max_memory_bytes=100, disk_dir=str(tmp_path))
+    empty_path = tmp_path / empty_key[:2] / f"{empty_key}.audio"
+    empty_path.parent.mkdir(parents=True, exist_ok=True)
+    empty_path.write_bytes(b"")
+    broken_path = tmp_path / broken_key[:2] / f"{broken_key}.audio"
+    broken_path.mkdir(parents=True)  # A directory where the file should be
+
+    async def scenario():
+        return await cache.get(empty_key), await cache.get(broken_key)
+
+    assert run(scenario()) == (None, None)
+    assert not empty_path.exists()
+    stats = cache.stats()
+    assert stats["disk_errors"] == 2 and stats["misses"] == 2 and stats["disk_hits"] == 0
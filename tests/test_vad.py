@@ -0,0 +1,72 @@
+"""Endpointing: utterance boundaries, including several phrases in one block."""
+import json
+import numpy as np
+from modules.vad import Endpointer, SPEECH_START, SPEECH_END
+
+SR = 16000
+
+def tone(seconds, amplitude=0.3, freq=220):
+    t = np.arange(int(SR * seconds)) / SR
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+def silence(seconds):
+    return np.zeros(int(SR * seconds), dtype=np.float32)
+
+def two_phrases():
+    return np.concatenate([silence(0.5), tone(0.6), silence(1.0), tone(0.8), silence(1.0)])
+
+def test_block_by_block_events():
+    endpointer = Endpointer(sample_rate=SR)
+    events = [endpointer.feed(block) for block in np.split(two_phrases()[:int(SR * 2.1)], 21)]
+    assert [e for e in events if e] == [SPEECH_START, SPEECH_END]
+    utterance = endpointer.utterance()
+    # Pre-roll, the phrase and the silence that closed it
+    assert 0.6 + 0.7 <= len(utterance) / SR <= 0.3 + 0.6 + 0.8
+    assert not endpointer.had_speech
+
+def test_audio_after_an_endpoint_in_the_same_block_is_kept():
+    endpointer = Endpointer(sample_rate=SR)
+    assert endpointer.feed(two_phrases()) == SPEECH_END
+    first = endpointer.utterance()
+    # The rest of the block is processed by the next feed, even an empty one
+    assert endpointer.feed(np.empty(0, dtype=np.float32)) == SPEECH_END
+    second = endpointer.utterance()
+    # Pre-roll is trimmed per block, so the first utterance keeps all the leading silence
+    assert len(first) / SR <= 0.5 + 0.6 + 0.8
+    assert 0.8 + 0.7 <= len(second) / SR <= 0.3 + 0.8 + 0.8
+    assert np.abs(second).max() > 0.2  # The second phrase itself, not just silence
+    assert endpointer.feed(np.empty(0, dtype=np.float32)) is None
+
+def test_stream_answers_two_phrases_after_one_audio_start(monkeypatch):
+    from fastapi.testclient import TestClient
+    import backend.main as main
+
+    heard = []
+
+    async def transcribe(samples, sample_rate=SR, filename="audio.wav"):
+        heard.append(len(samples) / sample_rate)
+        return f"phrase {len(heard)}"
+
+    async def run_turn(websocket, text, *args, **kwargs):
+        pass
+
+    monkeypatch.setattr(main.stt, "transcribe", transcribe)
+    monkeypatch.setattr(main, "run_turn", run_turn)
+    monkeypatch.setattr(main, "SPECULATIVE_LLM", False)
+    pcm = (two_phrases() * 32767).astype("<i2").tobytes()
+    frame = int(SR * 0.1) * 2  # 100 ms of PCM16
+
+    with TestClient(main.app).websocket_connect("/stream") as ws:
+        ws.send_text(json.dumps({"type": "audio_start", "sample_rate": SR}))
+        for start in range(0, len(pcm), frame):
+            ws.send_bytes(pcm[start:start + frame])
+        ws.send_text(json.dumps({"type": "hello"}))  # Its reply marks the end
+        transcripts = []
+        message = json.loads(ws.receive_text())
+        while message["type"] != "hello":
+            if message["type"] == "transcript":
+                transcripts.append(message["text"])
+            message = json.loads(ws.receive_text())
+
+    assert transcripts == ["phrase 1", "phrase 2"]
+    assert len(heard) == 2 and all(seconds > 0.6 for seconds in heard)